@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+from datetime import datetime
+
+import requests
+from sqlalchemy import text
+
+logger = logging.getLogger("PriceScraper")
+
+ALERTS_ENABLED = os.getenv("ALERTS_ENABLED", "true").lower() in ("1", "true", "yes")
+# 💡 啟用的通知管道 (逗號分隔)，可用 register_sink 擴充
+ALERT_SINKS = [s.strip() for s in os.getenv("ALERT_SINKS", "file").split(",") if s.strip()]
+ALERT_FILE_PATH = os.getenv("ALERT_FILE_PATH", os.path.join(os.getcwd(), "logs", "alerts.jsonl"))
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL", "")
+
+# 💡 只比對「本批有新價格」的商品：以 unnest 展開 (商品, 價格)，
+#    再走 alerts 的部分索引 (product_id, target_price) WHERE is_active 做範圍查詢，
+#    成本與價格變動數成正比，不隨提醒總數成長。
+#    觸發的提醒在同一語句中停用 (一次性)，多個 Worker 併發寫入也不會重複通知。
+_CLAIM_TRIGGERED_SQL = """
+    UPDATE alerts a
+    SET is_active = false, triggered_at = :now, triggered_price = c.price
+    FROM unnest(CAST(:pids AS INTEGER[]), CAST(:prices AS NUMERIC[])) AS c(product_id, price),
+         products p, users u
+    WHERE a.product_id = c.product_id
+      AND a.is_active
+      AND a.target_price >= c.price
+      AND p.id = a.product_id
+      AND u.id = a.user_id
+    RETURNING a.id AS alert_id, a.user_id, u.email, a.product_id,
+              p.name AS product_name, p.url, a.target_price, c.price
+"""
+
+
+# --- 1. 提醒比對 ---
+def claim_triggered_alerts(db, rows):
+    """
+    在價格寫入的同一交易中呼叫：rows 為本批寫入 price_history 的列。
+    回傳已觸發 (並已停用) 的提醒，呼叫端應在 Commit 成功後再交給 dispatch_alerts。
+    """
+    if not ALERTS_ENABLED or not rows:
+        return []
+    # 同一商品以本批最後一筆價格為準
+    latest = {}
+    for r in rows:
+        latest[r["product_id"]] = float(r["price"])
+    result = db.execute(text(_CLAIM_TRIGGERED_SQL), {
+        "pids": list(latest.keys()),
+        "prices": list(latest.values()),
+        "now": datetime.now(),
+    })
+    return [dict(row._mapping) for row in result]
+
+
+# --- 2. 通知管道 (Sink) ---
+class AlertSink:
+    """通知管道介面：send 收到一批已觸發的提醒，失敗時拋出例外即可 (由 dispatch_alerts 記錄)"""
+    def send(self, notifications):
+        raise NotImplementedError
+
+
+class FileSink(AlertSink):
+    """以 JSON Lines 追加寫入本地檔案 (開發 / 測試用的通知替身)"""
+    def __init__(self, path=ALERT_FILE_PATH):
+        self.path = path
+
+    def send(self, notifications):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for n in notifications:
+                f.write(json.dumps(n, ensure_ascii=False, default=str) + "\n")
+
+
+class WebhookSink(AlertSink):
+    """整批 POST 到 ALERT_WEBHOOK_URL (可接 Slack / LINE Notify 轉發服務等)"""
+    def __init__(self, url=ALERT_WEBHOOK_URL, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, notifications):
+        if not self.url:
+            return
+        payload = json.loads(json.dumps({"alerts": notifications}, default=str))
+        requests.post(self.url, json=payload, timeout=self.timeout).raise_for_status()
+
+
+SINK_TYPES = {
+    "file": FileSink,
+    "webhook": WebhookSink,
+}
+
+_sinks = None
+
+
+def register_sink(name, sink_cls):
+    """註冊自訂通知管道，並在 ALERT_SINKS 中以 name 啟用"""
+    global _sinks
+    SINK_TYPES[name] = sink_cls
+    _sinks = None
+
+
+def get_sinks():
+    global _sinks
+    if _sinks is None:
+        _sinks = []
+        for name in ALERT_SINKS:
+            sink_cls = SINK_TYPES.get(name)
+            if sink_cls is None:
+                logger.warning(f"⚠️ 未知的提醒通知管道: {name}")
+                continue
+            _sinks.append(sink_cls())
+    return _sinks
+
+
+def dispatch_alerts(notifications):
+    """把已觸發的提醒送往所有啟用的通知管道；單一管道失敗不影響其他管道"""
+    if not notifications:
+        return
+    for sink in get_sinks():
+        try:
+            sink.send(notifications)
+        except Exception as e:
+            logger.error(f"❌ 提醒通知失敗 ({type(sink).__name__}): {e}")
+    logger.info(f"🔔 已觸發 {len(notifications)} 筆降價提醒")
@@ -0,0 +1,99 @@
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+# --- 1. 分析參數 ---
+# 💡 百分位區間與「好價分數」的回看天數；最低 / 最高價則涵蓋全部歷史
+ANALYTICS_LOOKBACK_DAYS = int(os.getenv("ANALYTICS_LOOKBACK_DAYS", "365"))
+PERCENTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+# 好價分數門檻 -> 評語 (分數 = 回看期間內「收盤價不低於現價」的天數比例 × 100)
+VERDICTS = ((80, "great"), (60, "good"), (40, "fair"), (0, "high"))
+
+# 💡 以日彙總表 (每個型號 × 平台每天一列) 計算，成本只與天數有關，不隨 price_history 列數成長；
+#    現價取 prices 表中該型號在該平台的最低掛牌價。所有型號 × 平台一次查完。
+# 💡 avg_7d / avg_30d 是截至今天的「尾端平均」(近 N 天有資料的各日均價再取平均)，每列只有一個值，
+#    不是逐日的移動平均序列；需要走勢請用 /products/{model_id}/history。
+_ANALYTICS_SQL = """
+    WITH current AS (
+        SELECT p.model_id, p.platform_id, MIN(pr.price) AS price
+        FROM products p
+        JOIN prices pr ON pr.product_id = p.id
+        WHERE (CAST(:model_ids AS INTEGER[]) IS NULL OR p.model_id = ANY(:model_ids))
+        GROUP BY p.model_id, p.platform_id
+    ),
+    daily AS (
+        SELECT r.model_id, r.platform_id, r.bucket_start, r.min_price, r.max_price, r.avg_price, r.last_price,
+               c.price AS current_price
+        FROM price_rollup_daily r
+        LEFT JOIN current c ON c.model_id = r.model_id AND c.platform_id = r.platform_id
+        WHERE (CAST(:model_ids AS INTEGER[]) IS NULL OR r.model_id = ANY(:model_ids))
+    )
+    SELECT
+        d.model_id, pm.name AS model_name, pl.name AS platform,
+        CAST(MAX(d.current_price) AS FLOAT) AS current_price,
+        CAST(MIN(d.min_price) AS FLOAT) AS lowest_ever,
+        CAST(MAX(d.max_price) AS FLOAT) AS highest_ever,
+        CAST(AVG(d.avg_price) FILTER (WHERE d.bucket_start >= :since_7d) AS FLOAT) AS avg_7d,
+        CAST(AVG(d.avg_price) FILTER (WHERE d.bucket_start >= :since_30d) AS FLOAT) AS avg_30d,
+        percentile_cont(CAST(:percentiles AS FLOAT[])) WITHIN GROUP (ORDER BY d.last_price)
+            FILTER (WHERE d.bucket_start >= :since) AS bands,
+        COUNT(*) FILTER (WHERE d.bucket_start >= :since) AS days,
+        COUNT(*) FILTER (WHERE d.bucket_start >= :since AND d.last_price >= d.current_price) AS days_not_cheaper
+    FROM daily d
+    JOIN product_models pm ON pm.id = d.model_id
+    JOIN platforms pl ON pl.id = d.platform_id
+    GROUP BY d.model_id, pm.name, pl.name
+    ORDER BY d.model_id DESC, pl.name
+"""
+
+
+# --- 2. 指標 ---
+def good_price_score(days_not_cheaper, days):
+    """現價比回看期間內多少比例的日子便宜 (0~100，越高越值得買)；沒有資料時回傳 None"""
+    if not days:
+        return None
+    return round(100 * days_not_cheaper / days, 1)
+
+
+def verdict(score):
+    if score is None:
+        return None
+    return next(label for threshold, label in VERDICTS if score >= threshold)
+
+
+async def price_analytics(db, model_ids=None, today=None):
+    """回傳每個 (型號, 平台) 的價格統計、近 7 / 30 日均價、百分位區間與好價分數"""
+    today = (today or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = (await db.execute(text(_ANALYTICS_SQL), {
+        "model_ids": list(model_ids) if model_ids else None,
+        "since": today - timedelta(days=ANALYTICS_LOOKBACK_DAYS - 1),
+        "since_7d": today - timedelta(days=6),
+        "since_30d": today - timedelta(days=29),
+        "percentiles": list(PERCENTILES),
+    })).fetchall()
+
+    results = []
+    for r in rows:
+        score = good_price_score(r.days_not_cheaper, r.days) if r.current_price is not None else None
+        drop = None
+        if r.current_price is not None and r.highest_ever:
+            drop = round(100 * (r.highest_ever - r.current_price) / r.highest_ever, 1)
+        results.append({
+            "model_id": r.model_id,
+            "model_name": r.model_name,
+            "platform": r.platform,
+            "current_price": r.current_price,
+            "lowest_ever": r.lowest_ever,
+            "highest_ever": r.highest_ever,
+            "drop_from_max_pct": drop,
+            "avg_7d": round(r.avg_7d, 2) if r.avg_7d is not None else None,
+            "avg_30d": round(r.avg_30d, 2) if r.avg_30d is not None else None,
+            "percentiles": {
+                f"p{int(p * 100)}": round(v, 2) for p, v in zip(PERCENTILES, r.bands or [])
+            },
+            "good_price_score": score,
+            "verdict": verdict(score),
+        })
+    return results
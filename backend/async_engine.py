@@ -0,0 +1,241 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+import httpx
+
+from circuit_breaker import PLATFORM_LIMITS, CircuitOpenError, get_breaker
+from momo_extract import MomoPriceExtractor
+from scraper import MOMO_CHUNK_SIZE, PCHOME_BATCH_SIZE, PriceScraper, logger
+from validator_store import NOT_MODIFIED
+
+
+# --- 1. 各平台併發與速率配置 (PLATFORM_LIMITS 定義於 circuit_breaker) ---
+# 主機名稱 -> 平台，用來決定每個主機套用哪一組限制
+HOST_PLATFORMS = {
+    "momoshop.com.tw": "momo",
+    "pchome.com.tw": "pchome",
+}
+
+
+def platform_for_host(host):
+    for suffix, platform in HOST_PLATFORMS.items():
+        if host == suffix or host.endswith("." + suffix):
+            return platform
+    return "momo"  # 未知主機套用最保守的配置
+
+
+# --- 2. Token Bucket 速率限制器 ---
+class AsyncTokenBucket:
+    """
+    經典 Token Bucket：以固定速率補充令牌，容量決定可容忍的瞬間突發量。
+    取代舊版固定的 time.sleep，讓總耗時取決於允許速率而非商品數量。
+    """
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = max(rate, 0.01)
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def set_rate(self, rate: float):
+        """AIMD 調整速率時呼叫：先以舊速率結算令牌，再套用新速率"""
+        self._refill()
+        self.rate = max(rate, 0.01)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        # 💡 鎖住整個等待流程，確保請求依 FIFO 順序取得令牌
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HostGate:
+    """單一主機的閘門：Semaphore 控制併發、Token Bucket 控制速率、斷路器決定是否放行與速率高低"""
+    def __init__(self, concurrency: int, breaker):
+        self.semaphore = asyncio.Semaphore(max(concurrency, 1))
+        self.breaker = breaker
+        self.bucket = AsyncTokenBucket(breaker.rate)
+
+
+# --- 3. 非同步爬蟲引擎 ---
+async def gather_or_cancel(coros):
+    """
+    同 asyncio.gather，但任一協程拋出例外時先取消其餘仍在執行的協程再拋出
+    (asyncio.gather 預設會讓其餘協程繼續在背景執行)。
+    """
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class AsyncScrapeEngine:
+    """
+    以 httpx.AsyncClient 同時抓取多個商品，解析邏輯沿用 PriceScraper，
+    確保同步與非同步兩種模式的結果一致。
+    """
+    def __init__(self, scraper: PriceScraper = None, limits: dict = None, timeout: float = 15):
+        self.scraper = scraper or PriceScraper()
+        self.limits = limits or PLATFORM_LIMITS
+        self.timeout = timeout
+        self._gates = {}
+
+    def _gate(self, url):
+        host = urlparse(url).hostname or ""
+        gate = self._gates.get(host)
+        if gate is None:
+            platform = platform_for_host(host)
+            gate = HostGate(self.limits[platform]["concurrency"], get_breaker(platform))
+            self._gates[host] = gate
+        return gate
+
+    @asynccontextmanager
+    async def _slot(self, url):
+        """
+        取得對某主機發出一個請求的許可：
+        斷路中則等待 (超過 BREAKER_MAX_PAUSE_SECONDS 直接拋出 CircuitOpenError)，
+        再依斷路器目前的 AIMD 速率取得令牌。
+        """
+        gate = self._gate(url)
+        async with gate.semaphore:
+            await gate.breaker.wait_until_allowed()
+            gate.bucket.set_rate(gate.breaker.rate)
+            await gate.bucket.acquire()
+            yield gate
+
+    async def fetch(self, client: httpx.AsyncClient, url: str, platform: str, headers: dict = None):
+        async with self._slot(url) as gate:
+            started = time.monotonic()
+            try:
+                res = await client.get(url, headers=headers or self.scraper.get_headers(platform), timeout=self.timeout)
+            except httpx.HTTPError:
+                gate.breaker.record(None, time.monotonic() - started)
+                raise
+            gate.breaker.record(res.status_code, time.monotonic() - started)
+            return res
+
+    async def scrape_momo(self, client, i_code):
+        url = self.scraper.momo_url(i_code)
+        try:
+            async with self._slot(url) as gate:
+                # 💡 串流讀取：價格一出現就結束，不必下載與解析整頁
+                headers = self.scraper.conditional_headers("Momo", self.scraper.momo_validator_key(i_code))
+                request = client.build_request("GET", url, headers=headers, timeout=self.timeout)
+                started = time.monotonic()
+                try:
+                    res = await client.send(request, stream=True)
+                except httpx.HTTPError:
+                    gate.breaker.record(None, time.monotonic() - started)
+                    raise
+                gate.breaker.record(res.status_code, time.monotonic() - started)
+                try:
+                    if res.status_code == 304: return NOT_MODIFIED
+                    if res.status_code != 200: return None
+                    extractor = MomoPriceExtractor()
+                    async for chunk in res.aiter_text(MOMO_CHUNK_SIZE):
+                        if extractor.feed(chunk):
+                            break
+                finally:
+                    await res.aclose()
+            price = self.scraper.finish_momo_extract(extractor)
+            return self.scraper.remember_momo_price(i_code, res.headers, price)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Momo 抓取失敗 ({i_code}): {e}")
+        return None
+
+    async def scrape_pchome(self, client, prod_id):
+        clean_id = str(prod_id).strip()
+        try:
+            res = await self.fetch(
+                client, self.scraper.pchome_api_url(clean_id), "PChome",
+                headers=self.scraper.conditional_headers("PChome", self.scraper.pchome_validator_key(clean_id))
+            )
+            price = self.scraper.handle_pchome_api_response(clean_id, res.status_code, res.headers, res.text)
+            if price: return price
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ PChome API 失敗，改用網頁解析 ({clean_id}): {e}")
+
+        return await self.scrape_pchome_frontend(client, clean_id)
+
+    async def scrape_pchome_batch(self, client, prod_ids):
+        """單一 API 請求查詢多個商品；批次回應中缺少的商品才併發改用網頁解析"""
+        ids = [str(pid).strip() for pid in prod_ids]
+        results = {}
+        try:
+            res = await self.fetch(client, self.scraper.pchome_api_url(",".join(ids)), "PChome")
+            results = self.scraper.handle_pchome_batch_response(ids, res.status_code, res.text)
+        except CircuitOpenError:
+            # 斷路中：不再逐一嘗試網頁解析，交由 run() 取消其餘請求
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ PChome 批次 API 失敗 ({len(ids)} 筆)，改用網頁解析: {e}")
+
+        missing = [pid for pid in ids if pid not in results]
+        prices = await gather_or_cancel(self.scrape_pchome_frontend(client, pid) for pid in missing)
+        results.update(zip(missing, prices))
+        return results
+
+    async def scrape_pchome_frontend(self, client, clean_id):
+        try:
+            res = await self.fetch(client, self.scraper.pchome_frontend_url(clean_id), "PChome")
+            return self.scraper.parse_pchome_frontend(res.text)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"❌ PChome 網頁解析出錯 ({clean_id}): {e}")
+        return None
+
+    async def _scrape_pchome_chunk(self, client, chunk, on_result):
+        prices = await self.scrape_pchome_batch(client, [item.product_id_on_platform for item in chunk])
+        for item in chunk:
+            on_result(item, prices.get(str(item.product_id_on_platform).strip()))
+
+    async def _scrape_item(self, client, item, target_platform, on_result):
+        if "momo" in target_platform.lower():
+            price_val = await self.scrape_momo(client, item.product_id_on_platform)
+        else:
+            price_val = await self.scrape_pchome(client, item.product_id_on_platform)
+        on_result(item, price_val)
+
+    async def run(self, items, target_platform, on_result):
+        """
+        併發抓取所有 items，每完成一筆即呼叫 on_result(item, price)。
+        on_result 在事件迴圈中同步執行，應保持輕量 (例如只做 DB 寫入)。
+        任一平台斷路逾時 (CircuitOpenError) 時取消尚未完成的請求並拋出，與同步引擎一樣提前結束；
+        已回報的結果不受影響。
+        """
+        async with httpx.AsyncClient(follow_redirects=True) as client:
+            if "momo" not in target_platform.lower() and PCHOME_BATCH_SIZE > 1:
+                # 💡 PChome 批次模式：每個 chunk 一次 API 請求，各 chunk 之間仍受主機閘門限制
+                await gather_or_cancel(
+                    self._scrape_pchome_chunk(client, items[start:start + PCHOME_BATCH_SIZE], on_result)
+                    for start in range(0, len(items), PCHOME_BATCH_SIZE)
+                )
+                return
+            await gather_or_cancel(
+                self._scrape_item(client, item, target_platform, on_result)
+                for item in items
+            )
+
+    def run_sync(self, items, target_platform, on_result):
+        """給 Celery 等同步環境使用的進入點"""
+        asyncio.run(self.run(items, target_platform, on_result))
@@ -1,15 +1,19 @@
 import os
+import time
 import logging
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status, Request  # 💡 引入 Request
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
-# 💡 確保引入你的資料庫模型與 SessionLocal
-from database import SessionLocal
+# 💡 確保引入你的資料庫模型與非同步 Session 依賴
+from database import get_async_db
 from models import User
 
 # --- 配置區 ---
@@ -17,6 +21,10 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-super-secret-key-for-dev")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# 💡 已解析使用者的行程內快取：命中時整個驗證流程不需查詢資料庫
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", "60"))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "1024"))
+
 pwd_context = CryptContext(
     schemes=["bcrypt"], 
     deprecated="auto",
@@ -26,14 +34,6 @@ pwd_context = CryptContext(
 # 用於 Swagger UI 登入
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login", auto_error=False) 
 
-# --- 資料庫依賴 ---
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # --- 工具函式 ---
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     try:
@@ -50,18 +50,125 @@ def get_password_hash(password: str) -> str:
         password = password[:72]
     return pwd_context.hash(password)
 
-def create_access_token(data: dict):
+def create_access_token(data: dict, user: Optional[User] = None):
+    """
+    簽發 JWT。傳入 user 時會一併寫入 uid / act (是否啟用) / ver (token 版本) 聲明，
+    驗證端即可直接由 Token 判斷身分，不必每次以 email 查詢 users 表。
+    """
     to_encode = data.copy()
+    if user is not None:
+        to_encode.update({"uid": user.id, "act": bool(user.is_active), "ver": user.token_version or 0})
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+# --- 使用者快取 (TTL + LRU) ---
+
+@dataclass(frozen=True)
+class AuthUser:
+    """從 users 表取出的唯讀快照，欄位與路由實際用到的 User 屬性一致 (可直接給 UserProfileSchema 使用)"""
+    id: int
+    username: str
+    email: str
+    is_active: bool
+    token_version: int
+    created_at: Optional[datetime] = None
+
+    @classmethod
+    def from_model(cls, user: User) -> "AuthUser":
+        return cls(
+            id=user.id, username=user.username, email=user.email,
+            is_active=bool(user.is_active), token_version=user.token_version or 0,
+            created_at=user.created_at,
+        )
+
+
+class UserCache:
+    """
+    簡易 TTL + LRU 快取 (uid -> AuthUser)。
+    - 超過 maxsize 時淘汰最久未使用的項目
+    - 項目存活 ttl 秒後失效，確保停權 / 撤銷 Token 最遲 ttl 秒內在每個 API 行程生效
+    """
+    def __init__(self, maxsize: int = AUTH_USER_CACHE_SIZE, ttl: int = AUTH_USER_CACHE_TTL):
+        self.maxsize = max(maxsize, 1)
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, uid):
+        entry = self._data.get(uid)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._data[uid]
+            return None
+        self._data.move_to_end(uid)
+        return user
+
+    def set(self, uid, user: AuthUser):
+        self._data[uid] = (time.monotonic() + self.ttl, user)
+        self._data.move_to_end(uid)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def evict(self, uid):
+        self._data.pop(uid, None)
+
+
+user_cache = UserCache()
+
 # --- 核心驗證邏輯 ---
 
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalar_one_or_none()
+
+async def _resolve_user(payload: dict, db: AsyncSession) -> Optional[AuthUser]:
+    """
+    由已驗證簽章的 payload 解析出使用者，失敗回傳 None。
+    💡 AsyncSession 在第一次 execute 前不會借出連線，因此快取命中時完全不碰 Postgres。
+    """
+    uid = payload.get("uid")
+    if uid is None:
+        # 舊版 Token (只有 sub)：以 email 查詢一次後寫入快取
+        email = payload.get("sub")
+        if email is None:
+            return None
+        user = await get_user_by_email(db, email)
+        if user is None:
+            return None
+        cached = AuthUser.from_model(user)
+        user_cache.set(cached.id, cached)
+    elif payload.get("act") is False:
+        return None
+    else:
+        cached = user_cache.get(uid)
+
+    if cached is None:
+        user = await db.get(User, uid)
+        if user is None:
+            return None
+        cached = AuthUser.from_model(user)
+        user_cache.set(uid, cached)
+
+    # 💡 Token 版本落後 = 已被撤銷；帳號停用同樣拒絕
+    if not cached.is_active or payload.get("ver", 0) != cached.token_version:
+        return None
+    return cached
+
+async def revoke_user_tokens(db: AsyncSession, user_id: int):
+    """遞增 token_version，讓該使用者目前所有的 JWT 失效"""
+    user = await db.get(User, user_id)
+    if user is None:
+        return
+    user.token_version = (user.token_version or 0) + 1
+    await db.commit()
+    user_cache.evict(user_id)
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme), 
-    db: Session = Depends(get_db)
-):
+    db: AsyncSession = Depends(get_async_db)
+) -> AuthUser:
     """
     強制驗證：用於需要登入才能操作的 API (如：新增收藏、觸發爬蟲)
     """
@@ -76,24 +183,21 @@ async def get_current_user(
 
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.email == email).first()
+    user = await _resolve_user(payload, db)
     if user is None:
         raise credentials_exception
     return user
 
 async def get_current_user_optional(
     request: Request, # 💡 直接從 Request 拿 Header，避開 OAuth2Bearer 的強制錯誤
-    db: Session = Depends(get_db)
-) -> Optional[User]:
+    db: AsyncSession = Depends(get_async_db)
+) -> Optional[AuthUser]:
     """
     非強制驗證：用於產品列表。
-    如果有正確 Token 就回傳 User，其餘情況（沒帶、過期、錯誤）一律回傳 None。
+    如果有正確 Token 就回傳 User，其餘情況（沒帶、過期、錯誤、已撤銷）一律回傳 None。
     """
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
@@ -102,12 +206,7 @@ async def get_current_user_optional(
     try:
         token = auth_header.split(" ")[1]
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-        
-        user = db.query(User).filter(User.email == email).first()
-        return user
+        return await _resolve_user(payload, db)
     except (JWTError, IndexError, Exception):
         # 💡 這裡發生任何錯誤都不報錯，直接當作未登入訪客
-        return None
\ No newline at end of file
+        return None
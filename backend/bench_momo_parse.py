@@ -0,0 +1,69 @@
+"""
+Momo 價格擷取微基準：比較 BeautifulSoup 全樹解析與 momo_extract 快速路徑。
+
+用法：
+    python bench_momo_parse.py                      # tests/fixtures/momo 的商品頁樣本 + 放大的模擬頁
+    python bench_momo_parse.py saved_page.html ...  # 使用自行存下的 Momo 商品頁
+"""
+import sys
+import timeit
+from pathlib import Path
+
+from momo_extract import extract_momo_price
+from scraper import MOMO_CHUNK_SIZE, PriceScraper
+
+FIXTURES = Path(__file__).parent / "tests" / "fixtures" / "momo"
+
+
+def synthetic_page(price_in="meta", body_kb=600):
+    """產生結構接近 Momo 商品頁的 HTML：大量 <head> 資源 + 數百 KB 的商品描述 / 推薦區塊"""
+    head = ['<!DOCTYPE html><html lang="zh-TW"><head><meta charset="utf-8">',
+            '<title>Apple iPhone 17 Pro 256G - momo購物網</title>']
+    head += [f'<link rel="stylesheet" href="/static/css/goods_{i}.css">' for i in range(40)]
+    head += [f'<script src="/static/js/lib_{i}.js"></script>' for i in range(40)]
+    if price_in == "meta":
+        head.append('<meta property="product:price:amount" content="38,900">')
+    head.append('<script type="application/ld+json">{"@context":"https://schema.org",'
+                '"@type":"Product","name":"Apple iPhone 17 Pro",'
+                '"offers":{"@type":"Offer","priceCurrency":"TWD","price":"38900"}}</script>')
+    head.append('</head><body>')
+    block = ('<div class="prdListArea"><ul>' +
+             ''.join(f'<li class="goodsItem"><a href="/goods/{i}"><span class="price">'
+                     f'<b>{1000 + i}</b></span><p>推薦商品 {i}</p></a></li>' for i in range(50)) +
+             '</ul></div>')
+    body = [block] * max(body_kb * 1024 // len(block), 1)
+    return ''.join(head + body + ['</body></html>'])
+
+
+def chunked(text, size=MOMO_CHUNK_SIZE):
+    return (text[i:i + size] for i in range(0, len(text), size))
+
+
+def bench(name, html, number=5):
+    scraper = PriceScraper()
+    cases = {
+        "bs4 全樹解析": lambda: scraper._parse_momo_soup(html),
+        "regex 整頁": lambda: scraper.parse_momo_html(html),
+        "regex 串流": lambda: scraper.parse_momo_stream(chunked(html)),
+    }
+    expected = scraper._parse_momo_soup(html)
+    print(f"\n📄 {name} ({len(html) / 1024:.0f} KB) 預期價格 = {expected}，快速路徑 = {extract_momo_price(html)}")
+    baseline = None
+    for label, fn in cases.items():
+        assert fn() == expected, f"{label} 結果不一致"
+        seconds = min(timeit.repeat(fn, number=number, repeat=3)) / number
+        baseline = baseline or seconds
+        print(f"  {label:<12} {seconds * 1000:8.2f} ms/頁   x{baseline / seconds:7.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                bench(path, f.read())
+    else:
+        # 💡 樣本頁只保留與價格相關的標籤，用來確認結果一致；耗時差距以放大的模擬頁為準
+        for path in sorted(FIXTURES.glob("*.html")):
+            bench(f"樣本 {path.name}", path.read_text(encoding="utf-8"))
+        bench("模擬頁 (meta)", synthetic_page("meta"))
+        bench("模擬頁 (僅 JSON-LD)", synthetic_page("json-ld"))
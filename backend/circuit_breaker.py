@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+import redis
+
+from redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger("PriceScraper")
+
+
+# --- 1. 各平台併發與速率配置 ---
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return float(default)
+
+
+# 💡 concurrency = 同一主機同時在途的請求數；rate = 起始速率 (每秒請求數)
+#    min_rate / max_rate = AIMD 自動調整的上下限，實際速率會收斂到網站可承受的最快速度
+PLATFORM_LIMITS = {
+    "momo": {
+        "concurrency": int(_env_float("MOMO_MAX_CONCURRENCY", 4)),
+        "rate": _env_float("MOMO_RATE_PER_SEC", 0.5),
+        "min_rate": _env_float("MOMO_MIN_RATE_PER_SEC", 0.05),
+        "max_rate": _env_float("MOMO_MAX_RATE_PER_SEC", 2.0),
+    },
+    "pchome": {
+        "concurrency": int(_env_float("PCHOME_MAX_CONCURRENCY", 8)),
+        "rate": _env_float("PCHOME_RATE_PER_SEC", 2.0),
+        "min_rate": _env_float("PCHOME_MIN_RATE_PER_SEC", 0.1),
+        "max_rate": _env_float("PCHOME_MAX_RATE_PER_SEC", 8.0),
+    },
+}
+
+# --- 2. 斷路器參數 ---
+BREAKER_WINDOW = int(_env_float("BREAKER_WINDOW", 20))                      # 滑動視窗請求數
+BREAKER_FAILURE_RATIO = _env_float("BREAKER_FAILURE_RATIO", 0.5)            # 視窗內失敗比例達此值即斷路
+BREAKER_CONSECUTIVE_FAILURES = int(_env_float("BREAKER_CONSECUTIVE_FAILURES", 5))
+BREAKER_COOLDOWN_SECONDS = _env_float("BREAKER_COOLDOWN_SECONDS", 60)       # 第一次斷路的暫停時間，之後倍增
+BREAKER_MAX_COOLDOWN_SECONDS = _env_float("BREAKER_MAX_COOLDOWN_SECONDS", 1800)
+BREAKER_MAX_PAUSE_SECONDS = _env_float("BREAKER_MAX_PAUSE_SECONDS", 300)    # 任務內最多等待多久，超過即放棄
+BREAKER_SLOW_SECONDS = _env_float("BREAKER_SLOW_SECONDS", 8)                # 回應超過此秒數視為壅塞前兆
+BREAKER_SYNC_SECONDS = _env_float("BREAKER_SYNC_SECONDS", 2)                # 與 Redis 同步狀態的最短間隔
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """主機處於斷路狀態且暫停時間超過 BREAKER_MAX_PAUSE_SECONDS"""
+    def __init__(self, platform, retry_after):
+        super().__init__(f"{platform} 暫停請求中，{retry_after:.0f} 秒後再試")
+        self.platform = platform
+        self.retry_after = retry_after
+
+
+def _is_throttled(status_code):
+    # 💡 429 / 403 (封鎖) / 5xx / 連線例外 (None) 都視為「網站在叫我們慢下來」
+    return status_code is None or status_code in (403, 429) or status_code >= 500
+
+
+# --- 3. 斷路器 + AIMD 速率控制 ---
+class HostBreaker:
+    """
+    單一平台的斷路器與 AIMD (加法增、乘法減) 速率控制：
+    - closed：每次成功把速率加上一小步；被限流或延遲飆高時速率減半
+    - open：連續失敗或視窗內失敗比例過高即暫停，暫停時間每次倍增
+    - half_open：暫停結束後只放行一個探測請求，成功才恢復，失敗則再次暫停
+
+    斷路狀態寫入 Redis (HASH breaker:<platform>)，所有 Worker 與 API 共享；
+    速率則由各行程依自己觀察到的回應各自調整。
+    """
+    def __init__(self, platform, rate, min_rate, max_rate, client=None):
+        self.platform = platform
+        self.min_rate = max(min_rate, 0.01)
+        self.max_rate = max(max_rate, self.min_rate)
+        self.rate = min(max(rate, self.min_rate), self.max_rate)
+        self.step = max(rate * 0.05, 0.01)
+        self.state = CLOSED
+        self.opened_until = 0.0
+        self.open_count = 0
+        self.consecutive_failures = 0
+        self.window = deque(maxlen=max(BREAKER_WINDOW, 1))
+        self.client = client
+        self._probe_in_flight = False
+        self._last_request_at = 0.0
+        self._synced_at = 0.0
+        self._published_at = 0.0
+
+    @property
+    def key(self):
+        return f"breaker:{self.platform}"
+
+    def _redis(self):
+        return self.client or get_redis()
+
+    # --- 放行判斷 ---
+    def wait_time(self):
+        """回傳 0 = 可以送出請求；> 0 = 需等待的秒數 (等待後應再呼叫一次)"""
+        self._sync()
+        now = time.time()
+        if self.state == OPEN:
+            if now < self.opened_until:
+                return self.opened_until - now
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._probe_in_flight:
+                return 1.0
+            self._probe_in_flight = True
+        return 0
+
+    def _check_pause(self, wait):
+        if wait > BREAKER_MAX_PAUSE_SECONDS:
+            raise CircuitOpenError(self.platform, wait)
+
+    def before_request(self):
+        """同步爬蟲使用：必要時等待斷路結束，並依目前速率控制請求間隔"""
+        while True:
+            wait = self.wait_time()
+            if not wait:
+                break
+            self._check_pause(wait)
+            time.sleep(wait)
+        gap = self._last_request_at + 1.0 / self.rate - time.monotonic()
+        if gap > 0:
+            time.sleep(gap)
+        self._last_request_at = time.monotonic()
+
+    async def wait_until_allowed(self):
+        """非同步引擎使用：只處理斷路等待，速率控制交給 HostGate 的 Token Bucket"""
+        while True:
+            wait = self.wait_time()
+            if not wait:
+                return
+            self._check_pause(wait)
+            await asyncio.sleep(wait)
+
+    # --- 回饋 ---
+    def record(self, status_code, latency):
+        """每個請求結束後回報狀態碼 (例外時傳 None) 與耗時"""
+        throttled = _is_throttled(status_code)
+        self.window.append(throttled)
+
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = False
+            if throttled:
+                self._open()
+            else:
+                self._transition(CLOSED)
+                self.open_count = 0
+                logger.info(f"🟢 {self.platform} 探測成功，恢復請求 (rate={self.rate:.2f}/s)")
+            return
+
+        if throttled:
+            self.consecutive_failures += 1
+            self.rate = max(self.min_rate, self.rate * 0.5)
+            failures = sum(self.window)
+            if (self.consecutive_failures >= BREAKER_CONSECUTIVE_FAILURES
+                    or (len(self.window) >= self.window.maxlen // 2
+                        and failures / len(self.window) >= BREAKER_FAILURE_RATIO)):
+                self._open()
+                return
+        else:
+            self.consecutive_failures = 0
+            if latency is not None and latency > BREAKER_SLOW_SECONDS:
+                self.rate = max(self.min_rate, self.rate * 0.8)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.step)
+        self._publish()
+
+    def _open(self):
+        self.open_count += 1
+        cooldown = min(BREAKER_COOLDOWN_SECONDS * 2 ** (self.open_count - 1), BREAKER_MAX_COOLDOWN_SECONDS)
+        self.opened_until = time.time() + cooldown
+        self.rate = max(self.min_rate, self.rate * 0.5)
+        self.consecutive_failures = 0
+        self.window.clear()
+        self._transition(OPEN)
+        logger.warning(f"🔴 {self.platform} 疑似限流，暫停 {cooldown:.0f} 秒 (rate={self.rate:.2f}/s)")
+
+    def _transition(self, state):
+        self.state = state
+        self._publish(force=True)
+
+    # --- Redis 同步 ---
+    def snapshot(self):
+        return {
+            "platform": self.platform,
+            "state": self.state,
+            "rate": round(self.rate, 3),
+            "opened_until": self.opened_until,
+            "open_count": self.open_count,
+        }
+
+    def _publish(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._published_at < BREAKER_SYNC_SECONDS:
+            return
+        self._published_at = now
+        try:
+            pipe = self._redis().pipeline(transaction=False)
+            pipe.hset(self.key, mapping={**self.snapshot(), "updated_at": time.time()})
+            pipe.expire(self.key, 86400)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.debug(f"斷路器狀態寫入失敗: {e}")
+
+    def _sync(self):
+        """其他 Worker 觸發的斷路也要遵守：Redis 上的暫停期限比本地晚時採用之"""
+        now = time.monotonic()
+        if now - self._synced_at < BREAKER_SYNC_SECONDS:
+            return
+        self._synced_at = now
+        try:
+            remote = self._redis().hgetall(self.key)
+        except redis.RedisError:
+            return
+        if remote.get("state") == OPEN and float(remote.get("opened_until", 0)) > self.opened_until:
+            self.opened_until = float(remote["opened_until"])
+            self.open_count = max(self.open_count, int(remote.get("open_count", 1)))
+            self.rate = min(self.rate, max(float(remote.get("rate", self.rate)), self.min_rate))
+            self.state = OPEN
+
+
+# --- 4. 行程內的斷路器註冊表 ---
+_breakers = {}
+
+
+def get_breaker(platform) -> HostBreaker:
+    key = platform.lower()
+    breaker = _breakers.get(key)
+    if breaker is None:
+        conf = PLATFORM_LIMITS.get(key, PLATFORM_LIMITS["momo"])  # 未知平台套用最保守的配置
+        breaker = HostBreaker(key, conf["rate"], conf["min_rate"], conf["max_rate"])
+        _breakers[key] = breaker
+    return breaker
+
+
+async def read_breaker_states():
+    """API 使用：讀取各平台在 Redis 上的共享狀態"""
+    states = []
+    client = get_async_redis()
+    for platform in PLATFORM_LIMITS:
+        raw = await client.hgetall(f"breaker:{platform}")
+        if raw and raw.get("state") == OPEN and float(raw.get("opened_until", 0)) <= time.time():
+            raw["state"] = HALF_OPEN  # 暫停期已過，下一個請求即為探測
+        states.append({
+            "platform": platform,
+            "state": raw.get("state", CLOSED) if raw else CLOSED,
+            "rate": float(raw["rate"]) if raw and raw.get("rate") else PLATFORM_LIMITS[platform]["rate"],
+            "opened_until": float(raw["opened_until"]) if raw and raw.get("opened_until") else None,
+            "open_count": int(raw.get("open_count", 0)) if raw else 0,
+        })
+    return states
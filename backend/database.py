@@ -1,5 +1,6 @@
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 
@@ -15,6 +16,7 @@ DB_PORT = os.getenv("POSTGRES_PORT", "5432")
 
 # 💡 3. 動態構建連線字串
 SQLALCHEMY_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 # 💡 4. 建立引擎：加入 pool_pre_ping 與 pool_size 優化效能
 engine = create_engine(
@@ -32,4 +34,22 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# 💡 5. 非同步引擎 (FastAPI 專用)：asyncpg 驅動，查詢等待期間不阻塞事件迴圈
+#    同步的 SessionLocal 保留給 Celery Worker、爬蟲與 Seed 等非 async 環境使用
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=10,
+    max_overflow=20
+)
+
+# expire_on_commit=False：Commit 後仍可讀取已載入的屬性 (例如 current_user.id)，
+# 避免在 async 環境中觸發隱式的延遲載入
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+async def get_async_db():
+    """FastAPI Dependency: 每個請求一個 AsyncSession，同一請求內的依賴共用同一個 Session"""
+    async with AsyncSessionLocal() as db:
+        yield db
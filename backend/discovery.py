@@ -0,0 +1,250 @@
+"""
+商品自動發現 (取代 seed.py 啟動時的一次性搜尋)：
+
+    python discovery.py                       # 以 SEARCH_ENTRIES 與 DISCOVERY_KEYWORDS 執行一次
+    python discovery.py "iPhone 17 Slim"      # 只搜尋指定關鍵字
+
+排程：worker.discover_products_task (每 6 小時)；seed.py 在首次啟動時也會派發一次。
+"""
+import asyncio
+import logging
+import os
+import re
+import sys
+from urllib.parse import quote
+
+import httpx
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from async_engine import AsyncScrapeEngine
+from circuit_breaker import CircuitOpenError
+from database import SessionLocal
+from models import Product
+from response_cache import invalidate_prices
+
+logger = logging.getLogger("PriceScraper")
+
+# --- 1. 搜尋參數 ---
+# 💡 每個 (關鍵字, 平台) 最多翻幾頁；通常在遇到「整頁都是已知商品」時就提前停止
+DISCOVERY_MAX_PAGES = int(os.getenv("DISCOVERY_MAX_PAGES", "10"))
+# 額外的搜尋關鍵字 (逗號分隔)，分類一律為 iPhone
+DISCOVERY_KEYWORDS = [k.strip() for k in os.getenv("DISCOVERY_KEYWORDS", "").split(",") if k.strip()]
+
+MOMO_SEARCH_URL = "https://m.momoshop.com.tw/search.momo?searchKeyword={q}&curPage={page}"
+PCHOME_SEARCH_URL = "https://ecshweb.pchome.com.tw/search/v3.3/all/results?q={q}&page={page}&sort=rnk/dc"
+
+# Momo 行動版搜尋頁需以行動裝置 UA 存取
+MOBILE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (iPhone; CPU iPhone OS 18_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.1 Mobile/15E148 Safari/604.1",
+}
+
+MODEL_DEFINITIONS = [
+    {"name": "iPhone 17 Pro Max", "keywords": ["17 PRO MAX", "17PROMAX"]},
+    {"name": "iPhone 17 Pro", "keywords": ["17 PRO", "17PRO"]},
+    {"name": "iPhone 17 Slim", "keywords": ["17 SLIM", "17SLIM", "17 AIR"]},
+    {"name": "iPhone 17", "keywords": ["IPHONE 17", "IPHONE17"]},
+]
+
+SEARCH_ENTRIES = [
+    {"category": "iPhone", "keyword": "iPhone 17 Pro Max"},
+    {"category": "iPhone", "keyword": "iPhone 17 Pro"},
+]
+
+
+def search_entries():
+    entries = list(SEARCH_ENTRIES)
+    known = {e["keyword"].lower() for e in entries}
+    entries += [{"category": "iPhone", "keyword": k} for k in DISCOVERY_KEYWORDS if k.lower() not in known]
+    return entries
+
+
+# --- 2. 名稱對應與搜尋結果解析 ---
+def map_to_model(product_name):
+    if not product_name: return None
+    name_upper = product_name.upper().replace(" ", "")
+    sorted_defs = sorted(MODEL_DEFINITIONS, key=lambda x: len(x['name']), reverse=True)
+    for model in sorted_defs:
+        for kw in model["keywords"]:
+            if kw.upper().replace(" ", "") in name_upper:
+                return model["name"]
+    return None
+
+
+def clean_momo_name(raw_name):
+    if not raw_name: return ""
+    try:
+        processed = raw_name.replace('\\"', '"').replace('\\\\', '\\')
+        processed = processed.encode('utf-8').decode('unicode_escape')
+        return processed.encode('latin1').decode('utf-8')
+    except Exception:
+        return raw_name
+
+
+def parse_momo_search(html_content):
+    codes = re.findall(r'i_code=(\d+)', html_content)
+    names = re.findall(r'\\"goodsName\\":\\"(.*?)\\"', html_content)
+    if not names:
+        names = re.findall(r'"goodsName":"(.*?)"', html_content)
+    listings, seen_ids = [], set()
+    for g_id, name in zip(codes, names):
+        if g_id not in seen_ids:
+            seen_ids.add(g_id)
+            listings.append({
+                "id": g_id,
+                "name": clean_momo_name(name),
+                "url": f"https://www.momoshop.com.tw/goods/GoodsDetail.jsp?i_code={g_id}"
+            })
+    return listings
+
+
+def parse_pchome_search(data):
+    """回傳 (商品列表, 總頁數)"""
+    listings = [
+        {"id": p["Id"], "name": p["name"], "url": f"https://24h.pchome.com.tw/prod/{p['Id']}"}
+        for p in data.get("prods") or []
+    ]
+    return listings, int(data.get("totalPage") or 0)
+
+
+# --- 3. 增量發現 ---
+class DiscoveryRun:
+    """
+    一次發現流程的狀態：
+    - known：資料庫中既有的 {(platform_id, 平台商品 ID): 名稱}，啟動時一次載入
+    - changes：本次找到的新商品或改名商品，最後一次性 Upsert
+    各 (關鍵字, 平台) 併發翻頁，某一頁沒有任何新 ID 即停止該組的翻頁。
+    """
+    def __init__(self, known, platform_ids, engine=None, max_pages=DISCOVERY_MAX_PAGES):
+        self.known = known
+        self.platform_ids = platform_ids
+        self.engine = engine or AsyncScrapeEngine()
+        self.max_pages = max_pages
+        self.changes = {}
+        self.stats = {"pages": 0, "listings": 0, "new": 0, "renamed": 0}
+
+    def absorb(self, platform_id, listings):
+        """記錄一頁的結果，回傳本頁新出現的商品數 (既有商品與本次已見過的不計)"""
+        fresh = 0
+        for info in listings:
+            key = (platform_id, str(info["id"]))
+            if key in self.changes:
+                continue
+            name = self.known.get(key)
+            if name is None:
+                fresh += 1
+                self.stats["new"] += 1
+            elif name == info["name"]:
+                continue
+            else:
+                self.stats["renamed"] += 1
+            self.changes[key] = info
+        self.stats["listings"] += len(listings)
+        return fresh
+
+    async def _fetch_page(self, client, platform, keyword, page):
+        """回傳 (商品列表, 是否還有下一頁)"""
+        if platform == "momo":
+            res = await self.engine.fetch(
+                client, MOMO_SEARCH_URL.format(q=quote(keyword), page=page), "Momo", headers=MOBILE_HEADERS
+            )
+            listings = parse_momo_search(res.text)
+            return listings, bool(listings)
+        res = await self.engine.fetch(client, PCHOME_SEARCH_URL.format(q=quote(keyword), page=page), "PChome")
+        listings, total_pages = parse_pchome_search(res.json())
+        return listings, page < total_pages
+
+    async def walk(self, client, entry, platform):
+        platform_id = self.platform_ids[platform]
+        for page in range(1, self.max_pages + 1):
+            try:
+                listings, has_more = await self._fetch_page(client, platform, entry["keyword"], page)
+            except CircuitOpenError:
+                logger.warning(f"⚠️ {platform} 斷路中，停止搜尋: {entry['keyword']}")
+                return
+            except Exception as e:
+                logger.error(f"❌ {platform} 發現失敗 ({entry['keyword']} 第 {page} 頁): {e}")
+                return
+            self.stats["pages"] += 1
+            fresh = self.absorb(platform_id, listings)
+            if not fresh or not has_more:
+                logger.info(f"🔎 {platform} {entry['keyword']}: 第 {page} 頁停止 (新商品 {fresh})")
+                return
+
+    async def run(self, entries):
+        async with httpx.AsyncClient(follow_redirects=True) as client:
+            if "momo" in self.platform_ids:
+                # Momo 行動版搜尋需要先取得首頁 Cookie
+                try:
+                    await self.engine.fetch(client, "https://m.momoshop.com.tw/main.momo", "Momo", headers=MOBILE_HEADERS)
+                except Exception as e:
+                    logger.warning(f"⚠️ Momo 首頁 Cookie 取得失敗: {e}")
+            await asyncio.gather(*(
+                self.walk(client, entry, platform)
+                for entry in entries for platform in self.platform_ids
+            ))
+        return self.changes
+
+
+# --- 4. 寫入 ---
+def load_known(db):
+    rows = db.execute(text("SELECT platform_id, product_id_on_platform, name FROM products"))
+    return {(r.platform_id, r.product_id_on_platform): r.name for r in rows}
+
+
+def upsert_listings(db, changes, model_ids):
+    """新商品與改名商品一次批次 Upsert (每段 1000 筆)，回傳涉及的型號 ID"""
+    values = []
+    for (platform_id, pid), info in changes.items():
+        values.append({
+            "model_id": model_ids.get(map_to_model(info["name"])),
+            "platform_id": platform_id,
+            "product_id_on_platform": pid,
+            "name": info["name"][:255],
+            "url": info["url"],
+        })
+    for start in range(0, len(values), 1000):
+        stmt = insert(Product).values(values[start:start + 1000])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['platform_id', 'product_id_on_platform'],
+            set_={"name": stmt.excluded.name, "url": stmt.excluded.url, "model_id": stmt.excluded.model_id}
+        )
+        db.execute(stmt)
+    return {v["model_id"] for v in values if v["model_id"]}
+
+
+def run_discovery(entries=None, max_pages=DISCOVERY_MAX_PAGES):
+    """同步進入點 (Celery / CLI)：回傳本次統計"""
+    entries = entries or search_entries()
+    db = SessionLocal()
+    try:
+        platform_ids = {
+            r.name.lower(): r.id for r in db.execute(text("SELECT id, name FROM platforms"))
+            if r.name.lower() in ("momo", "pchome")
+        }
+        model_ids = {r.name: r.id for r in db.execute(text("SELECT id, name FROM product_models"))}
+        known = load_known(db)
+        # 💡 網路請求期間不持有資料庫連線
+        db.close()
+
+        run = DiscoveryRun(known, platform_ids, max_pages=max_pages)
+        changes = asyncio.run(run.run(entries))
+        if changes:
+            touched = upsert_listings(db, changes, model_ids)
+            db.commit()
+            invalidate_prices(touched)
+        logger.info(
+            f"🧭 商品發現完成：{len(entries)} 個關鍵字、{run.stats['pages']} 頁、"
+            f"新增 {run.stats['new']}、改名 {run.stats['renamed']}"
+        )
+        return {"keywords": len(entries), **run.stats}
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    keywords = sys.argv[1:]
+    print(run_discovery([{"category": "iPhone", "keyword": k} for k in keywords] or None))
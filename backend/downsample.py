@@ -0,0 +1,39 @@
+def lttb(points, threshold, x=lambda p: p[0], y=lambda p: p[1]):
+    """
+    Largest-Triangle-Three-Buckets 降採樣 (Steinarsson, 2013)。
+    保留首尾兩點，中間每個區間挑出與「前一個選中點、下一區間平均點」構成最大三角形面積的點，
+    因此能在大幅減少點數的同時保留視覺上的波峰與波谷。
+
+    points 需已依 x 遞增排序；回傳原始元素的子集合 (順序不變)。
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0  # 上一個選中點的索引
+
+    for i in range(threshold - 2):
+        # 下一個區間的平均點 (作為三角形的第三個頂點)
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        next_points = points[next_start:next_end] or [points[-1]]
+        avg_x = sum(x(p) for p in next_points) / len(next_points)
+        avg_y = sum(y(p) for p in next_points) / len(next_points)
+
+        # 目前區間內找出面積最大的點
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = x(points[a]), y(points[a])
+        max_area, max_idx = -1.0, start
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (y(points[j]) - ay) - (ax - x(points[j])) * (avg_y - ay))
+            if area > max_area:
+                max_area, max_idx = area, j
+
+        sampled.append(points[max_idx])
+        a = max_idx
+
+    sampled.append(points[-1])
+    return sampled
@@ -25,18 +25,10 @@ wait_for_db
 # 只有 API 服務 (通常不帶 CELERY_WORKER 變數) 才負責執行 DB Migration
 if [[ "$CELERY_WORKER" != "true" ]]; then
     echo "🏗️  主服務模式：檢查並執行資料庫遷移..."
-    
-    # 確保遷移目錄存在
-    mkdir -p migrations/versions
-    
-    # 檢查是否有任何遷移腳本 (排除 __init__.py)
-    VERSION_FILES=$(ls migrations/versions/*.py 2>/dev/null | grep -v "__init__.py" || true)
-
-    if [ -z "$VERSION_FILES" ]; then
-        echo "⚠️  本地無遷移檔案，執行初始化同步 (Stamp & Revision)..."
-        $VENV_ALEMBIC stamp base || echo "Stamp skipped"
-        $VENV_ALEMBIC revision --autogenerate -m "Initial_schema"
-    fi
+
+    # 💡 遷移腳本收錄於 migrations/versions (依序編號)，不再於啟動時自動產生；
+    #    舊部署自動產生的 Initial_schema 由 legacy_stamp.py 銜接到 0001_baseline
+    $VENV_PYTHON migrations/legacy_stamp.py
 
     echo "🚀 執行 Alembic Upgrade..."
     $VENV_ALEMBIC upgrade head
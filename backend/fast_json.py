@@ -0,0 +1,43 @@
+import os
+from decimal import Decimal
+
+import orjson
+from pydantic import BaseModel
+
+# 💡 串流 JSON 陣列時每個區塊的元素數：一次序列化一個區塊，記憶體只需容納一個區塊的中間物件
+JSON_STREAM_CHUNK_ITEMS = int(os.getenv("JSON_STREAM_CHUNK_ITEMS", "1000"))
+
+
+def _default(obj):
+    # orjson 原生支援 str / int / float / dict / list / datetime / UUID，其餘型別在此轉換
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"無法序列化的型別: {type(obj).__name__}")
+
+
+def dumps(obj):
+    """序列化為 UTF-8 bytes (等同 json.dumps(ensure_ascii=False, separators=(',', ':'))，但由 C 實作)"""
+    return orjson.dumps(obj, default=_default)
+
+
+def json_array_fragment(docs):
+    """
+    把資料庫已產生的 JSON 文字 (例如 row_to_json(...)::text，每列一個物件) 組成陣列，
+    dumps() 時原樣嵌入輸出，不需先解析回 Python 物件。
+    """
+    return orjson.Fragment("[" + ",".join(docs) + "]")
+
+
+async def aiter_json_array(rows, chunk_items=JSON_STREAM_CHUNK_ITEMS):
+    """
+    非同步版本：rows 為 AsyncSession.stream() 的結果，邊從資料庫讀取邊送出，
+    不需先 fetchall() 整個結果集。每列以 row._mapping 轉為物件。
+    """
+    yield b"["
+    first = True
+    async for partition in rows.partitions(chunk_items):
+        yield (b"" if first else b",") + dumps([dict(row._mapping) for row in partition])[1:-1]
+        first = False
+    yield b"]"
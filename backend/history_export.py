@@ -0,0 +1,211 @@
+"""
+price_history 欄式匯出 (Arrow IPC / Parquet)：
+
+    python history_export.py -o history.parquet                        # 全部歷史
+    python history_export.py -o iphone17.arrow --model 1 --model 2 --platform Momo \\
+        --from 2026-01-01 --to 2026-06-30
+
+API 版本：GET /export/history (見 main.py)。
+"""
+import argparse
+import logging
+import os
+import threading
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as pa_ipc
+import pyarrow.parquet as pq
+
+from database import engine
+
+logger = logging.getLogger("PriceScraper")
+
+# 💡 每次解析的 CSV 區塊大小 = 每個 RecordBatch 的大小上限，記憶體用量只與此值有關，不隨匯出筆數成長
+EXPORT_BLOCK_BYTES = int(os.getenv("EXPORT_BLOCK_BYTES", str(4 * 1024 * 1024)))
+
+EXPORT_FORMATS = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+SCHEMA = pa.schema([
+    ("recorded_at", pa.timestamp("us")),
+    ("model_id", pa.int32()),
+    ("model_name", pa.string()),
+    ("product_id", pa.int32()),
+    ("platform", pa.string()),
+    ("price", pa.float64()),
+])
+
+# 💡 不加 ORDER BY：排序需要讀完全部資料才能輸出第一筆，匯出改為邊查邊送
+# 💡 LEFT JOIN product_models：尚未歸類型號 (model_id 為 NULL) 的商品也要匯出，model_id / model_name 為 null；
+#    指定 model_ids 時 ANY() 篩選自然會排除這些列
+_EXPORT_SQL = """
+    COPY (
+        SELECT ph.recorded_at, p.model_id, pm.name, ph.product_id, pl.name, ph.price
+        FROM price_history ph
+        JOIN products p ON p.id = ph.product_id
+        LEFT JOIN product_models pm ON pm.id = p.model_id
+        JOIN platforms pl ON pl.id = ph.platform_id
+        WHERE (%(model_ids)s::INTEGER[] IS NULL OR p.model_id = ANY(%(model_ids)s::INTEGER[]))
+          AND (%(platform)s::TEXT IS NULL OR lower(pl.name) = lower(%(platform)s::TEXT))
+          AND (%(date_from)s::TIMESTAMP IS NULL OR ph.recorded_at >= %(date_from)s::TIMESTAMP)
+          AND (%(date_to)s::TIMESTAMP IS NULL OR ph.recorded_at <= %(date_to)s::TIMESTAMP)
+    ) TO STDOUT WITH (FORMAT csv)
+"""
+
+
+# --- 1. 資料來源：COPY 串流 → Arrow RecordBatch ---
+def _start_copy(params):
+    """
+    在背景執行緒以 COPY ... TO STDOUT 把查詢結果寫進 pipe，回傳 pipe 的讀取端。
+    資料從 PostgreSQL 一路串流到 Arrow 的 C++ CSV 解析器，不會產生逐列的 Python 物件。
+    """
+    read_fd, write_fd = os.pipe()
+    errors = []
+
+    def produce():
+        sink = os.fdopen(write_fd, "wb")
+        conn = None
+        try:
+            conn = engine.raw_connection()
+            cursor = conn.cursor()
+            cursor.copy_expert(cursor.mogrify(_EXPORT_SQL, params).decode("utf-8"), sink)
+            conn.close()
+            conn = None
+        except BrokenPipeError:
+            # 讀取端提前關閉 (例如客戶端中斷下載)：COPY 中斷後的連線狀態不明，由 finally 丟棄不放回連線池
+            pass
+        except Exception as e:
+            # 含取得連線失敗：先記錄錯誤再關閉 pipe，讀取端看到 EOF 時一定能取得錯誤
+            errors.append(e)
+            logger.error(f"❌ 歷史匯出查詢失敗: {e}")
+        finally:
+            if conn is not None:
+                conn.invalidate()
+            # 💡 無論成功與否都要關閉寫入端，否則 Arrow 讀取端會永遠等待
+            try:
+                sink.close()
+            except OSError:
+                pass
+
+    thread = threading.Thread(target=produce, name="history-export", daemon=True)
+    thread.start()
+    return os.fdopen(read_fd, "rb"), thread, errors
+
+
+def iter_history_batches(model_ids=None, platform=None, date_from=None, date_to=None):
+    """依篩選條件逐批產生 pyarrow.RecordBatch (schema = SCHEMA)"""
+    source, thread, errors = _start_copy({
+        "model_ids": list(model_ids) if model_ids else None,
+        "platform": platform,
+        "date_from": date_from,
+        "date_to": date_to,
+    })
+    try:
+        try:
+            reader = pa_csv.open_csv(
+                source,
+                read_options=pa_csv.ReadOptions(column_names=SCHEMA.names, block_size=EXPORT_BLOCK_BYTES),
+                # PostgreSQL CSV 的 NULL 是未加引號的空欄位，空字串則是 ""：只有前者轉為 null
+                convert_options=pa_csv.ConvertOptions(column_types=SCHEMA, strings_can_be_null=True,
+                                                      quoted_strings_can_be_null=False),
+            )
+        except pa.ArrowInvalid as e:
+            # 沒有符合條件的資料 = 空的 CSV；仍輸出只有 Schema 的檔案
+            if errors or "Empty CSV" not in str(e):
+                raise
+            reader = []
+        for batch in reader:
+            yield batch
+    except pa.ArrowInvalid:
+        # 查詢本身失敗時 pipe 可能只有部分內容，以查詢錯誤為準
+        if not errors:
+            raise
+    finally:
+        source.close()
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+# --- 2. 輸出格式 ---
+class _ChunkSink:
+    """給 pyarrow 寫入的檔案物件：累積寫入的位元組，由呼叫端逐段取出送給客戶端"""
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def _open_writer(fmt, sink):
+    if fmt == "parquet":
+        # 💡 每個 RecordBatch 成為一個 Row Group，寫完即可送出，不需等整個檔案完成
+        return pq.ParquetWriter(sink, SCHEMA, compression="zstd")
+    return pa_ipc.new_stream(sink, SCHEMA)
+
+
+def stream_history(fmt="arrow", **filters):
+    """產生匯出檔案的位元組片段 (StreamingResponse 使用)"""
+    sink = _ChunkSink()
+    writer = _open_writer(fmt, sink)
+    rows = 0
+    for batch in iter_history_batches(**filters):
+        writer.write_batch(batch)
+        rows += batch.num_rows
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+    logger.info(f"📤 歷史匯出完成 ({fmt}, {rows} 筆)")
+
+
+def export_to_file(path, fmt=None, **filters):
+    """CLI 使用：直接寫入本地檔案，回傳匯出筆數"""
+    fmt = fmt or ("parquet" if path.endswith(".parquet") else "arrow")
+    rows = 0
+    with open(path, "wb") as f:
+        writer = _open_writer(fmt, f)
+        for batch in iter_history_batches(**filters):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+        writer.close()
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="匯出 price_history 為 Arrow IPC / Parquet")
+    parser.add_argument("-o", "--output", required=True, help="輸出檔案 (.parquet 或 .arrow)")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), help="預設依副檔名判斷")
+    parser.add_argument("--model", type=int, action="append", dest="model_ids", help="型號 ID，可重複指定")
+    parser.add_argument("--platform", help="平台名稱 (Momo / PChome)")
+    parser.add_argument("--from", dest="date_from", type=datetime.fromisoformat, help="起始時間 (含)")
+    parser.add_argument("--to", dest="date_to", type=datetime.fromisoformat, help="結束時間 (含)")
+    args = parser.parse_args()
+
+    started = datetime.now()
+    count = export_to_file(
+        args.output, args.format, model_ids=args.model_ids, platform=args.platform,
+        date_from=args.date_from, date_to=args.date_to,
+    )
+    print(f"✅ 已匯出 {count} 筆到 {args.output} ({(datetime.now() - started).total_seconds():.1f} 秒)")
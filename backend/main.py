@@ -1,30 +1,54 @@
+import asyncio
 import inspect
+import json
 import logging
 import sys
 import os
-from fastapi import FastAPI, Depends, HTTPException, Query, Path, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Path, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from celery.exceptions import TimeoutError as CeleryTimeoutError
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Union
 from datetime import datetime
 from auth import get_current_user_optional
 import pytz
+import redis
 
 # 💡 核心組件匯入
 from scraper import PriceScraper, setup_logging
-from worker import scrape_all_platforms
-from database import SessionLocal
+from worker import celery_app, refresh_product_task, resolve_platforms, scrape_all_platforms
+from database import get_async_db
 from models import User
 # 💡 認證邏輯與時區工具匯入
-from auth import verify_password, create_access_token, get_current_user
+from auth import AuthUser, verify_password, create_access_token, get_current_user, revoke_user_tokens
 from models import get_tw_time
+from downsample import lttb
+from circuit_breaker import read_breaker_states
+from price_stream import price_hub
+from task_progress import FAILED, FINISHED, read_progress
+from history_export import EXPORT_FORMATS, stream_history
+from analytics import price_analytics
+from fast_json import aiter_json_array, json_array_fragment
+from response_cache import (
+    CATALOG_VERSION, cached_response, favorites_version, invalidate_favorites, model_version
+)
 
 # --- 1. 系統日誌與初始化 ---
 logger = setup_logging()
 
+# 💡 單一商品即時更新最多等待幾秒；逾時則回傳 202 與 task_id，價格仍會在背景寫入
+PRODUCT_REFRESH_TIMEOUT = float(os.getenv("PRODUCT_REFRESH_TIMEOUT", "20"))
+# 💡 SSE 心跳間隔：需短於 nginx proxy_read_timeout (預設 60 秒)，避免閒置連線被切斷
+PRICE_STREAM_HEARTBEAT_SECONDS = float(os.getenv("PRICE_STREAM_HEARTBEAT_SECONDS", "15"))
+# 任務進度串流的輪詢間隔 (秒)
+TASK_STREAM_INTERVAL_SECONDS = float(os.getenv("TASK_STREAM_INTERVAL_SECONDS", "1"))
+# 💡 任務進度串流的最長連線時間 (秒)；逾時送出 timeout 事件後關閉，客戶端可改用 GET /tasks/{id} 查詢
+TASK_STREAM_TIMEOUT_SECONDS = float(os.getenv("TASK_STREAM_TIMEOUT_SECONDS", "3600"))
+
 raw_description = """
     ## 專業級 iPhone 價格追蹤系統後端 (v2.6.1)
     整合 OAuth2 JWT 安全認證、異步爬蟲排程與個人化收藏功能。
@@ -48,12 +72,7 @@ app.add_middleware(
 )
 
 # --- 2. 資料庫依賴 ---
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# 💡 所有路由統一使用 database.get_async_db (AsyncSession + asyncpg)，查詢期間不阻塞事件迴圈
 
 # --- 3. Pydantic 數據模型 (Schemas) ---
 
@@ -69,32 +88,44 @@ class UserProfileSchema(BaseModel):
         from_attributes = True
 
 class FavoriteCreate(BaseModel):
-    product_id: int = Field(..., description="要收藏的 Product 實體 ID")
+    product_id: int = Field(..., description="要收藏的型號 ID (product_models.id，即 /products 回傳的 id)")
 
 class FavoriteResponse(BaseModel):
     id: int
     product_id: int
     product_name: str
-    platform_name: str
-    url: str
+    # 💡 以下為該型號目前最低價的賣場；尚未抓到任何價格時為 None
+    platform_name: Optional[str] = None
+    url: Optional[str] = None
     current_price: Optional[float] = None
     created_at: datetime
     class Config:
         from_attributes = True
 
 class ProductModelSchema(BaseModel):
+    # 💡 指定 fields= 時只會回傳所選欄位 (id 一律回傳)，其餘欄位不會出現在回應中
     id: int
-    name: str = Field(..., example="iPhone 16 Pro")
+    name: Optional[str] = Field(None, example="iPhone 16 Pro")
     category: Optional[str] = Field(None, example="Smartphones")
     
     # 💡 關鍵：增加這個欄位，預設為 False
     # 當 SQL 查詢使用 LEFT JOIN 算出收藏狀態後，FastAPI 會自動填入這裡
     is_favorite: bool = False 
 
+    # 💡 include_price=true 時附上該型號目前最低價的賣場 (有 platform 篩選時限定該平台)
+    min_price: Optional[float] = None
+    platform_name: Optional[str] = None
+    url: Optional[str] = None
+
     class Config:
         # 💡 允許從資料庫的 Row 物件直接轉換 (針對 SQLAlchemy)
         from_attributes = True
 
+class ProductPageSchema(BaseModel):
+    items: List[ProductModelSchema]
+    # 下一頁的 cursor；None 表示已是最後一頁
+    next_cursor: Optional[int] = None
+
 class SystemStatsSchema(BaseModel):
     total_models: int
     total_price_records: int
@@ -103,33 +134,70 @@ class SystemStatsSchema(BaseModel):
     server_time: datetime
 
 class PriceHistoryPoint(BaseModel):
-    date: str  # YYYY-MM-DD
-    price: float
+    date: str  # YYYY-MM-DD (bucket=hour 時為 YYYY-MM-DD HH:00；week 為該週週一)
+    price: float  # 該時間桶最後一筆價格
     platform: str
+    # 💡 彙總表提供的區間統計 (source=raw 時為 None)
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    avg_price: Optional[float] = None
 
 class PriceTrendResponse(BaseModel):
     model_name: str
     history: List[PriceHistoryPoint]
 
+class PriceTrendColumnarResponse(BaseModel):
+    # 💡 format=columnar：同一索引位置的元素組成一個點，省去每個點重複的欄位名稱
+    model_name: str
+    dates: List[str]
+    prices: List[float]
+    platforms: List[str]
+    min_prices: List[Optional[float]]
+    max_prices: List[Optional[float]]
+    avg_prices: List[Optional[float]]
+
+class PriceAnalyticsSchema(BaseModel):
+    model_id: int
+    model_name: str
+    platform: str
+    current_price: Optional[float] = None      # 該平台目前最低掛牌價
+    lowest_ever: float
+    highest_ever: float
+    drop_from_max_pct: Optional[float] = None  # 現價相對歷史最高價的跌幅 (%)
+    avg_7d: Optional[float] = None             # 近 7 天日均價的平均 (單一值，非移動平均序列)
+    avg_30d: Optional[float] = None            # 近 30 天日均價的平均
+    percentiles: dict                          # 回看期間每日收盤價的 p10 / p25 / p50 / p75 / p90
+    good_price_score: Optional[float] = None   # 0~100：現價比回看期間多少比例的日子便宜
+    verdict: Optional[str] = None              # great / good / fair / high
+
 # --- 4. 認證路由 (Authentication) ---
 
 @app.post("/v1/auth/login", response_model=Token, tags=["Auth"])
 async def login_for_access_token(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     form_data: OAuth2PasswordRequestForm = Depends()
 ):
-    user = db.query(User).filter(User.email == form_data.username).first()
+    user = (await db.execute(select(User).where(User.email == form_data.username))).scalar_one_or_none()
     if not user or not verify_password(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="帳號或密碼錯誤",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_access_token(data={"sub": user.email}, user=user)
     return {"access_token": access_token, "token_type": "bearer"}
 
+@app.post("/v1/auth/revoke", tags=["Auth"])
+async def revoke_all_tokens(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthUser = Depends(get_current_user)
+):
+    """登出所有裝置：遞增 token_version，目前已簽發的 Token 全部失效"""
+    await revoke_user_tokens(db, current_user.id)
+    return {"status": "success", "message": "已登出所有裝置"}
+
 @app.get("/v1/users/me", response_model=UserProfileSchema, tags=["Auth"])
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: AuthUser = Depends(get_current_user)):
     return current_user
 
 # --- 5. 系統狀態與健康檢查 (Health) ---
@@ -144,10 +212,10 @@ def read_root():
     }
 
 @app.get("/health", tags=["Health"])
-def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_async_db)):
     """🏥 系統深層健康檢查 (含資料庫連線)"""
     try:
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
         return {
             "status": "healthy", 
             "database": "connected", 
@@ -162,32 +230,33 @@ def health_check(db: Session = Depends(get_db)):
 @app.post("/v1/favorites", tags=["Business"])
 async def add_favorite(
     fav_in: FavoriteCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthUser = Depends(get_current_user)
 ):
-    # 1. 檢查商品是否存在 (注意：這裡要對應你資料庫的表名，若為 product_models 請修改)
-    product = db.execute(
+    # 1. 檢查型號是否存在 (favorites.product_id 對應 product_models.id)
+    product = (await db.execute(
         text("SELECT id FROM product_models WHERE id = :pid"), 
         {"pid": fav_in.product_id}
-    ).fetchone()
+    )).fetchone()
     
     if not product:
         raise HTTPException(status_code=404, detail="商品不存在")
     
     # 2. 檢查是否已經收藏
-    existing = db.execute(
+    existing = (await db.execute(
         text("SELECT id FROM favorites WHERE user_id = :uid AND product_id = :pid"),
         {"uid": current_user.id, "pid": fav_in.product_id}
-    ).fetchone()
+    )).fetchone()
     
     try:
         if existing:
             # 💡 核心改動：如果已存在，就執行「刪除」，實現取消收藏功能
-            db.execute(
+            await db.execute(
                 text("DELETE FROM favorites WHERE id = :fid"),
                 {"fid": existing.id}
             )
-            db.commit()
+            await db.commit()
+            await invalidate_favorites(current_user.id)
             return {
                 "status": "removed", 
                 "message": "已從收藏清單移除", 
@@ -195,11 +264,13 @@ async def add_favorite(
             }
 
         # 3. 如果不存在，則執行「新增」
-        db.execute(
+        await db.execute(
             text("INSERT INTO favorites (user_id, product_id, created_at) VALUES (:uid, :pid, :cat)"),
-            {"uid": current_user.id, "pid": fav_in.product_id, "cat": get_tw_time()}
+            # 💡 created_at 為 TIMESTAMP (無時區)，asyncpg 不會自動轉換帶時區的 datetime
+            {"uid": current_user.id, "pid": fav_in.product_id, "cat": get_tw_time().replace(tzinfo=None)}
         )
-        db.commit()
+        await db.commit()
+        await invalidate_favorites(current_user.id)
         return {
             "status": "success", 
             "message": "已加入收藏", 
@@ -207,138 +278,482 @@ async def add_favorite(
         }
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"收藏操作失敗: {str(e)}")
         raise HTTPException(status_code=500, detail="資料庫操作失敗")
 
-@app.get("/v1/favorites", response_model=List[FavoriteResponse], tags=["Business"])
+# 💡 直接回傳已序列化 Response 的路由不會經過 response_model 驗證，因此不宣告 response_model，
+#    只以 responses 在 OpenAPI 文件中描述回應格式
+@app.get("/v1/favorites", responses={200: {"model": List[FavoriteResponse]}}, tags=["Business"])
 async def list_my_favorites(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthUser = Depends(get_current_user)
 ):
+    # 💡 每個收藏型號只取「目前最低價」的一筆賣場：
+    #    products(model_id) 索引 + prices 覆蓋索引，成本與 price_history 的資料量無關
     query = text("""
         SELECT 
             f.id, f.product_id, f.created_at,
-            p.name as product_name, p.url,
-            pl.name as platform_name,
-            pr.price as current_price
+            pm.name as product_name,
+            best.url, best.platform_name, best.price as current_price
         FROM favorites f
-        JOIN products p ON f.product_id = p.id
-        JOIN platforms pl ON p.platform_id = pl.id
-        LEFT JOIN prices pr ON p.id = pr.product_id
+        JOIN product_models pm ON pm.id = f.product_id
+        LEFT JOIN LATERAL (
+            SELECT p.url, pl.name as platform_name, pr.price
+            FROM products p
+            JOIN prices pr ON pr.product_id = p.id
+            JOIN platforms pl ON pl.id = p.platform_id
+            WHERE p.model_id = pm.id
+            ORDER BY pr.price ASC
+            LIMIT 1
+        ) best ON true
         WHERE f.user_id = :uid
         ORDER BY f.created_at DESC
     """)
-    result = db.execute(query, {"uid": current_user.id}).fetchall()
-    return [dict(row._mapping) for row in result]
+    # 💡 以伺服器端游標邊讀邊序列化 (orjson)，不經過 Pydantic 再驗證一次
+    rows = await db.stream(query, {"uid": current_user.id})
+    return StreamingResponse(aiter_json_array(rows), media_type="application/json")
 
 @app.delete("/v1/favorites/{fav_id}", tags=["Business"])
 async def delete_favorite(
     fav_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthUser = Depends(get_current_user)
 ):
-    res = db.execute(
+    res = await db.execute(
         text("DELETE FROM favorites WHERE id = :fid AND user_id = :uid"),
         {"fid": fav_id, "uid": current_user.id}
     )
-    db.commit()
+    await db.commit()
     if res.rowcount == 0:
         raise HTTPException(status_code=404, detail="收藏紀錄不存在或無權限")
+    await invalidate_favorites(current_user.id)
     return {"status": "success", "message": "已移除收藏"}
 
 # --- 7. 業務與系統管理 ---
 
-@app.get("/products", response_model=List[ProductModelSchema], tags=["Business"])
-def list_products(
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user_optional)
+# 💡 fields= 可選的欄位；價格相關欄位需要額外的 LATERAL 查詢，只在被要求時才計算
+PRODUCT_FIELDS = ("id", "name", "category", "is_favorite", "min_price", "platform_name", "url")
+PRODUCT_PRICE_FIELDS = {"min_price", "platform_name", "url"}
+PRODUCT_FIELD_COLUMNS = {
+    "id": "pm.id", "name": "pm.name", "category": "pm.category", "is_favorite": None,
+    "min_price": "best.price", "platform_name": "best.platform_name", "url": "best.url",
+}
+
+def keyset_page(rows, limit, key=lambda row: row.id):
+    """rows 為多取一筆 (limit + 1) 的查詢結果：回傳 (本頁資料, next_cursor)，沒有下一頁時 next_cursor 為 None"""
+    page = rows[:limit]
+    return page, (key(page[-1]) if len(rows) > limit else None)
+
+
+@app.get("/products", responses={200: {"model": ProductPageSchema}}, tags=["Business"])
+async def list_products(
+    request: Request,
+    cursor: Optional[int] = Query(None, ge=1, description="上一頁回傳的 next_cursor；省略則從第一頁開始"),
+    limit: int = Query(50, ge=1, le=200, description="每頁筆數"),
+    category: Optional[str] = Query(None, description="只列出此分類的型號"),
+    platform: Optional[str] = Query(None, description="只列出在此平台有販售的型號 (例如 Momo、PChome)"),
+    include_price: bool = Query(False, description="附上每個型號目前最低價與其平台"),
+    fields: Optional[str] = Query(None, description=f"逗號分隔的回傳欄位，可選：{', '.join(PRODUCT_FIELDS)}"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[AuthUser] = Depends(get_current_user_optional)
 ):
     uid = current_user.id if current_user else 0
-    
-    # 💡 修正後的 SQL：透過 products 表連結型號與收藏
-    query = text("""
+
+    selected = list(PRODUCT_FIELDS if include_price else PRODUCT_FIELDS[:4])
+    if fields:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = set(requested) - set(PRODUCT_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"未知的欄位: {', '.join(sorted(unknown))}")
+        # id 為分頁依據，一律回傳
+        selected = ["id"] + [f for f in PRODUCT_FIELDS if f in requested and f != "id"]
+    with_price = bool(PRODUCT_PRICE_FIELDS & set(selected))
+    with_favorite = "is_favorite" in selected
+
+    favorite_join, favorite_col = "", "false"
+    if with_favorite and uid:
+        # 💡 收藏狀態改為對「該使用者的收藏」做一次 LEFT JOIN，(user_id, product_id) 唯一約束保證不會重複列
+        favorite_join = "LEFT JOIN favorites f ON f.product_id = pm.id AND f.user_id = :uid"
+        favorite_col = "f.product_id IS NOT NULL"
+    price_join = ""
+    if with_price:
+        price_join = """
+        LEFT JOIN LATERAL (
+            SELECT CAST(pr.price AS FLOAT) as price, pl.name as platform_name, p.url
+            FROM products p
+            JOIN prices pr ON pr.product_id = p.id
+            JOIN platforms pl ON pl.id = p.platform_id
+            WHERE p.model_id = pm.id
+              AND (CAST(:platform AS TEXT) IS NULL OR lower(pl.name) = lower(:platform))
+            ORDER BY pr.price ASC
+            LIMIT 1
+        ) best ON true"""
+
+    # 💡 每列的 JSON 物件由 Postgres 依 fields 組好 (row_to_json)，Python 端不再逐列建立 dict
+    columns = {**PRODUCT_FIELD_COLUMNS, "is_favorite": favorite_col}
+    doc_cols = ", ".join(f"{columns[k]} as {k}" for k in selected)
+
+    # 💡 Keyset 分頁：以 pm.id < cursor 接續上一頁，成本與頁數無關 (不使用 OFFSET)
+    query = text(f"""
         SELECT 
             pm.id, 
-            pm.name, 
-            pm.category,
-            EXISTS (
-                SELECT 1 
-                FROM products p
-                JOIN favorites f ON f.product_id = p.id
-                WHERE p.model_id = pm.id AND f.user_id = :uid
-            ) as is_favorite
+            row_to_json(doc)::text as doc
         FROM product_models pm
+        {favorite_join}
+        {price_join}
+        CROSS JOIN LATERAL (SELECT {doc_cols}) doc
+        WHERE (CAST(:cursor AS INTEGER) IS NULL OR pm.id < :cursor)
+          AND (CAST(:category AS TEXT) IS NULL OR pm.category = :category)
+          AND (CAST(:platform AS TEXT) IS NULL OR EXISTS (
+              SELECT 1 FROM products p JOIN platforms pl ON pl.id = p.platform_id
+              WHERE p.model_id = pm.id AND lower(pl.name) = lower(:platform)
+          ))
         ORDER BY pm.id DESC
+        LIMIT :limit
     """)
     
-    result = db.execute(query, {"uid": uid}).fetchall()
-    return [dict(row._mapping) for row in result]
+    async def build():
+        # 💡 多取一筆判斷是否還有下一頁
+        result = (await db.execute(query, {
+            "uid": uid, "cursor": cursor, "category": category,
+            "platform": platform, "limit": limit + 1,
+        })).fetchall()
+        rows, next_cursor = keyset_page(result, limit)
+        return {
+            "items": json_array_fragment(row.doc for row in rows),
+            "next_cursor": next_cursor,
+        }
+
+    # 💡 收藏狀態因人而異：快取鍵帶入使用者 ID 與其收藏集合版本
+    return await cached_response(
+        request, "products",
+        {"uid": uid, "cursor": cursor, "limit": limit, "category": category,
+         "platform": platform, "fields": selected},
+        [CATALOG_VERSION, favorites_version(uid)], build
+    )
+
+@app.post("/v1/products/{product_id}/refresh", tags=["Business"])
+async def refresh_product_price(
+    product_id: int = Path(..., ge=1, description="products.id (單一平台上的商品)"),
+    current_user: AuthUser = Depends(get_current_user)
+):
+    """
+    立即重新抓取單一商品並回傳最新價格。
+    任務走 interactive 佇列，由專屬 Worker 處理，不會排在批次爬取之後。
+    """
+    task = refresh_product_task.delay(product_id)
+    try:
+        # 💡 在執行緒中等待結果，避免阻塞事件迴圈
+        result = await asyncio.to_thread(task.get, timeout=PRODUCT_REFRESH_TIMEOUT)
+    except CeleryTimeoutError:
+        return JSONResponse(status_code=202, content={"status": "pending", "task_id": task.id})
+    except Exception as e:
+        logger.error(f"❌ 即時更新失敗 (#{product_id}): {e}")
+        raise HTTPException(status_code=502, detail="即時更新失敗，請稍後再試")
+
+    if result.get("status") == "not_found":
+        raise HTTPException(status_code=404, detail="商品不存在")
+    if result.get("status") != "success":
+        raise HTTPException(status_code=502, detail="無法取得最新價格")
+    return {**result, "task_id": task.id}
 
 @app.post("/tasks/scrape", tags=["System"])
 def trigger_scrape_task(
-    target: Optional[str] = Query("All", description="目標平台"),
-    current_user: User = Depends(get_current_user)
+    target: Optional[str] = Query("All", description="目標平台：All / Momo / PChome"),
+    current_user: AuthUser = Depends(get_current_user)
 ):
+    platforms = resolve_platforms(target)
+    if not platforms:
+        raise HTTPException(status_code=422, detail=f"未知的平台: {target}")
     logger.info(f"🔔 管理員 [{current_user.email}] 觸發了 {target} 爬蟲任務")
-    task = scrape_all_platforms.delay()
-    return {"status": "accepted", "task_id": task.id, "operator": current_user.username}
-
-@app.get("/stats", response_model=SystemStatsSchema, tags=["System"])
-def get_system_stats(db: Session = Depends(get_db)):
-    model_count = db.execute(text("SELECT count(*) FROM product_models")).scalar()
-    price_count = db.execute(text("SELECT count(*) FROM prices")).scalar()
-    platforms = db.execute(text("SELECT name FROM platforms")).fetchall()
-    return {
-        "total_models": model_count, "total_price_records": price_count,
-        "db_status": "stable", "active_platforms": [p[0] for p in platforms],
-        "server_time": datetime.now()
-    }
+    task = scrape_all_platforms.delay(target)
+    return {"status": "accepted", "task_id": task.id, "platforms": platforms, "operator": current_user.username}
+
+async def load_task_status(task_id):
+    """Celery 任務狀態 + (若為爬取任務) 各分片彙整後的進度"""
+    result = celery_app.AsyncResult(task_id)
+    # 💡 AsyncResult 走同步 Redis，放到執行緒中避免阻塞事件迴圈
+    state = await asyncio.to_thread(lambda: result.state)
+    status_body = {"task_id": task_id, "state": state, "progress": None, "result": None}
+    if state == "SUCCESS":
+        status_body["result"] = await asyncio.to_thread(lambda: result.result)
+    elif state == "FAILURE":
+        status_body["result"] = {"error": str(await asyncio.to_thread(lambda: result.result))}
+    try:
+        status_body["progress"] = await read_progress(task_id)
+    except redis.RedisError as e:
+        logger.warning(f"⚠️ 讀取任務進度失敗: {e}")
+    return status_body
+
+def task_is_done(status_body):
+    progress = status_body["progress"]
+    if progress:
+        # 💡 stalled：執行中卻長時間沒有進度 (例如 worker 已不存在)，不會再有結束標記，串流也視為結束
+        return progress["status"] in (FINISHED, FAILED) or progress["stalled"]
+    return status_body["state"] in ("SUCCESS", "FAILURE", "REVOKED")
+
+@app.get("/tasks/{task_id}", tags=["System"])
+async def get_task_status(task_id: str = Path(..., description="POST /tasks/scrape 回傳的 task_id")):
+    """
+    查詢任務狀態。爬取任務另附 progress：已處理 / 成功 / 失敗 / 未變動數、速率、預估剩餘秒數，
+    以及 stalled (執行中但長時間沒有進度)。協調者任務派發完即為 SUCCESS，整體是否完成請看 progress.status。
+    """
+    return await load_task_status(task_id)
+
+@app.get("/tasks/{task_id}/stream", tags=["System"])
+async def stream_task_status(request: Request, task_id: str = Path(...)):
+    """
+    以 Server-Sent Events 持續推送任務進度 (僅在內容變化時送出)。
+    任務結束 (finished / failed / stalled) 後送出 done 事件並關閉；超過 TASK_STREAM_TIMEOUT_SECONDS 則送出 timeout 事件並關閉。
+    """
+    async def events():
+        last = None
+        idle = elapsed = 0.0
+        while not await request.is_disconnected():
+            status_body = await load_task_status(task_id)
+            payload = json.dumps(status_body, default=str)
+            if payload != last:
+                last, idle = payload, 0.0
+                yield f"event: progress\ndata: {payload}\n\n"
+            elif idle >= PRICE_STREAM_HEARTBEAT_SECONDS:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+            if task_is_done(status_body):
+                yield f"event: done\ndata: {payload}\n\n"
+                return
+            if elapsed >= TASK_STREAM_TIMEOUT_SECONDS:
+                yield f"event: timeout\ndata: {payload}\n\n"
+                return
+            await asyncio.sleep(TASK_STREAM_INTERVAL_SECONDS)
+            idle += TASK_STREAM_INTERVAL_SECONDS
+            elapsed += TASK_STREAM_INTERVAL_SECONDS
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+@app.get("/system/breakers", tags=["System"])
+async def get_breaker_states():
+    """各電商平台的斷路器狀態 (closed / open / half_open) 與目前 AIMD 調整後的請求速率"""
+    try:
+        return await read_breaker_states()
+    except redis.RedisError as e:
+        logger.error(f"❌ 讀取斷路器狀態失敗: {e}")
+        raise HTTPException(status_code=503, detail="Redis 不可用")
+
+@app.get("/stats", responses={200: {"model": SystemStatsSchema}}, tags=["System"])
+async def get_system_stats(request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def build():
+        model_count = (await db.execute(text("SELECT count(*) FROM product_models"))).scalar()
+        price_count = (await db.execute(text("SELECT count(*) FROM prices"))).scalar()
+        platforms = (await db.execute(text("SELECT name FROM platforms"))).fetchall()
+        return {
+            "total_models": model_count, "total_price_records": price_count,
+            "db_status": "stable", "active_platforms": [p[0] for p in platforms],
+            "server_time": datetime.now()
+        }
 
-@app.get("/products/{model_id}/history", response_model=PriceTrendResponse, tags=["Products"])
-async def get_price_history(
-    model_id: int = Path(..., description="產品型號 ID"),
-    db: Session = Depends(get_db)
+    # 💡 server_time 為快取產生時間，TTL 縮短為 60 秒避免顯示過舊
+    return await cached_response(request, "stats", {}, [CATALOG_VERSION], build, ttl=60)
+
+@app.get("/stream/prices", tags=["Products"])
+async def stream_prices(
+    request: Request,
+    models: Optional[str] = Query(None, description="逗號分隔的型號 ID (例如 1,2,3)；省略則接收所有型號"),
+):
+    """
+    即時價格推播 (Server-Sent Events)。
+    爬蟲寫入價格變動後經 Redis Pub/Sub 轉送，每則 `price` 事件的 data 為該批中屬於訂閱型號的變動列表。
+    """
+    try:
+        model_ids = {int(m) for m in models.split(",") if m.strip()} if models else None
+    except ValueError:
+        raise HTTPException(status_code=422, detail="models 須為逗號分隔的整數")
+
+    queue = price_hub.subscribe(model_ids)
+
+    async def events():
+        try:
+            # 💡 斷線後瀏覽器 EventSource 於 5 秒後自動重連
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    updates = await asyncio.wait_for(queue.get(), timeout=PRICE_STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: price\ndata: {json.dumps(updates)}\n\n"
+        finally:
+            price_hub.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # 👈 關閉 nginx 回應緩衝，事件才會即時送達
+    })
+
+@app.get("/analytics/prices", responses={200: {"model": List[PriceAnalyticsSchema]}}, tags=["Products"])
+async def get_price_analytics(
+    request: Request,
+    model_id: Optional[List[int]] = Query(None, description="型號 ID，可重複指定；省略則回傳所有型號"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    # 1. 先確認型號存在
-    model = db.execute(
-        text("SELECT name FROM product_models WHERE id = :mid"),
-        {"mid": model_id}
-    ).fetchone()
+    """
+    每個型號 × 平台的價格統計：現價、歷史最低 / 最高、跌幅、近 7 / 30 日均價 (avg_7d / avg_30d，截至今天的單一平均值)、百分位區間與好價分數。
+    以日彙總表一次算完所有型號，結果快取到下一次有價格寫入為止。
+    """
+    model_ids = sorted(set(model_id)) if model_id else None
+
+    async def build():
+        return await price_analytics(db, model_ids)
+
+    return await cached_response(request, "analytics", {"models": model_ids}, [CATALOG_VERSION], build)
+
+@app.get("/export/history", tags=["Products"])
+def export_price_history(
+    format: str = Query("parquet", pattern="^(arrow|parquet)$", description="arrow (Arrow IPC stream) / parquet"),
+    model_id: Optional[List[int]] = Query(None, description="型號 ID，可重複指定 (?model_id=1&model_id=2)"),
+    platform: Optional[str] = Query(None, description="平台名稱"),
+    date_from: Optional[datetime] = Query(None, alias="from", description="起始時間 (含)"),
+    date_to: Optional[datetime] = Query(None, alias="to", description="結束時間 (含)"),
+    current_user: AuthUser = Depends(get_current_user)
+):
+    """
+    批次匯出原始價格歷史 (recorded_at, model_id, model_name, product_id, platform, price)。
+    資料以 COPY 串流進 Arrow 邊查邊送，記憶體用量固定；列順序不保證，需要時請於分析端排序。
+    """
+    # 💡 同步路由：匯出會阻塞等待資料庫，由 Starlette 在執行緒池中執行與迭代
+    tw = pytz.timezone('Asia/Taipei')
+    date_from, date_to = [
+        d.astimezone(tw).replace(tzinfo=None) if d and d.tzinfo else d
+        for d in (date_from, date_to)
+    ]
+    logger.info(f"📤 [{current_user.email}] 匯出價格歷史 ({format}, models={model_id}, platform={platform})")
+    filename = f"price_history_{datetime.now():%Y%m%d%H%M}.{'arrows' if format == 'arrow' else 'parquet'}"
+    return StreamingResponse(
+        stream_history(format, model_ids=model_id, platform=platform, date_from=date_from, date_to=date_to),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
-    if not model:
-        raise HTTPException(404, "型號不存在")
+# 💡 source=rollup 讀取預先聚合的彙總表；source=raw 直接讀 price_history (除錯或彙總表尚未重建時使用)
+# bucket -> (彙總來源表, date_trunc 單位, 日期顯示格式)；week 由日彙總再聚合
+HISTORY_BUCKETS = {
+    "hour": ("price_rollup_hourly", "hour", "%Y-%m-%d %H:00"),
+    "day": ("price_rollup_daily", "day", "%Y-%m-%d"),
+    "week": ("price_rollup_daily", "week", "%Y-%m-%d"),
+}
 
-    # 💡 架構師提示：使用相容性較高的 SQL 寫法，或在 Python 層處理時間過濾
-    # 這裡假設你的生產環境是 PostgreSQL
-    query = text("""
-        SELECT 
-            TO_CHAR(pr.updated_at, 'YYYY-MM-DD') as date_str,
-            CAST(pr.price AS FLOAT) as price_val,
-            pl.name as platform_name
-        FROM prices pr
-        JOIN products p ON pr.product_id = p.id
-        JOIN platforms pl ON p.platform_id = pl.id
-        WHERE p.model_id = :mid
-        ORDER BY pr.updated_at ASC
-    """)
+@app.get("/products/{model_id}/history", responses={200: {"model": Union[PriceTrendResponse, PriceTrendColumnarResponse]}},
+         tags=["Products"])
+async def get_price_history(
+    request: Request,
+    model_id: int = Path(..., description="產品型號 ID"),
+    date_from: Optional[datetime] = Query(None, alias="from", description="起始時間 (含)"),
+    date_to: Optional[datetime] = Query(None, alias="to", description="結束時間 (含)"),
+    bucket: str = Query("day", pattern="^(hour|day|week)$", description="時間桶粒度 (僅 source=rollup)"),
+    max_points: int = Query(1000, ge=3, le=5000, description="每個平台序列最多回傳的點數，超過時以 LTTB 降採樣"),
+    source: str = Query("rollup", pattern="^(rollup|raw)$", description="資料來源：rollup 彙總表 / raw 原始歷史"),
+    format: str = Query("rows", pattern="^(rows|columnar)$", description="rows：每個點一個物件 / columnar：每個欄位一個陣列"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # 💡 資料表存的是台灣時間 (naive)，帶時區的查詢參數先換算再去掉 tzinfo，asyncpg 不接受混用
+    tw = pytz.timezone('Asia/Taipei')
+    date_from, date_to = [
+        d.astimezone(tw).replace(tzinfo=None) if d and d.tzinfo else d
+        for d in (date_from, date_to)
+    ]
+
+    async def build():
+        # 1. 先確認型號存在 (在 build 內執行，快取命中時完全不碰資料庫)
+        model = (await db.execute(
+            text("SELECT name FROM product_models WHERE id = :mid"),
+            {"mid": model_id}
+        )).fetchone()
+
+        if not model:
+            raise HTTPException(404, "型號不存在")
+
+        if source == "rollup":
+            table, unit, fmt = HISTORY_BUCKETS[bucket]
+            # 💡 每個 (平台, 時間桶) 只有一列，成本不隨原始歷史筆數成長；
+            #    hour/day 的 date_trunc 等同原值，week 則把 7 個日桶合併 (平均價以樣本數加權)
+            query = text(f"""
+                SELECT 
+                    date_trunc('{unit}', r.bucket_start) as bucket_ts,
+                    CAST((ARRAY_AGG(r.last_price ORDER BY r.bucket_start DESC))[1] AS FLOAT) as price_val,
+                    CAST(MIN(r.min_price) AS FLOAT) as min_val,
+                    CAST(MAX(r.max_price) AS FLOAT) as max_val,
+                    CAST(ROUND(SUM(r.avg_price * r.sample_count) / NULLIF(SUM(r.sample_count), 0), 2) AS FLOAT) as avg_val,
+                    pl.name as platform_name
+                FROM {table} r
+                JOIN platforms pl ON r.platform_id = pl.id
+                WHERE r.model_id = :mid
+                  AND (CAST(:date_from AS TIMESTAMP) IS NULL OR r.bucket_start >= :date_from)
+                  AND (CAST(:date_to AS TIMESTAMP) IS NULL OR r.bucket_start <= :date_to)
+                GROUP BY date_trunc('{unit}', r.bucket_start), pl.name
+                ORDER BY bucket_ts ASC
+            """)
+        else:
+            fmt = "%Y-%m-%d"
+            query = text("""
+                SELECT 
+                    ph.recorded_at as bucket_ts,
+                    CAST(ph.price AS FLOAT) as price_val,
+                    NULL as min_val, NULL as max_val, NULL as avg_val,
+                    pl.name as platform_name
+                FROM price_history ph
+                JOIN products p ON ph.product_id = p.id
+                JOIN platforms pl ON ph.platform_id = pl.id
+                WHERE p.model_id = :mid
+                  AND (CAST(:date_from AS TIMESTAMP) IS NULL OR ph.recorded_at >= :date_from)
+                  AND (CAST(:date_to AS TIMESTAMP) IS NULL OR ph.recorded_at <= :date_to)
+                ORDER BY ph.recorded_at ASC
+            """)
     
-    try:
-        rows = db.execute(query, {"mid": model_id}).fetchall()
-        
-        # 💡 使用 List Comprehension 進行高效轉換
-        history = [
-            PriceHistoryPoint(
-                date=row.date_str,
-                price=row.price_val,
-                platform=row.platform_name
-            ) for row in rows
-        ]
-
-        return PriceTrendResponse(
-            model_name=model.name,
-            history=history
-        )
-    except Exception as e:
-        logger.error(f"查詢歷史價格失敗: {str(e)}")
-        raise HTTPException(500, "伺服器內部查詢錯誤")
\ No newline at end of file
+        try:
+            rows = (await db.execute(query, {"mid": model_id, "date_from": date_from, "date_to": date_to})).fetchall()
+
+            # 💡 依平台分成獨立序列，各自降採樣到 max_points 以內 (保留波峰波谷)，再依時間合併
+            series = {}
+            for row in rows:
+                series.setdefault(row.platform_name, []).append(row)
+            sampled = []
+            for platform_rows in series.values():
+                sampled.extend(lttb(
+                    platform_rows, max_points,
+                    x=lambda r: r.bucket_ts.timestamp(),
+                    y=lambda r: r.price_val
+                ))
+            sampled.sort(key=lambda r: r.bucket_ts)
+
+            # 💡 資料列直接轉為 orjson 可序列化的基本型別，不建立 PriceHistoryPoint 物件
+            if format == "columnar":
+                return {
+                    "model_name": model.name,
+                    "dates": [row.bucket_ts.strftime(fmt) for row in sampled],
+                    "prices": [row.price_val for row in sampled],
+                    "platforms": [row.platform_name for row in sampled],
+                    "min_prices": [row.min_val for row in sampled],
+                    "max_prices": [row.max_val for row in sampled],
+                    "avg_prices": [row.avg_val for row in sampled],
+                }
+            return {
+                "model_name": model.name,
+                "history": [{
+                    "date": row.bucket_ts.strftime(fmt),
+                    "price": row.price_val,
+                    "platform": row.platform_name,
+                    "min_price": row.min_val,
+                    "max_price": row.max_val,
+                    "avg_price": row.avg_val,
+                } for row in sampled],
+            }
+        except Exception as e:
+            logger.error(f"查詢歷史價格失敗: {str(e)}")
+            raise HTTPException(500, "伺服器內部查詢錯誤")
+
+    params = {"from": date_from, "to": date_to, "bucket": bucket, "max_points": max_points, "source": source,
+              "format": format}
+    return await cached_response(request, "history", {"mid": model_id, **params}, [model_version(model_id)], build)
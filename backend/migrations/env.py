@@ -10,6 +10,7 @@ from alembic import context
 from os.path import dirname, realpath
 sys.path.insert(0, dirname(dirname(realpath(__file__))))
 from models import Base
+from partitions import PARENT
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -22,6 +23,14 @@ if config.config_file_name is not None:
 # --- [專業修正 2] 綁定模型 Metadata ---
 target_metadata = Base.metadata
 
+# --- [專業修正 3] 分區子表不由 autogenerate 管理 ---
+# price_history 的月分區 (price_history_pYYYYMM / _default) 由 partitions.py 建立與封存，
+# 不在 Metadata 中；若不排除，autogenerate 會把它們當成多餘的表產生 drop_table
+def include_object(obj, name, type_, reflected, compare_to):
+    if type_ == "table" and reflected and compare_to is None and name.startswith(f"{PARENT}_"):
+        return False
+    return True
+
 def get_url():
     """優先從環境變數獲取連線字串，若無則回傳 None"""
     return os.getenv("DATABASE_URL")
@@ -34,6 +43,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -60,7 +70,8 @@ def run_migrations_online() -> None:
     with connectable.connect() as connection:
         context.configure(
             connection=connection, 
-            target_metadata=target_metadata
+            target_metadata=target_metadata,
+            include_object=include_object
         )
 
         with context.begin_transaction():
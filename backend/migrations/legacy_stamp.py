@@ -0,0 +1,45 @@
+"""
+舊部署的版本銜接 (entrypoint.sh 在 alembic upgrade 之前執行)：
+
+過去 entrypoint 在 migrations/versions 為空時會自動產生 Initial_schema，revision ID 為隨機值且不在版本庫中，
+alembic upgrade 會因找不到該 revision 而失敗。偵測到這種情況 (或有資料表卻沒有版本紀錄) 時，
+改標記為 0001_baseline，之後的 revision 會補上缺少的欄位、索引與資料 (已存在的物件會略過)。
+"""
+import os
+import sys
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, inspect, text
+
+BASELINE = "0001_baseline"
+
+
+def main():
+    root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+    config = Config(os.path.join(root, "alembic.ini"))
+    url = os.getenv("DATABASE_URL") or config.get_main_option("sqlalchemy.url")
+    known = {rev.revision for rev in ScriptDirectory.from_config(config).walk_revisions()}
+
+    engine = create_engine(url)
+    try:
+        with engine.connect() as conn:
+            tables = set(inspect(conn).get_table_names())
+            current = set()
+            if "alembic_version" in tables:
+                current = set(conn.execute(text("SELECT version_num FROM alembic_version")).scalars())
+    finally:
+        engine.dispose()
+
+    if current and current <= known:
+        return
+    if not current and "users" not in tables:
+        return  # 全新資料庫：直接由 0001_baseline 開始升級
+
+    print(f"🔁 [Migration] 版本 {sorted(current) or '(無)'} 不在遷移鏈中，標記為 {BASELINE}")
+    command.stamp(config, BASELINE, purge=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
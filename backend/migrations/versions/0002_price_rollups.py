@@ -0,0 +1,62 @@
+"""price_rollup_hourly / price_rollup_daily：歷史走勢的預先聚合時間桶
+
+建表後以與 rollups.rebuild_rollups 相同的聚合從既有 price_history 回填，
+升級完成即可直接由彙總表提供走勢資料。
+
+Revision ID: 0002_price_rollups
+Revises: 0001_baseline
+Create Date: 2026-10-17 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_price_rollups'
+down_revision: Union[str, Sequence[str], None] = '0001_baseline'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ROLLUP_TABLES = {"price_rollup_hourly": "hour", "price_rollup_daily": "day"}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 💡 if_not_exists：由新版程式自動產生 Schema 的舊部署已經有這些表
+    for table, unit in ROLLUP_TABLES.items():
+        op.create_table(table,
+        sa.Column('model_id', sa.Integer(), nullable=False),
+        sa.Column('platform_id', sa.Integer(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('min_price', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('max_price', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('avg_price', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('last_price', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('sample_count', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['model_id'], ['product_models.id'], ),
+        sa.ForeignKeyConstraint(['platform_id'], ['platforms.id'], ),
+        sa.PrimaryKeyConstraint('model_id', 'platform_id', 'bucket_start'),
+        if_not_exists=True
+        )
+        op.execute(f"""
+            INSERT INTO {table}
+                (model_id, platform_id, bucket_start, min_price, max_price, avg_price, last_price, sample_count, updated_at)
+            SELECT p.model_id, ph.platform_id, date_trunc('{unit}', ph.recorded_at),
+                   MIN(ph.price), MAX(ph.price), ROUND(AVG(ph.price), 2),
+                   (ARRAY_AGG(ph.price ORDER BY ph.recorded_at DESC))[1], COUNT(*), NOW()
+            FROM price_history ph
+            JOIN products p ON p.id = ph.product_id
+            WHERE p.model_id IS NOT NULL AND ph.recorded_at IS NOT NULL
+            GROUP BY p.model_id, ph.platform_id, date_trunc('{unit}', ph.recorded_at)
+            ON CONFLICT DO NOTHING
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in reversed(list(ROLLUP_TABLES)):
+        op.drop_table(table)
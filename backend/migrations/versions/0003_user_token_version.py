@@ -0,0 +1,31 @@
+"""users.token_version：遞增即讓該使用者已簽發的 JWT 全部失效
+
+既有使用者預設為 0，與現有 Token 內的 ver 宣告 (缺少時視為 0) 相符，升級後不需要重新登入。
+
+Revision ID: 0003_user_token_version
+Revises: 0002_price_rollups
+Create Date: 2026-10-17 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_user_token_version'
+down_revision: Union[str, Sequence[str], None] = '0002_price_rollups'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False),
+                  if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'token_version')
@@ -0,0 +1,75 @@
+"""收藏改為型號層級 + prices 覆蓋索引 + products.model_id 索引
+
+資料遷移：舊版 add_favorite 寫入的 product_id 一律是 product_models.id (寫入前即以 product_models 驗證)，
+只是外鍵錯指向 products.id，因此值本身不需轉換：
+- 刪除指向不存在型號的收藏 (否則無法建立新外鍵)
+- 同一使用者重複收藏同一型號時保留最早的一筆 (否則無法建立唯一約束)
+之後外鍵改指向 product_models.id 並加上 (user_id, product_id) 唯一約束。
+
+Revision ID: 0004_model_favorites
+Revises: 0003_user_token_version
+Create Date: 2026-10-17 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004_model_favorites'
+down_revision: Union[str, Sequence[str], None] = '0003_user_token_version'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _favorites_fk_target():
+    for fk in sa.inspect(op.get_bind()).get_foreign_keys('favorites'):
+        if fk['constrained_columns'] == ['product_id']:
+            return fk['name'], fk['referred_table']
+    return None, None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # --- 1. favorites：資料清理後改外鍵 ---
+    fk_name, target = _favorites_fk_target()
+    if target != 'product_models':
+        op.execute("""
+            DELETE FROM favorites f
+            WHERE NOT EXISTS (SELECT 1 FROM product_models pm WHERE pm.id = f.product_id)
+        """)
+        op.execute("""
+            DELETE FROM favorites f
+            USING favorites keep
+            WHERE keep.user_id = f.user_id AND keep.product_id = f.product_id AND keep.id < f.id
+        """)
+        if fk_name:
+            op.drop_constraint(fk_name, 'favorites', type_='foreignkey')
+        op.create_foreign_key('favorites_product_id_fkey', 'favorites', 'product_models', ['product_id'], ['id'])
+    op.execute("""
+        DO $$ BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_favorite_user_model') THEN
+                ALTER TABLE favorites ADD CONSTRAINT uq_favorite_user_model UNIQUE (user_id, product_id);
+            END IF;
+        END $$
+    """)
+
+    # --- 2. prices：唯一約束改為 INCLUDE 價格欄位的唯一索引 (先建新索引，批次 Upsert 隨時都有可用的衝突目標) ---
+    op.create_index('uq_price_product_cover', 'prices', ['product_id'], unique=True,
+                    postgresql_include=['price', 'updated_at'], if_not_exists=True)
+    op.execute("ALTER TABLE prices DROP CONSTRAINT IF EXISTS uq_price_product_instance")
+
+    # --- 3. products.model_id ---
+    op.create_index(op.f('ix_products_model_id'), 'products', ['model_id'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_products_model_id'), table_name='products')
+    op.create_unique_constraint('uq_price_product_instance', 'prices', ['product_id'])
+    op.drop_index('uq_price_product_cover', table_name='prices')
+    op.drop_constraint('uq_favorite_user_model', 'favorites', type_='unique')
+    # 收藏的值仍是型號 ID；舊外鍵指向 products.id，無法保證對應，降版時不恢復外鍵
+    op.drop_constraint('favorites_product_id_fkey', 'favorites', type_='foreignkey')
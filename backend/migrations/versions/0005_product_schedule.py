@@ -0,0 +1,43 @@
+"""product_schedule：自適應爬取排程狀態
+
+不需回填：scheduler.claim_due_products 會把尚未排程的商品以基本間隔加入並立即到期。
+
+Revision ID: 0005_product_schedule
+Revises: 0004_model_favorites
+Create Date: 2026-10-17 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005_product_schedule'
+down_revision: Union[str, Sequence[str], None] = '0004_model_favorites'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('product_schedule',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('interval_minutes', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Numeric(precision=10, scale=3), nullable=False),
+    sa.Column('next_due_at', sa.DateTime(), nullable=False),
+    sa.Column('last_dispatched_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id'),
+    if_not_exists=True
+    )
+    op.create_index(op.f('ix_product_schedule_next_due_at'), 'product_schedule', ['next_due_at'], unique=False,
+                    if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_product_schedule_next_due_at'), table_name='product_schedule')
+    op.drop_table('product_schedule')
@@ -0,0 +1,34 @@
+"""alerts：一次性提醒的觸發紀錄 + 有效提醒的部分索引
+
+Revision ID: 0006_alert_triggers
+Revises: 0005_product_schedule
+Create Date: 2026-10-17 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006_alert_triggers'
+down_revision: Union[str, Sequence[str], None] = '0005_product_schedule'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('alerts', sa.Column('triggered_at', sa.DateTime(), nullable=True), if_not_exists=True)
+    op.add_column('alerts', sa.Column('triggered_price', sa.Numeric(precision=12, scale=2), nullable=True),
+                  if_not_exists=True)
+    op.create_index('idx_alerts_active_product_target', 'alerts', ['product_id', 'target_price'], unique=False,
+                    postgresql_where=sa.text('is_active IS true'), if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_alerts_active_product_target', table_name='alerts')
+    op.drop_column('alerts', 'triggered_price')
+    op.drop_column('alerts', 'triggered_at')
@@ -0,0 +1,30 @@
+"""product_models：(category, id) 複合索引取代單欄 category 索引 (/products Keyset 分頁)
+
+Revision ID: 0007_product_models_category_id
+Revises: 0006_alert_triggers
+Create Date: 2026-10-17 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007_product_models_category_id'
+down_revision: Union[str, Sequence[str], None] = '0006_alert_triggers'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('idx_product_models_category_id', 'product_models', ['category', 'id'], unique=False,
+                    if_not_exists=True)
+    op.drop_index(op.f('ix_product_models_category'), table_name='product_models', if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_product_models_category'), 'product_models', ['category'], unique=False)
+    op.drop_index('idx_product_models_category_id', table_name='product_models')
@@ -0,0 +1,86 @@
+"""price_history 改為依 recorded_at 的月分區表
+
+舊表改名保留，建好分區表 (主鍵 (id, recorded_at)) 與涵蓋既有資料的月分區後整批搬移，最後刪除舊表；
+id 序列接續舊表最大值。未來月份的分區之後由 maintenance 任務 (partitions.run_maintenance) 續建。
+降版時反向搬回未分區表 (已封存刪除的分區不會恢復)。
+
+Revision ID: 0008_price_history_partitions
+Revises: 0007_product_models_category_id
+Create Date: 2026-10-17 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from partitions import DEFAULT_PARTITION, backfill_partitions, ensure_partitions
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008_price_history_partitions'
+down_revision: Union[str, Sequence[str], None] = '0007_product_models_category_id'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = "id, product_id, platform_id, price, recorded_at"
+
+
+def _rename_away(suffix):
+    """price_history 與其主鍵、序列、索引改名，讓新表可以沿用原本的名稱"""
+    op.execute(f"ALTER TABLE price_history RENAME TO price_history_{suffix}")
+    op.execute(f"ALTER TABLE price_history_{suffix} RENAME CONSTRAINT price_history_pkey TO price_history_{suffix}_pkey")
+    op.execute(f"ALTER SEQUENCE price_history_id_seq RENAME TO price_history_{suffix}_id_seq")
+    op.execute(f"ALTER INDEX idx_history_product_time RENAME TO idx_history_product_time_{suffix}")
+
+
+def _create_table(partitioned):
+    op.create_table('price_history',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('platform_id', sa.Integer(), nullable=False),
+    sa.Column('price', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('recorded_at', sa.DateTime(), nullable=not partitioned),
+    sa.ForeignKeyConstraint(['platform_id'], ['platforms.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('id', 'recorded_at') if partitioned else sa.PrimaryKeyConstraint('id'),
+    **({'postgresql_partition_by': 'RANGE (recorded_at)'} if partitioned else {})
+    )
+    op.create_index('idx_history_product_time', 'price_history', ['product_id', 'recorded_at'], unique=False)
+
+
+def _move_rows(source, recorded_at="recorded_at"):
+    op.execute(f"""
+        INSERT INTO price_history ({COLUMNS})
+        SELECT id, product_id, platform_id, price, {recorded_at} FROM {source}
+    """)
+    op.execute(f"SELECT setval('price_history_id_seq', COALESCE((SELECT MAX(id) FROM {source}), 0) + 1, false)")
+    op.execute(f"DROP TABLE {source}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    relkind = conn.execute(sa.text("SELECT relkind FROM pg_class WHERE oid = to_regclass('price_history')")).scalar()
+    # 💡 早期版本曾在 alembic upgrade 結束時直接轉換；已是分區表就只補齊分區
+    if relkind != 'p':
+        _rename_away('unpartitioned')
+        _create_table(partitioned=True)
+        op.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF price_history DEFAULT")
+
+        # 先建好涵蓋既有資料的月分區，整批搬移時資料直接落入正確分區而不是 DEFAULT
+        oldest = conn.execute(sa.text("SELECT MIN(recorded_at) FROM price_history_unpartitioned")).scalar()
+        if oldest:
+            backfill_partitions(conn, oldest)
+        ensure_partitions(conn)
+        _move_rows('price_history_unpartitioned', recorded_at="COALESCE(recorded_at, NOW())")
+    else:
+        ensure_partitions(conn)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _rename_away('partitioned')
+    _create_table(partitioned=False)
+    # DROP 分區父表會一併刪除所有分區 (含 DEFAULT)
+    _move_rows('price_history_partitioned')
@@ -20,6 +20,9 @@ class User(Base):
     
     # 💡 關鍵新增：解決 Seed 錯誤並提供帳號停用功能
     is_active = Column(Boolean, default=True, nullable=False) 
+
+    # 💡 Token 版本：遞增即讓該使用者所有已簽發的 JWT 失效 (登出所有裝置 / 停權)
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
     
     created_at = Column(DateTime, default=get_tw_time)
 
@@ -31,9 +34,15 @@ class ProductModel(Base):
     __tablename__ = "product_models"
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(100), nullable=False, unique=True, index=True) 
-    category = Column(String(50), index=True) # 手機, 平板...
+    category = Column(String(50)) # 手機, 平板...
     
     items = relationship("Product", back_populates="model", cascade="all, delete-orphan")
+    favorites = relationship("Favorite", back_populates="model", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # 💡 /products 依分類篩選並以 id 遞減做 Keyset 分頁：(category, id) 可直接反向索引掃描，不需排序
+        Index('idx_product_models_category_id', 'category', 'id'),
+    )
 
 # --- 4. 平台定義 (Platforms) ---
 class Platform(Base):
@@ -49,7 +58,7 @@ class Product(Base):
     __tablename__ = "products"
     id = Column(Integer, primary_key=True, autoincrement=True)
     
-    model_id = Column(Integer, ForeignKey("product_models.id"), nullable=True)
+    model_id = Column(Integer, ForeignKey("product_models.id"), nullable=True, index=True)
     platform_id = Column(Integer, ForeignKey("platforms.id"), nullable=False)
     
     product_id_on_platform = Column(String(100), nullable=False, index=True)
@@ -62,7 +71,6 @@ class Product(Base):
     
     prices = relationship("Price", back_populates="product", cascade="all, delete-orphan")
     price_history = relationship("PriceHistory", back_populates="product", cascade="all, delete-orphan")
-    favorites = relationship("Favorite", back_populates="product", cascade="all, delete-orphan")
     alerts = relationship("Alert", back_populates="product", cascade="all, delete-orphan")
 
     __table_args__ = (
@@ -83,7 +91,9 @@ class Price(Base):
     platform = relationship("Platform")
 
     __table_args__ = (
-        UniqueConstraint('product_id', name='uq_price_product_instance'),
+        # 💡 唯一索引同時 INCLUDE 價格欄位：「某商品目前價格」可走 Index Only Scan，不必回表
+        Index('uq_price_product_cover', 'product_id', unique=True,
+              postgresql_include=['price', 'updated_at']),
     )
 
 # --- 7. 價格提醒 (Alerts) ---
@@ -95,24 +105,36 @@ class Alert(Base):
     target_price = Column(Numeric(12, 2), nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=get_tw_time)
+    # 💡 一次性提醒：觸發時由 alert_engine 停用並記錄觸發時間與價格
+    triggered_at = Column(DateTime)
+    triggered_price = Column(Numeric(12, 2))
 
     user = relationship("User", back_populates="alerts")
     product = relationship("Product", back_populates="alerts")
 
+    __table_args__ = (
+        # 💡 只索引有效提醒，並依 target_price 排序：新價格進來時以範圍掃描找出 target_price >= 新價格的提醒
+        Index('idx_alerts_active_product_target', 'product_id', 'target_price',
+              postgresql_where=is_active.is_(True)),
+    )
+
 # --- 8. 歷史價格 (PriceHistory) - 時間序列大數據 ---
+# 💡 依 recorded_at 做 PostgreSQL 原生月分區 (price_history_pYYYYMM + DEFAULT)，分區由 partitions.py 維護；
+#    分區表的主鍵必須包含分區鍵，因此主鍵為 (id, recorded_at)
 class PriceHistory(Base):
     __tablename__ = "price_history"
     id = Column(Integer, primary_key=True, autoincrement=True)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     platform_id = Column(Integer, ForeignKey("platforms.id"), nullable=False)
     price = Column(Numeric(12, 2), nullable=False)
-    recorded_at = Column(DateTime, default=get_tw_time)
+    recorded_at = Column(DateTime, primary_key=True, default=get_tw_time)
 
     product = relationship("Product", back_populates="price_history")
     platform = relationship("Platform")
 
     __table_args__ = (
         Index('idx_history_product_time', 'product_id', 'recorded_at'),
+        {'postgresql_partition_by': 'RANGE (recorded_at)'},
     )
 
 # --- 9. 收藏系統 (Favorites) ---
@@ -120,8 +142,53 @@ class Favorite(Base):
     __tablename__ = "favorites"
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    # 💡 收藏的是「型號」(product_models.id)，與前端商品列表 / add_favorite 的驗證一致；
+    #    欄位名稱沿用 product_id 以維持 API 相容
+    product_id = Column(Integer, ForeignKey("product_models.id"), nullable=False)
     created_at = Column(DateTime, default=get_tw_time)
 
     user = relationship("User", back_populates="favorites")
-    product = relationship("Product", back_populates="favorites")
\ No newline at end of file
+    model = relationship("ProductModel", back_populates="favorites")
+
+    __table_args__ = (
+        UniqueConstraint('user_id', 'product_id', name='uq_favorite_user_model'),
+    )
+
+# --- 10. 價格彙總 (PriceRollup) - 預先聚合的時間桶 ---
+# 💡 由 rollups.refresh_rollups 在每批價格寫入後增量更新，歷史走勢 API 直接讀取，
+#    查詢成本只與「桶數」有關，不隨 price_history 累積的列數成長
+class PriceRollupHourly(Base):
+    __tablename__ = "price_rollup_hourly"
+    model_id = Column(Integer, ForeignKey("product_models.id"), primary_key=True)
+    platform_id = Column(Integer, ForeignKey("platforms.id"), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    min_price = Column(Numeric(12, 2), nullable=False)
+    max_price = Column(Numeric(12, 2), nullable=False)
+    avg_price = Column(Numeric(12, 2), nullable=False)
+    last_price = Column(Numeric(12, 2), nullable=False)
+    sample_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=get_tw_time, onupdate=get_tw_time)
+
+class PriceRollupDaily(Base):
+    __tablename__ = "price_rollup_daily"
+    model_id = Column(Integer, ForeignKey("product_models.id"), primary_key=True)
+    platform_id = Column(Integer, ForeignKey("platforms.id"), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    min_price = Column(Numeric(12, 2), nullable=False)
+    max_price = Column(Numeric(12, 2), nullable=False)
+    avg_price = Column(Numeric(12, 2), nullable=False)
+    last_price = Column(Numeric(12, 2), nullable=False)
+    sample_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=get_tw_time, onupdate=get_tw_time)
+
+# --- 11. 排程狀態 (ProductSchedule) - 自適應爬取排程 ---
+# 💡 由 scheduler.recompute_schedule 依價格波動、收藏數與有效提醒計算每個商品的爬取間隔，
+#    排程 Tick 只派發 next_due_at 已到期的商品
+class ProductSchedule(Base):
+    __tablename__ = "product_schedule"
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    interval_minutes = Column(Integer, nullable=False)
+    score = Column(Numeric(10, 3), nullable=False, default=0)
+    next_due_at = Column(DateTime, nullable=False, index=True)
+    last_dispatched_at = Column(DateTime)
+    updated_at = Column(DateTime, default=get_tw_time, onupdate=get_tw_time)
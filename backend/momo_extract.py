@@ -0,0 +1,113 @@
+import json
+import re
+
+# --- 1. 預先編譯的目標標籤規則 ---
+# 💡 只認得我們需要的三種標籤，不建立 DOM；屬性順序、引號種類、大小寫皆不限
+_META_PRICE_RE = re.compile(
+    r"""<meta\b[^>]*?property\s*=\s*["']product:price:amount["'][^>]*>""", re.I
+)
+_CONTENT_RE = re.compile(r"""content\s*=\s*["']([^"']*)["']""", re.I)
+_LD_JSON_OPEN_RE = re.compile(
+    r"""<script\b[^>]*?type\s*=\s*["']application/ld\+json["'][^>]*>""", re.I
+)
+_SCRIPT_CLOSE_RE = re.compile(r"</script\s*>", re.I)
+_HEAD_CLOSE_RE = re.compile(r"</head\s*>", re.I)
+
+# 標籤可能被切在兩個 chunk 之間：每次回頭多掃這麼多字元
+_OVERLAP = 512
+
+
+def _offer_price(raw_json):
+    """從 JSON-LD 內容取出 offers.price，格式不符時回傳 None"""
+    try:
+        data = json.loads(raw_json)
+    except ValueError:
+        return None
+    nodes = data if isinstance(data, list) else data.get("@graph", [data]) if isinstance(data, dict) else []
+    for node in nodes:
+        if not isinstance(node, dict):
+            continue
+        offers = node.get("offers")
+        if isinstance(offers, list):
+            offers = offers[0] if offers else None
+        if isinstance(offers, dict) and offers.get("price") is not None:
+            return offers["price"]
+    return None
+
+
+# --- 2. 串流式擷取器 ---
+class MomoPriceExtractor:
+    """
+    逐段餵入 Momo 商品頁 HTML，一找到價格就停止，不建立完整的 BeautifulSoup 樹。
+    優先順序與 PriceScraper.parse_momo_html 相同：
+    1. <meta property="product:price:amount">：一找到立即完成
+    2. JSON-LD offers.price：meta 只會出現在 <head>，因此讀過 </head> 仍沒有 meta 時才採用
+
+    用法：
+        extractor = MomoPriceExtractor()
+        for chunk in chunks:
+            if extractor.feed(chunk): break
+        price = extractor.finish()   # None = 快速路徑失敗，可用 extractor.text 交給 BeautifulSoup
+    """
+    def __init__(self):
+        self.text = ""
+        self.price = None
+        self.done = False
+        self._scanned = 0       # meta / </head> 已掃描到的位置
+        self._ld_from = 0       # 下一個 JSON-LD 開頭標籤的搜尋起點
+        self._ld_start = None   # 已找到開頭、尚未找到 </script> 的 JSON-LD 內容起點
+        self._ld_price = None
+        self._head_closed = False
+
+    def feed(self, chunk):
+        """餵入一段文字，回傳是否已可確定價格 (True 時呼叫端應停止讀取)"""
+        if self.done or not chunk:
+            return self.done
+        self.text += chunk
+        start = max(self._scanned - _OVERLAP, 0)
+
+        meta = _META_PRICE_RE.search(self.text, start)
+        if meta:
+            content = _CONTENT_RE.search(meta.group(0))
+            if content:
+                self.price = content.group(1)
+                self.done = True
+                return True
+
+        self._scan_json_ld()
+
+        if not self._head_closed and _HEAD_CLOSE_RE.search(self.text, start):
+            self._head_closed = True
+        if self._ld_price is not None and self._head_closed:
+            self.price = self._ld_price
+            self.done = True
+
+        self._scanned = len(self.text)
+        return self.done
+
+    def _scan_json_ld(self):
+        while self._ld_price is None:
+            if self._ld_start is None:
+                opening = _LD_JSON_OPEN_RE.search(self.text, self._ld_from)
+                if not opening:
+                    self._ld_from = max(len(self.text) - _OVERLAP, self._ld_from)
+                    return
+                self._ld_start = opening.end()
+            closing = _SCRIPT_CLOSE_RE.search(self.text, self._ld_start)
+            if not closing:
+                return
+            self._ld_price = _offer_price(self.text[self._ld_start:closing.start()])
+            self._ld_start, self._ld_from = None, closing.end()
+
+    def finish(self):
+        """資料讀完後呼叫：回傳擷取到的原始價格字串 / 數字，找不到時回傳 None"""
+        if not self.done and self._ld_price is not None:
+            self.price, self.done = self._ld_price, True
+        return self.price
+
+
+def extract_momo_price(html):
+    """對完整 HTML 字串執行快速擷取 (仍會在找到價格處停止掃描)"""
+    extractor = MomoPriceExtractor()
+    extractor.feed(html)
+    return extractor.finish()
@@ -0,0 +1,207 @@
+"""
+price_history 月分區維護：
+
+    python partitions.py              # 建立未來分區
+    python partitions.py archive      # 另外封存並刪除超過保留期限的分區
+
+未分區的舊表由 Alembic 遷移 0008_price_history_partitions 轉換；之後每日的 maintenance 任務續建未來分區。
+"""
+import logging
+import os
+import sys
+from datetime import date, datetime
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from sqlalchemy import text
+
+from database import engine
+from models import PriceHistory
+
+logger = logging.getLogger("PriceScraper")
+
+# --- 1. 分區參數 ---
+# 💡 預先建立未來幾個月的分區，避免新資料落入 DEFAULT 分區
+PRICE_HISTORY_MONTHS_AHEAD = int(os.getenv("PRICE_HISTORY_MONTHS_AHEAD", "3"))
+# 保留最近幾個月的原始歷史；更早的分區封存到磁碟後刪除 (0 = 永久保留)
+# 💡 走勢圖預設讀取小時/日彙總表，封存原始歷史不影響長期走勢
+PRICE_HISTORY_RETENTION_MONTHS = int(os.getenv("PRICE_HISTORY_RETENTION_MONTHS", "24"))
+PRICE_HISTORY_ARCHIVE_DIR = os.getenv("PRICE_HISTORY_ARCHIVE_DIR", os.path.join(os.getcwd(), "archive"))
+
+PARENT = PriceHistory.__tablename__
+DEFAULT_PARTITION = f"{PARENT}_default"
+COLUMNS = "id, product_id, platform_id, price, recorded_at"
+# 💡 封存檔的 Schema：價格保留 NUMERIC(12, 2) 的精確值，不轉成浮點數
+ARCHIVE_SCHEMA = pa.schema([
+    ("id", pa.int32()),
+    ("product_id", pa.int32()),
+    ("platform_id", pa.int32()),
+    ("price", pa.decimal128(12, 2)),
+    ("recorded_at", pa.timestamp("us")),
+])
+
+
+def _month_start(d):
+    return date(d.year, d.month, 1)
+
+
+def _add_months(d, months):
+    index = d.year * 12 + d.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{PARENT}_p{month:%Y%m}"
+
+
+def _relkind(conn, name):
+    return conn.execute(text("""
+        SELECT c.relkind FROM pg_class c
+        WHERE c.oid = to_regclass(:name)
+    """), {"name": name}).scalar()
+
+
+# --- 2. 建立分區 ---
+def create_month_partition(conn, month):
+    """
+    建立 month 所在月份的分區。若 DEFAULT 分區已有該月資料 (例如分區晚建)，
+    先把資料搬進新表再 ATTACH，否則 PostgreSQL 會拒絕建立重疊的分區。
+    """
+    name = partition_name(month)
+    if _relkind(conn, name):
+        return False
+    start, end = month, _add_months(month, 1)
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT} INCLUDING DEFAULTS)"))
+    if _relkind(conn, DEFAULT_PARTITION):
+        conn.execute(text(f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION}
+                WHERE recorded_at >= :start AND recorded_at < :end
+                RETURNING {COLUMNS}
+            )
+            INSERT INTO {name} ({COLUMNS}) SELECT {COLUMNS} FROM moved
+        """), {"start": start, "end": end})
+    conn.execute(text(
+        f"ALTER TABLE {PARENT} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+    ))
+    logger.info(f"🗂️ 建立分區 {name} ({start} ~ {end})")
+    return True
+
+
+def ensure_partitions(conn, months_ahead=PRICE_HISTORY_MONTHS_AHEAD, today=None):
+    """確保本月起往後 months_ahead 個月的分區與 DEFAULT 分區都存在，回傳新建的分區數"""
+    if _relkind(conn, PARENT) != "p":
+        return 0
+    if not _relkind(conn, DEFAULT_PARTITION):
+        conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT"))
+    month = _month_start(today or datetime.now())
+    return sum(create_month_partition(conn, _add_months(month, i)) for i in range(months_ahead + 1))
+
+
+def backfill_partitions(conn, since, today=None):
+    """建立 since 所在月份起到本月之前的分區 (既有資料轉入分區表時使用，見遷移 0008)"""
+    month, current = _month_start(since), _month_start(today or datetime.now())
+    created = 0
+    while month < current:
+        created += create_month_partition(conn, month)
+        month = _add_months(month, 1)
+    return created
+
+
+# --- 3. 封存與保留期限 ---
+def list_month_partitions(conn):
+    """回傳 [(分區名稱, 月份起始日)]，依月份排序 (不含 DEFAULT 分區)"""
+    rows = conn.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:parent)
+    """), {"parent": PARENT}).scalars()
+    partitions = []
+    prefix = f"{PARENT}_p"
+    for name in rows:
+        if name.startswith(prefix) and name[len(prefix):].isdigit():
+            stamp = name[len(prefix):]
+            partitions.append((name, date(int(stamp[:4]), int(stamp[4:]), 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def _csv_to_parquet(source, target):
+    """以 Arrow 的 CSV 串流讀取器逐區塊轉換，記憶體只需容納一個區塊"""
+    with pq.ParquetWriter(target, ARCHIVE_SCHEMA, compression="zstd") as writer:
+        try:
+            reader = pa_csv.open_csv(
+                source,
+                read_options=pa_csv.ReadOptions(column_names=ARCHIVE_SCHEMA.names),
+                convert_options=pa_csv.ConvertOptions(column_types=ARCHIVE_SCHEMA),
+            )
+        except pa.ArrowInvalid as e:
+            # 空分區 = 空的 CSV；仍輸出只有 Schema 的檔案
+            if "Empty CSV" not in str(e):
+                raise
+            return
+        for batch in reader:
+            writer.write_batch(batch)
+
+
+def archive_partition(conn, name, archive_dir=PRICE_HISTORY_ARCHIVE_DIR):
+    """
+    DETACH 分區 → 以 COPY 匯出 CSV 暫存檔 → 逐批轉為 zstd 壓縮的 Parquet → DROP。
+    Parquet 與 history_export 的匯出格式相同，可直接用 pyarrow / pandas / DuckDB 讀取。
+    檔案先寫入 .tmp 再改名，匯出失敗時交易回滾、分區保持原狀。
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.parquet")
+    staging = os.path.join(archive_dir, f"{name}.csv.tmp")
+    conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+
+    cursor = conn.connection.cursor()
+    try:
+        with open(staging, "wb") as f:
+            cursor.copy_expert(
+                f"COPY (SELECT {COLUMNS} FROM {name} ORDER BY recorded_at) TO STDOUT WITH (FORMAT csv)", f
+            )
+        _csv_to_parquet(staging, path + ".tmp")
+    finally:
+        cursor.close()
+        if os.path.exists(staging):
+            os.remove(staging)
+    os.replace(path + ".tmp", path)
+
+    conn.execute(text(f"DROP TABLE {name}"))
+    logger.info(f"📦 已封存分區 {name} -> {path}")
+    return path
+
+
+def expired_partitions(conn, retention_months=PRICE_HISTORY_RETENTION_MONTHS, today=None):
+    """整個月份都早於保留期限的分區名稱"""
+    if retention_months <= 0 or _relkind(conn, PARENT) != "p":
+        return []
+    cutoff = _add_months(_month_start(today or datetime.now()), -retention_months)
+    return [name for name, month in list_month_partitions(conn) if month < cutoff]
+
+
+# --- 4. 入口 ---
+def maintain_partitions(conn):
+    """建立未來分區 (未分區的舊表由 Alembic 遷移 0008 轉換，尚未升級時不做任何事)"""
+    return {"created": ensure_partitions(conn)}
+
+
+def run_maintenance(archive=True):
+    """
+    Celery maintenance 任務使用：建立未來分區，再逐一封存過期分區。
+    每個分區各自一個交易，封存多個分區時不會長時間持有父表的鎖。
+    """
+    with engine.begin() as conn:
+        result = maintain_partitions(conn)
+        expired = expired_partitions(conn) if archive else []
+    result["archived"] = []
+    for name in expired:
+        with engine.begin() as conn:
+            result["archived"].append(archive_partition(conn, name))
+    return result
+
+
+if __name__ == "__main__":
+    print(run_maintenance(archive="archive" in sys.argv[1:]))
@@ -0,0 +1,53 @@
+import logging
+
+import redis
+
+from redis_client import get_redis
+
+logger = logging.getLogger("PriceScraper")
+
+# 💡 Redis 不可用時的行程內備援 (Celery Worker 行程會跨任務存活，命中率仍然可觀)
+_local_cache = {}
+
+
+class LastPriceCache:
+    """
+    各商品「最後一次寫入 price_history」的價格與時間快取。
+    讓寫入端不必額外查詢資料庫就能判斷價格是否變動。
+
+    Redis 結構：HASH price:last  field=product_id  value="價格|epoch 秒"
+    """
+    KEY = "price:last"
+
+    def __init__(self, client=None):
+        self.client = client
+
+    def _redis(self):
+        return self.client or get_redis()
+
+    def get_many(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return {}
+        try:
+            values = self._redis().hmget(self.KEY, [str(pid) for pid in product_ids])
+            result = {}
+            for pid, raw in zip(product_ids, values):
+                if raw:
+                    price, ts = raw.split("|")
+                    result[pid] = (float(price), float(ts))
+            return result
+        except redis.RedisError as e:
+            logger.warning(f"⚠️ 讀取最後價格快取失敗，改用本地快取: {e}")
+            return {pid: _local_cache[pid] for pid in product_ids if pid in _local_cache}
+
+    def set_many(self, mapping):
+        if not mapping:
+            return
+        _local_cache.update(mapping)
+        try:
+            self._redis().hset(self.KEY, mapping={
+                str(pid): f"{price}|{ts}" for pid, (price, ts) in mapping.items()
+            })
+        except redis.RedisError as e:
+            logger.warning(f"⚠️ 更新最後價格快取失敗 (僅保留本地快取): {e}")
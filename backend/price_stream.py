@@ -0,0 +1,108 @@
+import asyncio
+import json
+import logging
+import os
+
+import redis
+import redis.asyncio
+
+from redis_client import REDIS_URL, get_redis
+
+logger = logging.getLogger("PriceScraper")
+
+PRICE_STREAM_ENABLED = os.getenv("PRICE_STREAM_ENABLED", "true").lower() in ("1", "true", "yes")
+PRICE_STREAM_CHANNEL = os.getenv("PRICE_STREAM_CHANNEL", "prices:updates")
+# 💡 每位連線中的客戶端最多暫存幾則未送出的訊息；客戶端太慢時丟棄最舊的
+PRICE_STREAM_QUEUE_SIZE = int(os.getenv("PRICE_STREAM_QUEUE_SIZE", "100"))
+
+
+# --- 1. 發布端 (Worker / 爬蟲，同步 Redis) ---
+def publish_price_updates(rows):
+    """
+    價格批次 Commit 後呼叫：把本批寫入 price_history 的列 (即價格變動) 以單一 PUBLISH 送出。
+    推播失敗不影響寫入，客戶端重新連線時會自行重抓 REST 資料。
+    """
+    if not PRICE_STREAM_ENABLED or not rows:
+        return
+    payload = [
+        {
+            "model_id": r["model_id"],
+            "product_id": r["product_id"],
+            "platform_id": r["platform_id"],
+            "price": float(r["price"]),
+            "recorded_at": r["recorded_at"].isoformat(),
+        }
+        for r in rows if r.get("model_id")
+    ]
+    if not payload:
+        return
+    try:
+        get_redis().publish(PRICE_STREAM_CHANNEL, json.dumps(payload))
+    except redis.RedisError as e:
+        logger.warning(f"⚠️ 價格推播失敗: {e}")
+
+
+# --- 2. 訂閱端 (API，每個行程共用一條 Redis 訂閱連線) ---
+class PriceStreamHub:
+    """
+    API 行程內的推播分發器：
+    - 整個行程只向 Redis 訂閱一次，不隨連線中的客戶端數量增加 Redis 連線
+    - 每位客戶端一個 asyncio.Queue，只收到自己訂閱的型號 (model_ids=None 表示全部)
+    - 最後一位客戶端離線時取消訂閱並關閉連線，下一位客戶端連線時再重新訂閱
+    """
+    def __init__(self):
+        self.clients = {}
+        self._task = None
+
+    def subscribe(self, model_ids=None):
+        queue = asyncio.Queue(maxsize=PRICE_STREAM_QUEUE_SIZE)
+        self.clients[queue] = set(model_ids) if model_ids else None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.clients.pop(queue, None)
+        if not self.clients and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def dispatch(self, updates):
+        for queue, model_ids in list(self.clients.items()):
+            selected = updates if model_ids is None else [u for u in updates if u["model_id"] in model_ids]
+            if not selected:
+                continue
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(selected)
+
+    def _on_message(self, data):
+        # 💡 單則訊息格式錯誤只丟棄該則，不能讓整個訂閱任務結束 (所有客戶端都會收不到推播)
+        try:
+            self.dispatch(json.loads(data))
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"⚠️ 略過無法解析的價格推播訊息: {e}")
+
+    async def _listen(self):
+        # 💡 訂閱需要長時間阻塞讀取，不能沿用 socket_timeout=2 的共用連線
+        client = redis.asyncio.Redis.from_url(REDIS_URL, decode_responses=True)
+        try:
+            while True:
+                pubsub = client.pubsub()
+                try:
+                    await pubsub.subscribe(PRICE_STREAM_CHANNEL)
+                    while True:
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                        if message:
+                            self._on_message(message["data"])
+                except redis.RedisError as e:
+                    logger.warning(f"⚠️ 價格推播訂閱中斷，5 秒後重試: {e}")
+                    await asyncio.sleep(5)
+                finally:
+                    # 取消 (最後一位客戶端離線) 時也會執行：退訂並歸還連線
+                    await pubsub.aclose()
+        finally:
+            await client.aclose()
+
+
+price_hub = PriceStreamHub()
@@ -0,0 +1,195 @@
+import csv
+import io
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy.dialects.postgresql import insert
+
+from database import SessionLocal
+from models import Price, PriceHistory
+from price_cache import LastPriceCache
+from price_stream import publish_price_updates
+from alert_engine import claim_triggered_alerts, dispatch_alerts
+from rollups import ROLLUPS_ENABLED, refresh_rollups
+from response_cache import invalidate_prices
+from validator_store import ValidatorStore
+
+# 💡 共用 scraper.setup_logging() 設定好的 Logger (直接依名稱取得，避免與 scraper 循環引用)
+logger = logging.getLogger("PriceScraper")
+
+# 💡 每累積多少筆結果才寫入一次資料庫 (一次 Upsert + 一次 COPY + 一次 Commit)
+PRICE_BATCH_SIZE = int(os.getenv("PRICE_BATCH_SIZE", "50"))
+
+# 💡 只在價格變動時寫入 price_history；價格不變時每隔 HISTORY_HEARTBEAT_HOURS 補一筆「仍在販售」心跳
+HISTORY_CHANGE_ONLY = os.getenv("HISTORY_CHANGE_ONLY", "true").lower() in ("1", "true", "yes")
+HISTORY_HEARTBEAT_HOURS = float(os.getenv("HISTORY_HEARTBEAT_HOURS", "24"))
+
+
+class PriceBatchWriter:
+    """
+    緩衝式價格寫入器：
+    1. 爬蟲結果先進記憶體緩衝區，不持有任何 DB 連線 (避免在 HTTP 等待期間占用連線池)
+    2. 達到 batch_size 時才借出連線，以單一多列 Upsert 更新 prices、以 COPY 批次寫入 price_history
+    3. 每批只 Commit 一次
+    4. (HISTORY_CHANGE_ONLY) 依 LastPriceCache 判斷，只有價格變動或心跳到期才寫入 price_history
+    5. (ROLLUPS_ENABLED) 同一交易內增量更新小時/日彙總表
+    6. (PRICE_STREAM_ENABLED) Commit 後把價格變動發布到 Redis，由 API 以 SSE 推播給前端
+    7. (ALERTS_ENABLED) 同一交易內比對本批新價格的降價提醒，Commit 後才發送通知
+    8. 隨價格帶入的 HTTP 驗證紀錄 (ETag / 內容雜湊) 在 Commit 成功後才寫入 ValidatorStore，
+       寫入失敗時下次抓取仍會視為有變動而重新寫入
+
+    用法：
+        with PriceBatchWriter() as writer:
+            key = scraper.validator_key(platform, item.product_id_on_platform)
+            writer.add(item.id, item.platform_id, price, validator=scraper.validators.take_pending(key))
+    """
+    def __init__(self, batch_size: int = None, session_factory=SessionLocal,
+                 change_only: bool = None, price_cache: LastPriceCache = None,
+                 validators: ValidatorStore = None):
+        self.batch_size = max(batch_size or PRICE_BATCH_SIZE, 1)
+        self.session_factory = session_factory
+        self.change_only = HISTORY_CHANGE_ONLY if change_only is None else change_only
+        self.price_cache = price_cache or LastPriceCache()
+        self.validators = validators or ValidatorStore()
+        self.buffer = []
+        self.written = 0
+        self.history_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 即使任務中途出錯，已抓到的價格仍盡量落地
+        self.flush()
+        return False
+
+    def add(self, product_id, platform_id, price, recorded_at=None, model_id=None, validator=None):
+        self.buffer.append({
+            "product_id": product_id,
+            "platform_id": platform_id,
+            "price": price,
+            "recorded_at": recorded_at or datetime.now(),
+            "model_id": model_id,
+            "validator": validator,
+        })
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return 0
+        rows, self.buffer = self.buffer, []
+
+        history_rows, cache_updates = self._select_history_rows(rows)
+
+        db = self.session_factory()
+        triggered = []
+        try:
+            self._upsert_prices(db, rows)
+            if history_rows:
+                self._insert_history(db, history_rows)
+                if ROLLUPS_ENABLED:
+                    # 💡 與歷史寫入同一交易更新彙總表，兩者永遠一致
+                    refresh_rollups(
+                        db,
+                        {r["product_id"] for r in history_rows},
+                        min(r["recorded_at"] for r in history_rows)
+                    )
+                triggered = claim_triggered_alerts(db, history_rows)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"❌ 批次寫入失敗 ({len(rows)} 筆): {e}")
+            raise
+        finally:
+            db.close()
+
+        self.written += len(rows)
+        self.history_written += len(history_rows)
+        logger.info(f"💾 批次寫入 {len(rows)} 筆價格 (歷史 {len(history_rows)} 筆)")
+
+        # 💡 Commit 成功後才更新快取與 HTTP 驗證紀錄，避免回滾時與資料庫不一致；
+        #    資料已落地，後續步驟 (Redis / Celery) 各自失敗只記錄警告，不影響其他步驟也不視為寫入失敗
+        self._after_commit("價格快取", self.price_cache.set_many, cache_updates)
+        self._after_commit("HTTP 驗證紀錄", self.validators.save,
+                           {k: v for r in rows if r["validator"] for k, v in r["validator"].items()})
+        if history_rows:
+            # 💡 有新的歷史點才需要讓 API 回應快取失效
+            self._after_commit("回應快取失效", invalidate_prices, {r["model_id"] for r in history_rows})
+            self._after_commit("價格推播", publish_price_updates, history_rows)
+        self._after_commit("降價提醒通知", dispatch_alerts, triggered)
+        return len(rows)
+
+    @staticmethod
+    def _after_commit(label, func, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            logger.warning(f"⚠️ 批次寫入後處理失敗 ({label})，資料已寫入: {e}")
+
+    def _select_history_rows(self, rows):
+        """
+        回傳 (需寫入 price_history 的列, 待更新的快取)。
+        快取未命中 (例如 Redis 剛重啟) 時視為變動並寫入，不額外查詢資料庫。
+        """
+        if not self.change_only:
+            return rows, {}
+
+        last = self.price_cache.get_many({r["product_id"] for r in rows})
+        heartbeat = HISTORY_HEARTBEAT_HOURS * 3600
+        selected, updates = [], {}
+        for r in rows:
+            pid = r["product_id"]
+            price = round(float(r["price"]), 2)
+            ts = r["recorded_at"].timestamp()
+            prev = last.get(pid)
+            if prev is None or prev[0] != price or ts - prev[1] >= heartbeat:
+                selected.append(r)
+                last[pid] = updates[pid] = (price, ts)
+        return selected, updates
+
+    def _upsert_prices(self, db, rows):
+        # 💡 同一批內同一商品只保留最後一筆，否則 ON CONFLICT 會因重複更新同列而報錯
+        latest = {}
+        for r in rows:
+            latest[r["product_id"]] = r
+
+        stmt = insert(Price).values([
+            {
+                "product_id": r["product_id"],
+                "platform_id": r["platform_id"],
+                "price": r["price"],
+                "updated_at": r["recorded_at"],
+            } for r in latest.values()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['product_id'],
+            set_={'price': stmt.excluded.price, 'updated_at': stmt.excluded.updated_at}
+        )
+        db.execute(stmt)
+
+    def _insert_history(self, db, rows):
+        raw_conn = db.connection().connection
+        cursor = raw_conn.cursor()
+        if hasattr(cursor, "copy_expert"):
+            # 💡 psycopg2：使用 COPY FROM STDIN，比多列 INSERT 更省解析與 WAL 開銷
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            for r in rows:
+                writer.writerow([r["product_id"], r["platform_id"], r["price"], r["recorded_at"].isoformat()])
+            buf.seek(0)
+            try:
+                cursor.copy_expert(
+                    "COPY price_history (product_id, platform_id, price, recorded_at) FROM STDIN WITH (FORMAT csv)",
+                    buf
+                )
+            finally:
+                cursor.close()
+            return
+
+        cursor.close()
+        # 非 psycopg2 驅動的備援：單一多列 INSERT
+        db.execute(insert(PriceHistory).values([
+            {k: r[k] for k in ("product_id", "platform_id", "price", "recorded_at")} for r in rows
+        ]))
@@ -0,0 +1,41 @@
+import os
+
+import redis
+import redis.asyncio
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+
+_client = None
+
+
+def get_redis():
+    """
+    取得共用的 Redis 連線 (與 Celery Broker 同一個 Redis)。
+    redis-py 內建連線池，整個行程共用一個 client 即可。
+    """
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            REDIS_URL,
+            decode_responses=True,
+            socket_timeout=2,          # 👈 Redis 異常時快速失敗，讓呼叫端降級而不是卡住
+            socket_connect_timeout=2,
+        )
+    return _client
+
+
+
+_async_client = None
+
+
+def get_async_redis():
+    """FastAPI (async 路由) 使用的 Redis 連線，避免同步 I/O 阻塞事件迴圈"""
+    global _async_client
+    if _async_client is None:
+        _async_client = redis.asyncio.Redis.from_url(
+            REDIS_URL,
+            decode_responses=True,
+            socket_timeout=2,
+            socket_connect_timeout=2,
+        )
+    return _async_client
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import logging
+import os
+
+import redis
+from fastapi import Request, Response
+
+from fast_json import dumps
+from redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger("PriceScraper")
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+
+# 💡 失效策略：不刪除快取鍵，而是遞增「版本號」。
+#    快取鍵內含版本號，版本一變舊鍵就不再被讀到，並由 TTL 自然過期 (不需要 SCAN / KEYS)。
+CATALOG_VERSION = "resp:ver:catalog"          # /products、/stats
+
+
+def model_version(model_id):
+    return f"resp:ver:model:{model_id}"       # /products/{model_id}/history
+
+
+def favorites_version(user_id):
+    return f"resp:ver:fav:{user_id}"          # 某位使用者的收藏集合
+
+
+def _bump(keys):
+    if not RESPONSE_CACHE_ENABLED or not keys:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for key in keys:
+            pipe.incr(key)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"⚠️ 快取失效通知失敗 (將等待 TTL 過期): {e}")
+
+
+def invalidate_prices(model_ids):
+    """價格寫入後呼叫：讓相關型號的走勢與商品列表/統計快取失效"""
+    _bump([CATALOG_VERSION] + [model_version(mid) for mid in set(model_ids) if mid])
+
+
+async def invalidate_favorites(user_id):
+    """收藏異動後呼叫 (API 端，使用非同步 Redis)"""
+    if not RESPONSE_CACHE_ENABLED:
+        return
+    try:
+        await get_async_redis().incr(favorites_version(user_id))
+    except redis.RedisError as e:
+        logger.warning(f"⚠️ 快取失效通知失敗 (將等待 TTL 過期): {e}")
+
+
+def _make_etag(body: bytes):
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def _respond(request: Request, body: bytes, etag: str):
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    # 💡 Cache-Control: no-cache = 瀏覽器 / nginx 可保留副本，但每次都要帶 If-None-Match 回來驗證
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def cached_response(request: Request, name: str, params: dict, versions: list, build, ttl: int = None):
+    """
+    以 Redis 快取序列化後的回應：
+    - name / params / versions 組成快取鍵
+    - await build() 只在快取未命中時呼叫，回傳可被 orjson 序列化的資料
+    - 回應一律帶 ETag，命中 If-None-Match 時回 304 (不傳 body)
+    Redis 異常時自動退化為直接查詢。
+    """
+    async def render():
+        # 💡 orjson 直接把 dict / list / datetime 轉成 bytes，不再經過 jsonable_encoder 逐層複製
+        body = dumps(await build())
+        return body, _make_etag(body)
+
+    if not RESPONSE_CACHE_ENABLED:
+        return _respond(request, *await render())
+
+    try:
+        client = get_async_redis()
+        version_values = await client.mget(versions) if versions else []
+        raw_key = json.dumps([params, version_values], sort_keys=True, default=str)
+        key = f"resp:{name}:" + hashlib.sha1(raw_key.encode("utf-8")).hexdigest()
+
+        cached = await client.hgetall(key)
+        if cached:
+            return _respond(request, cached["body"].encode("utf-8"), cached["etag"])
+    except redis.RedisError as e:
+        logger.warning(f"⚠️ 回應快取不可用，改為直接查詢: {e}")
+        return _respond(request, *await render())
+
+    body, etag = await render()
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.hset(key, mapping={"body": body.decode("utf-8"), "etag": etag})
+        pipe.expire(key, ttl or RESPONSE_CACHE_TTL)
+        await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"⚠️ 回應快取寫入失敗: {e}")
+    return _respond(request, body, etag)
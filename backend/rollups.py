@@ -0,0 +1,81 @@
+import logging
+import os
+
+from sqlalchemy import text
+
+from database import SessionLocal
+
+logger = logging.getLogger("PriceScraper")
+
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# 時間粒度 -> (資料表, date_trunc 單位)
+ROLLUP_TABLES = {
+    "hour": ("price_rollup_hourly", "hour"),
+    "day": ("price_rollup_daily", "day"),
+}
+
+# 💡 以 price_history 重算指定範圍的時間桶並 Upsert；
+#    只重算受影響的型號與時間範圍，所以是「增量」而非全表掃描
+_UPSERT_SQL = """
+    INSERT INTO {table} (model_id, platform_id, bucket_start,
+                         min_price, max_price, avg_price, last_price, sample_count, updated_at)
+    SELECT p.model_id, ph.platform_id, date_trunc('{unit}', ph.recorded_at) AS bucket_start,
+           MIN(ph.price), MAX(ph.price), ROUND(AVG(ph.price), 2),
+           (ARRAY_AGG(ph.price ORDER BY ph.recorded_at DESC))[1],
+           COUNT(*), NOW()
+    FROM price_history ph
+    JOIN products p ON p.id = ph.product_id
+    WHERE p.model_id IS NOT NULL
+      {filters}
+    GROUP BY p.model_id, ph.platform_id, date_trunc('{unit}', ph.recorded_at)
+    ON CONFLICT (model_id, platform_id, bucket_start) DO UPDATE SET
+        min_price = EXCLUDED.min_price,
+        max_price = EXCLUDED.max_price,
+        avg_price = EXCLUDED.avg_price,
+        last_price = EXCLUDED.last_price,
+        sample_count = EXCLUDED.sample_count,
+        updated_at = EXCLUDED.updated_at
+"""
+
+
+def refresh_rollups(db, product_ids, since):
+    """
+    在呼叫端的交易內，重算 product_ids 所屬型號自 since 所在時間桶起的彙總。
+    由 PriceBatchWriter 於每批寫入後呼叫，不自行 Commit。
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return
+    filters = """
+      AND p.model_id IN (SELECT model_id FROM products WHERE id = ANY(:pids))
+      AND ph.recorded_at >= date_trunc('{unit}', CAST(:since AS TIMESTAMP))
+    """
+    for table, unit in ROLLUP_TABLES.values():
+        db.execute(
+            text(_UPSERT_SQL.format(table=table, unit=unit, filters=filters.format(unit=unit))),
+            {"pids": product_ids, "since": since}
+        )
+
+
+def rebuild_rollups():
+    """全量重建 (首次部署或資料修正後使用)：python rollups.py"""
+    db = SessionLocal()
+    try:
+        for table, unit in ROLLUP_TABLES.values():
+            db.execute(text(f"TRUNCATE {table}"))
+            db.execute(text(_UPSERT_SQL.format(table=table, unit=unit, filters="")))
+            logger.info(f"📊 已重建彙總表 {table}")
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"❌ 重建彙總表失敗: {e}")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    from scraper import setup_logging
+    setup_logging()
+    rebuild_rollups()
@@ -0,0 +1,174 @@
+import logging
+import math
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from database import SessionLocal
+from models import ProductSchedule
+
+logger = logging.getLogger("PriceScraper")
+
+# --- 1. 排程參數 ---
+# 💡 間隔上下限：最熱門的商品最短 MIN 分鐘爬一次，長期不動且無人關注的商品最長 MAX 分鐘一次
+SCHEDULER_BASE_INTERVAL_MINUTES = int(os.getenv("SCHEDULER_BASE_INTERVAL_MINUTES", "120"))
+SCHEDULER_MIN_INTERVAL_MINUTES = int(os.getenv("SCHEDULER_MIN_INTERVAL_MINUTES", "30"))
+SCHEDULER_MAX_INTERVAL_MINUTES = int(os.getenv("SCHEDULER_MAX_INTERVAL_MINUTES", "1440"))
+# 計算價格波動時回看的天數
+SCHEDULER_LOOKBACK_DAYS = int(os.getenv("SCHEDULER_LOOKBACK_DAYS", "7"))
+# 💡 每次 Tick 最多派發的商品數 = 速率預算；超過的商品留到下一次 Tick (最逾期的優先)
+SCHEDULER_MAX_DUE_PER_TICK = int(os.getenv("SCHEDULER_MAX_DUE_PER_TICK", "2000"))
+
+# 各商品的評分依據：回看期間內的價格變動次數、型號被收藏數、有效提醒數
+_SIGNALS_SQL = """
+    WITH changes AS (
+        SELECT product_id,
+               COUNT(*) FILTER (WHERE prev_price IS NOT NULL AND price <> prev_price) AS n
+        FROM (
+            SELECT product_id, price,
+                   LAG(price) OVER (PARTITION BY product_id ORDER BY recorded_at) AS prev_price
+            FROM price_history
+            WHERE recorded_at >= :since
+        ) h
+        GROUP BY product_id
+    ),
+    favs AS (
+        SELECT product_id AS model_id, COUNT(*) AS n FROM favorites GROUP BY product_id
+    ),
+    active_alerts AS (
+        SELECT product_id, COUNT(*) AS n FROM alerts WHERE is_active GROUP BY product_id
+    )
+    SELECT p.id,
+           COALESCE(c.n, 0) AS changes,
+           COALESCE(f.n, 0) AS favorites,
+           COALESCE(a.n, 0) AS alerts,
+           s.last_dispatched_at
+    FROM products p
+    LEFT JOIN changes c ON c.product_id = p.id
+    LEFT JOIN favs f ON f.model_id = p.model_id
+    LEFT JOIN active_alerts a ON a.product_id = p.id
+    LEFT JOIN product_schedule s ON s.product_id = p.id
+"""
+
+# 💡 取出到期商品並同時推進 next_due_at；SKIP LOCKED 讓重疊的 Tick 不會重複派發同一商品
+_CLAIM_DUE_SQL = """
+    WITH due AS (
+        SELECT product_id FROM product_schedule
+        WHERE next_due_at <= :now
+        ORDER BY next_due_at
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE product_schedule s
+    SET last_dispatched_at = :now,
+        next_due_at = :now + make_interval(mins => s.interval_minutes)
+    FROM due
+    WHERE s.product_id = due.product_id
+    RETURNING s.product_id
+"""
+
+
+# --- 2. 評分與間隔 ---
+def compute_score(changes, favorites, alerts, lookback_days=SCHEDULER_LOOKBACK_DAYS):
+    """
+    score = 每日價格變動次數 + log2(1 + 關注度)，關注度 = 收藏數 + 2 × 有效提醒數。
+    關注度取對數，避免單一熱門商品吃掉整個速率預算。
+    """
+    volatility = changes / max(lookback_days, 1)
+    demand = favorites + 2 * alerts
+    return volatility + math.log2(1 + demand)
+
+
+def compute_interval(score):
+    """score 越高間隔越短；score = 0 (不動且無人關注) 直接給最長間隔"""
+    if score <= 0:
+        return SCHEDULER_MAX_INTERVAL_MINUTES
+    interval = SCHEDULER_BASE_INTERVAL_MINUTES / (1 + score)
+    return int(min(max(interval, SCHEDULER_MIN_INTERVAL_MINUTES), SCHEDULER_MAX_INTERVAL_MINUTES))
+
+
+# --- 3. 排程維護 ---
+def recompute_schedule(now=None):
+    """依最新訊號重算所有商品的間隔；已派發過的商品以「上次派發 + 新間隔」作為下次到期時間"""
+    now = now or datetime.now()
+    db = SessionLocal()
+    try:
+        rows = db.execute(text(_SIGNALS_SQL), {
+            "since": now - timedelta(days=SCHEDULER_LOOKBACK_DAYS)
+        }).fetchall()
+        if not rows:
+            return 0
+
+        values = []
+        for r in rows:
+            score = compute_score(r.changes, r.favorites, r.alerts)
+            interval = compute_interval(score)
+            values.append({
+                "product_id": r.id,
+                "interval_minutes": interval,
+                "score": round(score, 3),
+                # 💡 從未派發過的新商品立即到期
+                "next_due_at": r.last_dispatched_at + timedelta(minutes=interval) if r.last_dispatched_at else now,
+                "updated_at": now,
+            })
+
+        # 💡 分段 Upsert，避免商品數很多時單一語句的參數過多
+        for start in range(0, len(values), 1000):
+            stmt = insert(ProductSchedule).values(values[start:start + 1000])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['product_id'],
+                set_={
+                    'interval_minutes': stmt.excluded.interval_minutes,
+                    'score': stmt.excluded.score,
+                    'next_due_at': stmt.excluded.next_due_at,
+                    'updated_at': stmt.excluded.updated_at,
+                }
+            )
+            db.execute(stmt)
+        db.commit()
+        logger.info(f"🧮 已重算 {len(values)} 個商品的爬取間隔")
+        return len(values)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def claim_due_products(limit=SCHEDULER_MAX_DUE_PER_TICK, now=None):
+    """
+    領取到期商品並推進其下次到期時間，回傳 {平台名稱: [products.id, ...]}。
+    尚未排入 product_schedule 的新商品會先以基本間隔加入並立即到期。
+    """
+    now = now or datetime.now()
+    db = SessionLocal()
+    try:
+        # 💡 反連接只挑出尚未排程的商品，已排程的商品不會每個 tick 都嘗試插入一次；
+        #    ON CONFLICT 只處理與其他 tick 同時插入的競態
+        db.execute(text("""
+            INSERT INTO product_schedule (product_id, interval_minutes, score, next_due_at, updated_at)
+            SELECT p.id, :base, 0, :now, :now FROM products p
+            WHERE NOT EXISTS (SELECT 1 FROM product_schedule s WHERE s.product_id = p.id)
+            ON CONFLICT (product_id) DO NOTHING
+        """), {"base": SCHEDULER_BASE_INTERVAL_MINUTES, "now": now})
+
+        ids = [r.product_id for r in db.execute(text(_CLAIM_DUE_SQL), {"now": now, "limit": limit})]
+        due = {}
+        if ids:
+            rows = db.execute(text("""
+                SELECT p.id, pl.name AS platform
+                FROM products p JOIN platforms pl ON pl.id = p.platform_id
+                WHERE p.id = ANY(:ids)
+                ORDER BY p.id
+            """), {"ids": ids}).fetchall()
+            for r in rows:
+                due.setdefault(r.platform, []).append(r.id)
+        db.commit()
+        return due
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
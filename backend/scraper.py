@@ -7,14 +7,16 @@ import logging
 import os
 import sys
 from logging.handlers import RotatingFileHandler
-from datetime import datetime
 from sqlalchemy import text
-from sqlalchemy.dialects.postgresql import insert
 
 # 💡 確保引入與你的專案目錄結構一致
 from database import SessionLocal
-from models import Product, Platform, Price, PriceHistory
+from price_writer import PriceBatchWriter
 from bs4 import BeautifulSoup
+from momo_extract import MomoPriceExtractor
+from validator_store import NOT_MODIFIED, ValidatorStore
+from circuit_breaker import CircuitOpenError, get_breaker
+from task_progress import ShardProgress
 
 # --- 1. 日誌配置 (架構師強化版) ---
 def setup_logging():
@@ -65,10 +67,21 @@ def setup_logging():
 # 全域初始化 Logger
 logger = setup_logging()
 
+# 💡 爬蟲引擎模式：sync (預設，逐筆) / async (併發，見 async_engine.py)
+SCRAPER_ENGINE = os.getenv("SCRAPER_ENGINE", "sync")
+
+# 💡 Momo 商品頁串流讀取的區塊大小 (字元數)；價格 meta 通常落在前幾個區塊內
+MOMO_CHUNK_SIZE = int(os.getenv("MOMO_CHUNK_SIZE", "16384"))
+
+# 💡 PChome 價格 API 一次查詢的商品數 (id=A,B,C...)；設為 1 即回到逐筆查詢
+PCHOME_BATCH_SIZE = int(os.getenv("PCHOME_BATCH_SIZE", "20"))
+
 # --- 2. 價格爬蟲引擎 ---
 class PriceScraper:
     def __init__(self):
         self.session = requests.Session()
+        # 💡 各 URL 的 ETag / Last-Modified / 內容雜湊，用於條件式請求
+        self.validators = ValidatorStore()
         self.user_agents = [
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
             "Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Mobile/15E148 Safari/604.1",
@@ -107,6 +120,63 @@ class PriceScraper:
             headers["Referer"] = "https://24h.pchome.com.tw/"
         return headers
 
+    def _request(self, platform, url, **kwargs):
+        """
+        所有同步請求的共同出口：先經過該平台的斷路器 (斷路時等待或拋出 CircuitOpenError)，
+        依 AIMD 速率控制請求間隔，再把狀態碼與耗時回報給斷路器。
+        """
+        breaker = get_breaker(platform)
+        breaker.before_request()
+        started = time.monotonic()
+        try:
+            res = self.session.get(url, **kwargs)
+        except requests.RequestException:
+            breaker.record(None, time.monotonic() - started)
+            raise
+        breaker.record(res.status_code, time.monotonic() - started)
+        return res
+
+    def conditional_headers(self, platform, validator_key):
+        """一般標頭 + 上次回應的 If-None-Match / If-Modified-Since"""
+        return {**self.get_headers(platform), **self.validators.conditional_headers(validator_key)}
+
+    def momo_validator_key(self, i_code):
+        return f"momo:{i_code}"
+
+    def pchome_validator_key(self, prod_id):
+        # 💡 API URL 帶有時間戳 (_=ts)，因此以商品 ID 作為驗證鍵而非 URL
+        return f"pchome:api:{prod_id}"
+
+    def validator_key(self, platform, product_id_on_platform):
+        if "momo" in platform.lower():
+            return self.momo_validator_key(product_id_on_platform)
+        return self.pchome_validator_key(str(product_id_on_platform).strip())
+
+    def pending_validator(self, platform, product_id_on_platform):
+        """取出抓取時暫存的驗證紀錄，隨價格交給 PriceBatchWriter 於 Commit 後寫入"""
+        return self.validators.take_pending(self.validator_key(platform, product_id_on_platform))
+
+    def handle_pchome_api_response(self, prod_id, status_code, headers, body):
+        """PChome API 回應的條件式處理：304 或內容雜湊未變時不解析，回傳 NOT_MODIFIED"""
+        if status_code == 304:
+            return NOT_MODIFIED
+        if status_code != 200:
+            return None
+        changed = self.validators.record(self.pchome_validator_key(prod_id), headers, ValidatorStore.digest(body))
+        if not changed:
+            return NOT_MODIFIED
+        return self.parse_pchome_api(body)
+
+    def remember_momo_price(self, i_code, headers, price):
+        """
+        Momo 為串流擷取 (不讀完整頁)，因此以擷取到的價格作為內容雜湊；
+        價格未變時回傳 NOT_MODIFIED，讓呼叫端略過資料庫寫入。
+        """
+        if not price:
+            return price
+        changed = self.validators.record(self.momo_validator_key(i_code), headers, ValidatorStore.digest(price))
+        return price if changed else NOT_MODIFIED
+
     # --- PChome 強化邏輯 ---
     def scrape_pchome(self, prod_id: str):
         clean_id = str(prod_id).strip()
@@ -119,132 +189,327 @@ class PriceScraper:
         # 2. API 失敗後使用網頁解析保底
         return self._scrape_pchome_frontend(clean_id)
 
+    def pchome_api_url(self, prod_id):
+        ts = int(time.time() * 1000)
+        return f"https://ecapi.pchome.com.tw/ecshop/prodapi/v2/prod?id={prod_id}&fields=Price&_callback=jsonp_price&_={ts}"
+
+    def pchome_frontend_url(self, prod_id):
+        return f"https://24h.pchome.com.tw/prod/{prod_id}"
+
+    def _jsonp_payload(self, body):
+        """
+        取出 JSONP 包裹內的 JSON 物件。
+        💡 以 raw_decode 從 callback 括號後的第一個 { 解析到物件結尾即停止，
+           不受外層 try{...}catch 等包裝影響
+        """
+        start = body.find("{", body.find("(") + 1)
+        if start < 0:
+            return None
+        return json.JSONDecoder().raw_decode(body, start)[0]
+
+    def parse_pchome_api(self, body):
+        """解析 PChome JSONP 回應，取出第一個帶 Price 的商品售價"""
+        data = self._jsonp_payload(body)
+        if data:
+            # 動態取 Key (PChome API 回傳結構通常以商品 ID 為 Key)
+            for key in data.keys():
+                if isinstance(data[key], dict) and "Price" in data[key]:
+                    return self.clean_price(data[key]["Price"].get("P", 0))
+        return None
+
+    def handle_pchome_batch_response(self, prod_ids, status_code, body):
+        """
+        解析一次查詢多個商品的 API 回應，回傳 {prod_id: 價格 或 NOT_MODIFIED}。
+        回應鍵可能帶規格尾碼 (例如 DYAJ2X-A900GQ8QI-000)，需對應回請求的商品 ID；
+        回應中找不到或價格無效的商品不會出現在結果中，交由呼叫端改用網頁解析。
+        """
+        if status_code != 200:
+            return {}
+        wanted = set(prod_ids)
+        results = {}
+        for key, value in (self._jsonp_payload(body) or {}).items():
+            if not isinstance(value, dict) or "Price" not in value:
+                continue
+            prod_id = key if key in wanted else key.rsplit("-", 1)[0]
+            if prod_id not in wanted or prod_id in results:
+                continue
+            price = self.clean_price(value["Price"].get("P", 0))
+            if price <= 0:
+                continue
+            # 💡 批次回應無法逐商品使用 ETag，改以各商品自己的 Price 區塊作為內容雜湊
+            digest = ValidatorStore.digest(json.dumps(value["Price"], sort_keys=True))
+            changed = self.validators.record(self.pchome_validator_key(prod_id), {}, digest)
+            results[prod_id] = price if changed else NOT_MODIFIED
+        return results
+
+    def scrape_pchome_batch(self, prod_ids):
+        """
+        以單一 API 請求查詢多個商品，回傳 {prod_id: 價格 / NOT_MODIFIED / None}。
+        只有批次回應中缺少的商品才逐一改用網頁解析。
+        """
+        ids = [str(pid).strip() for pid in prod_ids]
+        results = {}
+        try:
+            res = self._request("PChome", self.pchome_api_url(",".join(ids)), headers=self.get_headers("PChome"), timeout=10)
+            results = self.handle_pchome_batch_response(ids, res.status_code, res.text)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ PChome 批次 API 失敗 ({len(ids)} 筆)，改用網頁解析: {e}")
+
+        for pid in ids:
+            if pid not in results:
+                results[pid] = self._scrape_pchome_frontend(pid)
+        return results
+
+    def parse_pchome_frontend(self, html):
+        # 策略：JSON-LD 解析 (SEO 標準結構)
+        price_match = re.search(r'"price":\s*"(\d+)"', html)
+        if price_match:
+            return float(price_match.group(1))
+        return None
+
     def _scrape_pchome_api(self, prod_id):
         try:
-            ts = int(time.time() * 1000)
-            api_url = f"https://ecapi.pchome.com.tw/ecshop/prodapi/v2/prod?id={prod_id}&fields=Price&_callback=jsonp_price&_={ts}"
-            res = self.session.get(api_url, headers=self.get_headers("PChome"), timeout=10)
-            match = re.search(r'\((.*)\)', res.text, re.DOTALL)
-            if match:
-                data = json.loads(match.group(1))
-                # 動態取 Key (PChome API 回傳結構通常以商品 ID 為 Key)
-                for key in data.keys():
-                    if isinstance(data[key], dict) and "Price" in data[key]:
-                        return self.clean_price(data[key]["Price"].get("P", 0))
-        except: pass
+            res = self._request(
+                "PChome", self.pchome_api_url(prod_id),
+                headers=self.conditional_headers("PChome", self.pchome_validator_key(prod_id)),
+                timeout=10
+            )
+            return self.handle_pchome_api_response(prod_id, res.status_code, res.headers, res.text)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ PChome API 失敗，改用網頁解析 ({prod_id}): {e}")
         return None
 
     def _scrape_pchome_frontend(self, prod_id):
         """Next.js 結構解析"""
-        url = f"https://24h.pchome.com.tw/prod/{prod_id}"
+        url = self.pchome_frontend_url(prod_id)
         try:
-            time.sleep(random.uniform(1, 2))
-            res = self.session.get(url, headers=self.get_headers("PChome"), timeout=15)
-            
-            # 策略：JSON-LD 解析 (SEO 標準結構)
-            price_match = re.search(r'"price":\s*"(\d+)"', res.text)
-            if price_match:
-                return float(price_match.group(1))
+            res = self._request("PChome", url, headers=self.get_headers("PChome"), timeout=15)
+            return self.parse_pchome_frontend(res.text)
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"❌ PChome 網頁解析出錯: {e}")
         return None
 
     # --- Momo 強化邏輯 ---
+    def momo_url(self, i_code):
+        return f"https://www.momoshop.com.tw/goods/GoodsDetail.jsp?i_code={i_code}"
+
+    def parse_momo_html(self, html):
+        """從 Momo 商品頁 HTML 中取出售價 (正規式快速擷取，失敗才建立 BeautifulSoup 樹)"""
+        extractor = MomoPriceExtractor()
+        extractor.feed(html)
+        return self.finish_momo_extract(extractor)
+
+    def parse_momo_stream(self, chunks):
+        """逐段讀取回應內容，找到價格即停止 (剩餘的 HTML 不再下載與解碼)"""
+        extractor = MomoPriceExtractor()
+        for chunk in chunks:
+            if extractor.feed(chunk):
+                break
+        return self.finish_momo_extract(extractor)
+
+    def finish_momo_extract(self, extractor):
+        price = extractor.finish()
+        if price is not None:
+            return self.clean_price(price)
+        # 💡 快速路徑沒找到 (頁面結構異動等)：退回完整 DOM 解析
+        return self._parse_momo_soup(extractor.text)
+
+    def _parse_momo_soup(self, html):
+        soup = BeautifulSoup(html, 'html.parser')
+        # 優先找 meta tag，最快且穩定
+        meta_price = soup.find("meta", property="product:price:amount")
+        if meta_price: 
+            return self.clean_price(meta_price.get("content"))
+        
+        # 備援：JSON-LD
+        json_ld = soup.find("script", type="application/ld+json")
+        if json_ld:
+            data = json.loads(json_ld.string)
+            offers = data.get('offers')
+            if isinstance(offers, list): return self.clean_price(offers[0].get('price'))
+            return self.clean_price(offers.get('price'))
+        return None
+
     def scrape_momo(self, i_code: str):
-        url = f"https://www.momoshop.com.tw/goods/GoodsDetail.jsp?i_code={i_code}"
+        url = self.momo_url(i_code)
         try:
-            time.sleep(random.uniform(2, 4))
-            res = self.session.get(url, headers=self.get_headers("Momo"), timeout=15)
-            if res.status_code != 200: return None
-
-            soup = BeautifulSoup(res.text, 'html.parser')
-            # 優先找 meta tag，最快且穩定
-            meta_price = soup.find("meta", property="product:price:amount")
-            if meta_price: 
-                return self.clean_price(meta_price.get("content"))
-            
-            # 備援：JSON-LD
-            json_ld = soup.find("script", type="application/ld+json")
-            if json_ld:
-                data = json.loads(json_ld.string)
-                offers = data.get('offers')
-                if isinstance(offers, list): return self.clean_price(offers[0].get('price'))
-                return self.clean_price(offers.get('price'))
+            # 💡 stream=True：邊下載邊擷取，價格一出現就關閉連線
+            headers = self.conditional_headers("Momo", self.momo_validator_key(i_code))
+            with self._request("Momo", url, headers=headers, timeout=15, stream=True) as res:
+                if res.status_code == 304: return NOT_MODIFIED
+                if res.status_code != 200: return None
+                res.encoding = res.encoding or "utf-8"
+                price = self.parse_momo_stream(
+                    res.iter_content(chunk_size=MOMO_CHUNK_SIZE, decode_unicode=True)
+                )
+                return self.remember_momo_price(i_code, res.headers, price)
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"❌ Momo 抓取失敗: {e}")
         return None
 
-    # --- 資料庫保存邏輯 ---
-    def _save_price_to_db(self, db, item, price_val):
+    # --- 核心啟動引擎 ---
+    def load_items(self, target_platform="Momo", min_id=None, max_id=None, product_ids=None):
         """
-        同步更新 Price 表 (Upsert) 與 PriceHistory 表
+        讀取待爬商品清單；min_id / max_id 用於分片任務只處理 products.id 的某個區間 (含兩端)，
+        product_ids 用於自適應排程只處理已到期的商品。
         """
-        try:
-            # 1. 更新當前價格
-            stmt = insert(Price).values(
-                product_id=item.id,
-                platform_id=item.platform_id,
-                price=price_val,
-                updated_at=datetime.now()
-            ).on_conflict_do_update(
-                index_elements=['product_id'],
-                set_={'price': price_val, 'updated_at': datetime.now()}
-            )
-            db.execute(stmt)
-
-            # 2. 寫入歷史紀錄
-            new_history = PriceHistory(
-                product_id=item.id,
-                platform_id=item.platform_id,
-                price=price_val,
-                recorded_at=datetime.now()
-            )
-            db.add(new_history)
-        except Exception as e:
-            logger.error(f"❌ DB 寫入錯誤: {e}")
-            raise
-
-    # --- 核心啟動引擎 ---
-    def automated_run(self, target_platform="Momo"):
-        logger.info(f"🚀 [TASK] 開始更新 {target_platform} 價格...")
         db = SessionLocal()
         try:
             # 使用 ILIKE 模糊匹配平台名稱
             query = text("""
-                SELECT p.id, p.name, p.product_id_on_platform, p.platform_id
+                SELECT p.id, p.name, p.product_id_on_platform, p.platform_id, p.model_id
                 FROM products p
                 JOIN platforms pl ON p.platform_id = pl.id
                 WHERE pl.name ILIKE :target
+                  AND (CAST(:min_id AS INTEGER) IS NULL OR p.id >= :min_id)
+                  AND (CAST(:max_id AS INTEGER) IS NULL OR p.id <= :max_id)
+                  AND (CAST(:ids AS INTEGER[]) IS NULL OR p.id = ANY(:ids))
+                ORDER BY p.id
             """)
-            items = db.execute(query, {"target": f"%{target_platform}%"}).fetchall()
-            
+            return db.execute(query, {
+                "target": f"%{target_platform}%", "min_id": min_id, "max_id": max_id,
+                "ids": list(product_ids) if product_ids is not None else None
+            }).fetchall()
+        finally:
+            # 💡 商品清單讀完即歸還連線，抓取期間不占用連線池；寫入交給 PriceBatchWriter 分批處理
+            db.close()
+
+    def automated_run(self, target_platform="Momo", engine=None, min_id=None, max_id=None, product_ids=None,
+                      run_id=None):
+        """
+        engine: "sync" (依序逐筆抓取，請求間隔由斷路器的 AIMD 速率控制) 或 "async" (併發抓取 + 主機級速率限制)，
+        未指定時讀取環境變數 SCRAPER_ENGINE。
+        run_id: 所屬排程任務的 ID；指定時逐筆回報進度，可由 GET /tasks/{run_id} 查詢。
+        回傳本次執行摘要，供 Celery 分片任務彙總。
+        """
+        engine = (engine or SCRAPER_ENGINE).lower()
+        scope = f"{len(product_ids)} 個到期商品" if product_ids is not None else f"id={min_id}~{max_id}"
+        logger.info(f"🚀 [TASK] 開始更新 {target_platform} 價格 (engine={engine}, {scope})...")
+        summary = {"platform": target_platform, "total": 0, "succeeded": 0, "failed": 0, "unchanged": 0}
+        progress = None
+
+        try:
+            items = self.load_items(target_platform, min_id, max_id, product_ids)
+            if run_id:
+                shard = f"{target_platform}:{product_ids[0]}+{len(product_ids)}" if product_ids else \
+                    f"{target_platform}:{min_id}-{max_id}"
+                progress = ShardProgress(run_id, shard, len(items))
             if not items:
                 logger.warning(f"🔎 找不到匹配 {target_platform} 的商品。")
-                return
+                return summary
+            summary["total"] = len(items)
 
             success_count = 0
-            for item in items:
-                if "momo" in target_platform.lower():
-                    price_val = self.scrape_momo(item.product_id_on_platform)
-                else:
-                    price_val = self.scrape_pchome(item.product_id_on_platform)
-
-                if price_val and price_val > 0:
-                    self._save_price_to_db(db, item, price_val)
-                    db.commit() 
-                    logger.info(f"✅ 更新: {item.name[:20]}... -> ${price_val}")
-                    success_count += 1
-                
-                # 動態延遲防止被封 IP
-                time.sleep(random.uniform(5, 10))
-
-            logger.info(f"🏁 任務完成: {success_count}/{len(items)} 成功")
+            unchanged_count = 0
+            with PriceBatchWriter(validators=self.validators) as writer:
+                def handle_result(item, price_val):
+                    nonlocal success_count, unchanged_count
+                    if price_val is NOT_MODIFIED:
+                        # 💡 304 / 內容未變：視為成功，但不解析也不寫入資料庫
+                        success_count += 1
+                        unchanged_count += 1
+                        if progress:
+                            progress.record(True, unchanged=True)
+                        return
+                    ok = bool(price_val and price_val > 0)
+                    if ok:
+                        writer.add(item.id, item.platform_id, price_val, model_id=item.model_id,
+                                   validator=self.pending_validator(target_platform, item.product_id_on_platform))
+                        logger.info(f"✅ 更新: {item.name[:20]}... -> ${price_val}")
+                        success_count += 1
+                    if progress:
+                        progress.record(ok)
+
+                try:
+                    if engine == "async":
+                        # 💡 延遲匯入，避免 async_engine 與 scraper 互相引用
+                        from async_engine import AsyncScrapeEngine
+                        AsyncScrapeEngine(self).run_sync(items, target_platform, handle_result)
+                    elif "momo" not in target_platform.lower() and PCHOME_BATCH_SIZE > 1:
+                        # 💡 PChome 批次模式：每 PCHOME_BATCH_SIZE 個商品只發一次 API 請求
+                        for start in range(0, len(items), PCHOME_BATCH_SIZE):
+                            chunk = items[start:start + PCHOME_BATCH_SIZE]
+                            prices = self.scrape_pchome_batch([item.product_id_on_platform for item in chunk])
+                            for item in chunk:
+                                handle_result(item, prices.get(str(item.product_id_on_platform).strip()))
+                    else:
+                        for item in items:
+                            if "momo" in target_platform.lower():
+                                price_val = self.scrape_momo(item.product_id_on_platform)
+                            else:
+                                price_val = self.scrape_pchome(item.product_id_on_platform)
+
+                            handle_result(item, price_val)
+                except CircuitOpenError as e:
+                    # 💡 平台持續限流：立即結束本次任務 (已抓到的結果仍會寫入)，剩餘商品留給下一輪
+                    logger.warning(f"🛑 {e}，提前結束本次任務")
+                    summary["circuit_open"] = True
+
+            summary["succeeded"] = success_count
+            summary["unchanged"] = unchanged_count
+            summary["failed"] = len(items) - success_count
+            summary["breaker"] = get_breaker(target_platform).snapshot()
+            logger.info(f"🏁 任務完成: {success_count}/{len(items)} 成功 (未變動 {unchanged_count})")
 
         except Exception as e:
-            db.rollback()
             logger.error(f"💥 任務執行崩潰: {e}")
+            summary["error"] = str(e)
+        finally:
+            if progress:
+                progress.flush(finished=True)
+        return summary
+
+    def refresh_product(self, product_id):
+        """
+        使用者觸發的單一商品即時更新：不等待批次排程，
+        以非同步引擎抓取 (只受主機速率閘門限制) 並立即寫入，回傳最新價格。
+        """
+        db = SessionLocal()
+        try:
+            row = db.execute(text("""
+                SELECT pl.name AS platform, pr.price AS current_price
+                FROM products p
+                JOIN platforms pl ON pl.id = p.platform_id
+                LEFT JOIN prices pr ON pr.product_id = p.id
+                WHERE p.id = :pid
+            """), {"pid": product_id}).fetchone()
         finally:
             db.close()
+        if row is None:
+            return {"status": "not_found", "product_id": product_id}
+
+        items = self.load_items(row.platform, product_ids=[product_id])
+        results = {}
+
+        # 💡 延遲匯入，避免 async_engine 與 scraper 互相引用
+        from async_engine import AsyncScrapeEngine
+        try:
+            AsyncScrapeEngine(self).run_sync(items, row.platform, lambda item, price: results.update({item.id: price}))
+        except CircuitOpenError as e:
+            return {"status": "failed", "product_id": product_id, "reason": str(e)}
+        price_val = results.get(product_id)
+
+        if price_val is NOT_MODIFIED:
+            # 304 / 內容未變：資料庫中的現價就是最新價格
+            current = float(row.current_price) if row.current_price is not None else None
+            return {"status": "success", "product_id": product_id, "price": current, "unchanged": True}
+        if not price_val or price_val <= 0:
+            return {"status": "failed", "product_id": product_id, "reason": "Price not found"}
+
+        item = items[0]
+        with PriceBatchWriter(batch_size=1, validators=self.validators) as writer:
+            writer.add(item.id, item.platform_id, price_val, model_id=item.model_id,
+                       validator=self.pending_validator(row.platform, item.product_id_on_platform))
+        logger.info(f"⚡ 即時更新: {item.name[:20]}... -> ${price_val}")
+        return {"status": "success", "product_id": product_id, "price": price_val, "unchanged": False}
 
 if __name__ == "__main__":
     scraper = PriceScraper()
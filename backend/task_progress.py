@@ -0,0 +1,132 @@
+import json
+import logging
+import os
+import time
+
+import redis
+
+from redis_client import get_async_redis, get_redis
+
+logger = logging.getLogger("PriceScraper")
+
+# 💡 進度資料保留時間；查詢已結束很久的任務時只剩 Celery 的結果
+TASK_PROGRESS_TTL_SECONDS = int(os.getenv("TASK_PROGRESS_TTL_SECONDS", "86400"))
+# 分片回報進度的最短間隔 (秒)，避免每個商品都寫一次 Redis
+TASK_PROGRESS_FLUSH_SECONDS = float(os.getenv("TASK_PROGRESS_FLUSH_SECONDS", "1"))
+# 💡 執行中的任務超過此秒數沒有任何進度更新即標記為 stalled
+TASK_PROGRESS_STALL_SECONDS = float(os.getenv("TASK_PROGRESS_STALL_SECONDS", "300"))
+
+RUNNING, FINISHED, FAILED = "running", "finished", "failed"
+
+
+# 💡 Redis 結構：
+#    HASH task:progress:<run_id>         整體資訊 (target / total / shards / status / started_at / finished_at)
+#    HASH task:progress:<run_id>:shards  field=分片鍵，value=該分片計數的 JSON
+#    各分片只覆寫自己的欄位，分片重試時不會重複累加
+def _meta_key(run_id):
+    return f"task:progress:{run_id}"
+
+
+def _shards_key(run_id):
+    return f"task:progress:{run_id}:shards"
+
+
+# --- 1. 協調者 (Worker，同步 Redis) ---
+def start_run(run_id, target, total, shards):
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hset(_meta_key(run_id), mapping={
+            "target": target, "total": total, "shards": shards,
+            "status": RUNNING, "started_at": time.time(),
+        })
+        pipe.expire(_meta_key(run_id), TASK_PROGRESS_TTL_SECONDS)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"⚠️ 任務進度初始化失敗: {e}")
+
+
+def finish_run(run_id, status=FINISHED, error=None):
+    """標記任務結束；status=FAILED 時一併記錄錯誤訊息 (分片重試耗盡導致 chord 失敗)"""
+    mapping = {"status": status, "finished_at": time.time()}
+    if error:
+        mapping["error"] = str(error)[:500]
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.hset(_meta_key(run_id), mapping=mapping)
+        # 💡 start_run 的紀錄已過期 (或任務在開始前就失敗) 時 hset 會建立新的 HASH，同樣需要 TTL
+        pipe.expire(_meta_key(run_id), TASK_PROGRESS_TTL_SECONDS)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"⚠️ 任務進度結束標記失敗: {e}")
+
+
+# --- 2. 分片 (PriceScraper.automated_run 內回報) ---
+class ShardProgress:
+    """單一分片的進度計數，每 TASK_PROGRESS_FLUSH_SECONDS 最多寫入 Redis 一次"""
+    def __init__(self, run_id, shard, total, client=None):
+        self.run_id = run_id
+        self.shard = shard
+        self.client = client
+        self.counts = {"total": total, "done": 0, "succeeded": 0, "failed": 0, "unchanged": 0}
+        self._flushed_at = 0.0
+        self.flush()
+
+    def record(self, succeeded, unchanged=False):
+        self.counts["done"] += 1
+        self.counts["succeeded" if succeeded else "failed"] += 1
+        if unchanged:
+            self.counts["unchanged"] += 1
+        if time.monotonic() - self._flushed_at >= TASK_PROGRESS_FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self, finished=False):
+        self._flushed_at = time.monotonic()
+        entry = {**self.counts, "finished": finished, "updated_at": time.time()}
+        try:
+            pipe = (self.client or get_redis()).pipeline(transaction=False)
+            pipe.hset(_shards_key(self.run_id), self.shard, json.dumps(entry))
+            pipe.expire(_shards_key(self.run_id), TASK_PROGRESS_TTL_SECONDS)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.debug(f"任務進度寫入失敗: {e}")
+
+
+# --- 3. 查詢 (API，非同步 Redis) ---
+async def read_progress(run_id):
+    """彙總所有分片的進度並估算速率與剩餘時間；沒有進度紀錄時回傳 None"""
+    client = get_async_redis()
+    meta = await client.hgetall(_meta_key(run_id))
+    if not meta:
+        return None
+    shards = [json.loads(v) for v in (await client.hgetall(_shards_key(run_id))).values()]
+
+    now = time.time()
+    # 💡 只有 finish_run 寫入過 (開始紀錄已過期或從未建立) 時沒有 started_at，耗時與速率視為未知
+    started_at = float(meta["started_at"]) if meta.get("started_at") else None
+    finished_at = float(meta["finished_at"]) if meta.get("finished_at") else None
+    total = int(meta.get("total", 0))
+    progress = {
+        "target": meta.get("target"),
+        "status": meta.get("status", RUNNING),
+        "error": meta.get("error"),
+        "total": total,
+        "shards": int(meta.get("shards", 0)),
+        "shards_done": sum(1 for s in shards if s["finished"]),
+        "started_at": started_at,
+        "finished_at": finished_at,
+        "updated_at": max([s["updated_at"] for s in shards], default=started_at or finished_at),
+    }
+    for key in ("done", "succeeded", "failed", "unchanged"):
+        progress[key] = sum(s[key] for s in shards)
+    # 💡 分片提前結束 (例如斷路) 時未處理的商品視為略過
+    progress["skipped"] = sum(s["total"] - s["done"] for s in shards if s["finished"])
+
+    elapsed = (finished_at or now) - started_at if started_at is not None else None
+    remaining = max(total - progress["done"] - progress["skipped"], 0)
+    rate = progress["done"] / elapsed if elapsed else 0.0
+    progress["percent"] = round(100 * (total - remaining) / total, 1) if total else 100.0
+    progress["rate_per_sec"] = round(rate, 2)
+    progress["eta_seconds"] = round(remaining / rate) if rate > 0 and progress["status"] == RUNNING else None
+    progress["stalled"] = (progress["status"] == RUNNING and progress["updated_at"] is not None
+                           and now - progress["updated_at"] > TASK_PROGRESS_STALL_SECONDS)
+    return progress
@@ -0,0 +1,37 @@
+import pytest
+
+
+class FakeRedis:
+    """只實作單元測試用到的 HASH 指令；pipeline() 直接回傳自己，指令立即執行"""
+    def __init__(self):
+        self.hashes = {}
+
+    def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def hmget(self, key, fields):
+        return [self.hget(key, f) for f in fields]
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        data = self.hashes.setdefault(key, {})
+        if field is not None:
+            data[field] = str(value)
+        for k, v in (mapping or {}).items():
+            data[k] = str(v)
+
+    def expire(self, key, seconds):
+        return True
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        return []
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from analytics import PERCENTILES, good_price_score, price_analytics, verdict
+
+
+@pytest.mark.parametrize("days_not_cheaper, days, expected", [
+    (0, 0, None),
+    (0, 10, 0.0),
+    (10, 10, 100.0),
+    (1, 3, 33.3),
+])
+def test_good_price_score(days_not_cheaper, days, expected):
+    assert good_price_score(days_not_cheaper, days) == expected
+
+
+@pytest.mark.parametrize("score, expected", [
+    (None, None), (100, "great"), (80, "great"), (79.9, "good"), (60, "good"),
+    (40, "fair"), (39.9, "high"), (0, "high"),
+])
+def test_verdict(score, expected):
+    assert verdict(score) == expected
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.params = None
+
+    async def execute(self, statement, params):
+        self.params = params
+        return FakeResult(self.rows)
+
+
+def row(**overrides):
+    values = dict(
+        model_id=1, model_name="iPhone 17", platform="Momo", current_price=27000.0,
+        lowest_ever=26000.0, highest_ever=30000.0, avg_7d=27500.123, avg_30d=28000.0,
+        bands=[26500.0, 27000.0, 27500.0, 28000.0, 29000.0], days=10, days_not_cheaper=8,
+    )
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def test_price_analytics_builds_rows():
+    db = FakeSession([row()])
+    today = datetime(2026, 10, 17, 15, 30)
+    [result] = asyncio.run(price_analytics(db, [1], today=today))
+
+    assert db.params["model_ids"] == [1]
+    assert db.params["since_7d"] == datetime(2026, 10, 11)
+    assert db.params["since_30d"] == datetime(2026, 9, 18)
+    assert db.params["percentiles"] == list(PERCENTILES)
+    assert result["drop_from_max_pct"] == 10.0
+    assert result["avg_7d"] == 27500.12
+    assert result["percentiles"] == {"p10": 26500.0, "p25": 27000.0, "p50": 27500.0, "p75": 28000.0, "p90": 29000.0}
+    assert result["good_price_score"] == 80.0
+    assert result["verdict"] == "great"
+
+
+def test_price_analytics_without_current_price():
+    db = FakeSession([row(current_price=None, avg_7d=None, bands=None)])
+    [result] = asyncio.run(price_analytics(db))
+
+    assert db.params["model_ids"] is None
+    assert result["good_price_score"] is None and result["verdict"] is None
+    assert result["drop_from_max_pct"] is None
+    assert result["avg_7d"] is None
+    assert result["percentiles"] == {}
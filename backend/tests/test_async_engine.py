@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+from async_engine import gather_or_cancel
+
+
+def test_returns_results_in_order():
+    async def value(v, delay):
+        await asyncio.sleep(delay)
+        return v
+
+    assert asyncio.run(gather_or_cancel([value(1, 0.02), value(2, 0)])) == [1, 2]
+
+
+def test_failure_cancels_remaining():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def fail():
+        await asyncio.sleep(0)
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(gather_or_cancel([slow(), slow(), fail()]))
+    assert cancelled == [True, True]
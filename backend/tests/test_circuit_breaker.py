@@ -0,0 +1,137 @@
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitOpenError, HostBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    monkeypatch.setattr(circuit_breaker, "BREAKER_CONSECUTIVE_FAILURES", 5)
+    monkeypatch.setattr(circuit_breaker, "BREAKER_COOLDOWN_SECONDS", 60)
+    monkeypatch.setattr(circuit_breaker, "BREAKER_MAX_COOLDOWN_SECONDS", 1800)
+    monkeypatch.setattr(circuit_breaker, "BREAKER_MAX_PAUSE_SECONDS", 300)
+    monkeypatch.setattr(circuit_breaker, "BREAKER_SLOW_SECONDS", 8)
+    return clock
+
+
+@pytest.fixture
+def breaker(clock, fake_redis):
+    # 💡 視窗放大，讓測試只觸發「連續失敗」這條斷路條件
+    b = HostBreaker("momo", rate=1.0, min_rate=0.1, max_rate=2.0, client=fake_redis)
+    b.window = circuit_breaker.deque(maxlen=100)
+    return b
+
+
+def trip(breaker):
+    for _ in range(circuit_breaker.BREAKER_CONSECUTIVE_FAILURES):
+        breaker.record(429, 0.1)
+
+
+@pytest.mark.parametrize("status", [None, 403, 429, 500, 503])
+def test_throttle_statuses(status):
+    assert circuit_breaker._is_throttled(status)
+
+
+@pytest.mark.parametrize("status", [200, 304, 404])
+def test_non_throttle_statuses(status):
+    assert not circuit_breaker._is_throttled(status)
+
+
+def test_additive_increase_up_to_max(breaker):
+    breaker.record(200, 0.1)
+    assert breaker.rate == pytest.approx(1.05)
+    for _ in range(100):
+        breaker.record(200, 0.1)
+    assert breaker.rate == 2.0
+
+
+def test_multiplicative_decrease(breaker):
+    breaker.record(429, 0.1)
+    assert breaker.rate == 0.5
+    breaker.record(200, 9.0)
+    assert breaker.rate == pytest.approx(0.4)
+    assert breaker.consecutive_failures == 0
+    for _ in range(3):
+        breaker.record(503, 0.1)
+    assert breaker.rate == 0.1
+    assert breaker.state == CLOSED
+
+
+def test_consecutive_failures_open_the_circuit(breaker, fake_redis):
+    trip(breaker)
+    assert breaker.state == OPEN
+    assert breaker.wait_time() == pytest.approx(60)
+    assert fake_redis.hgetall("breaker:momo")["state"] == OPEN
+
+
+def test_half_open_allows_a_single_probe(breaker, clock):
+    trip(breaker)
+    clock.sleep(60)
+    assert breaker.wait_time() == 0
+    assert breaker.state == HALF_OPEN
+    assert breaker.wait_time() == 1.0
+
+    breaker.record(200, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.open_count == 0
+    assert breaker.wait_time() == 0
+
+
+def test_failed_probe_doubles_cooldown(breaker, clock):
+    trip(breaker)
+    clock.sleep(60)
+    breaker.wait_time()
+    breaker.record(None, None)
+    assert breaker.state == OPEN
+    assert breaker.open_count == 2
+    assert breaker.wait_time() == pytest.approx(120)
+
+
+def test_cooldown_is_capped(breaker, monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "BREAKER_MAX_COOLDOWN_SECONDS", 100)
+    breaker.open_count = 5
+    breaker._open()
+    assert breaker.wait_time() == pytest.approx(100)
+
+
+def test_long_pause_raises_circuit_open(breaker):
+    breaker.open_count = 3  # 下一次暫停 480 秒，超過 BREAKER_MAX_PAUSE_SECONDS
+    breaker._open()
+    with pytest.raises(CircuitOpenError) as exc:
+        breaker.before_request()
+    assert exc.value.platform == "momo"
+    assert exc.value.retry_after == pytest.approx(480)
+
+
+def test_short_pause_is_waited_out(breaker, clock):
+    trip(breaker)
+    start = clock.now
+    breaker.before_request()
+    assert clock.now - start >= 60
+    assert breaker.state == HALF_OPEN
+
+
+def test_remote_open_state_is_adopted(breaker, clock, fake_redis):
+    fake_redis.hset("breaker:momo", mapping={
+        "state": OPEN, "opened_until": clock.now + 30, "open_count": 2, "rate": 0.2,
+    })
+    assert breaker.wait_time() == pytest.approx(30)
+    assert breaker.state == OPEN
+    assert breaker.open_count == 2
+    assert breaker.rate == 0.2
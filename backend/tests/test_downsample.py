@@ -0,0 +1,33 @@
+import pytest
+
+from downsample import lttb
+
+
+def test_short_series_is_returned_unchanged():
+    points = [(i, i) for i in range(5)]
+    assert lttb(points, 10) == points
+    assert lttb(points, 2) == points
+    assert lttb(points, 5) == points
+
+
+def test_keeps_endpoints_and_order():
+    points = [(i, (i * 7) % 13) for i in range(100)]
+    sampled = lttb(points, 10)
+    assert len(sampled) == 10
+    assert sampled[0] == points[0] and sampled[-1] == points[-1]
+    assert [p[0] for p in sampled] == sorted(p[0] for p in sampled)
+    assert all(p in points for p in sampled)
+
+
+@pytest.mark.parametrize("spike", [(50, 1000), (50, -1000)])
+def test_keeps_peaks_and_troughs(spike):
+    points = [(i, 0) for i in range(100)]
+    points[spike[0]] = spike
+    assert spike in lttb(points, 5)
+
+
+def test_custom_accessors():
+    points = [{"t": i, "price": 100 - (i == 30) * 50} for i in range(60)]
+    sampled = lttb(points, 6, x=lambda p: p["t"], y=lambda p: p["price"])
+    assert len(sampled) == 6
+    assert {"t": 30, "price": 50} in sampled
@@ -0,0 +1,25 @@
+from types import SimpleNamespace
+
+from main import keyset_page
+
+
+def rows(*ids):
+    return [SimpleNamespace(id=i) for i in ids]
+
+
+def test_extra_row_means_next_page():
+    page, cursor = keyset_page(rows(50, 40, 30), 2)
+    assert [r.id for r in page] == [50, 40]
+    assert cursor == 40
+
+
+def test_last_page_has_no_cursor():
+    page, cursor = keyset_page(rows(50, 40), 2)
+    assert [r.id for r in page] == [50, 40]
+    assert cursor is None
+    assert keyset_page([], 2) == ([], None)
+
+
+def test_custom_key():
+    page, cursor = keyset_page([{"pk": 3}, {"pk": 2}], 1, key=lambda r: r["pk"])
+    assert page == [{"pk": 3}] and cursor == 3
@@ -0,0 +1,92 @@
+"""
+Momo 價格擷取：正規式快速路徑 (MomoPriceExtractor) 必須與 BeautifulSoup 解析 (_parse_momo_soup) 結果一致。
+
+樣本 (tests/fixtures/momo) 依 Momo 商品頁 (GoodsDetail.jsp) 精簡，只保留解析器會讀到的標籤：
+- goods_meta_price.html：<head> 內的 product:price:amount meta (含千分位) 與 JSON-LD
+- goods_jsonld_only.html：沒有 meta，JSON-LD 位於 <body>，offers 為陣列、價格為數字
+- goods_attr_order.html：大寫標籤、單引號、content 在 property 之前、價格帶 NT$
+- goods_no_price.html：已售完頁面，沒有任何價格標籤
+新增樣本時存下實際頁面、刪除與價格無關的大段內容，並在 EXPECTED 加上預期價格。
+"""
+from pathlib import Path
+
+import pytest
+
+from momo_extract import MomoPriceExtractor, extract_momo_price
+from scraper import PriceScraper
+
+FIXTURES = Path(__file__).parent / "fixtures" / "momo"
+
+EXPECTED = {
+    "goods_meta_price.html": 38900.0,
+    "goods_jsonld_only.html": 29400.0,
+    "goods_attr_order.html": 35900.0,
+    "goods_no_price.html": None,
+}
+
+
+def load(name):
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.fixture(scope="module")
+def scraper():
+    return PriceScraper()
+
+
+def test_every_fixture_has_an_expectation():
+    assert sorted(p.name for p in FIXTURES.glob("*.html")) == sorted(EXPECTED)
+
+
+@pytest.mark.parametrize("name", sorted(EXPECTED))
+def test_regex_matches_bs4(scraper, name):
+    html = load(name)
+    soup_price = scraper._parse_momo_soup(html) or None
+    fast = extract_momo_price(html)
+    fast_price = scraper.clean_price(fast) if fast is not None else None
+
+    assert soup_price == EXPECTED[name]
+    assert fast_price == soup_price
+
+
+@pytest.mark.parametrize("name", sorted(EXPECTED))
+@pytest.mark.parametrize("size", [7, 64, 4096])
+def test_stream_matches_whole_page(scraper, name, size):
+    # 💡 小區塊會把標籤切在兩個 chunk 之間，驗證回頭重掃 (_OVERLAP) 的邏輯
+    html = load(name)
+    assert (scraper.parse_momo_stream(chunked(html, size)) or None) == EXPECTED[name]
+    assert (scraper.parse_momo_html(html) or None) == EXPECTED[name]
+
+
+def test_meta_price_stops_before_body():
+    html = load("goods_meta_price.html")
+    extractor = MomoPriceExtractor()
+    consumed = 0
+    for chunk in chunked(html, 64):
+        consumed += len(chunk)
+        if extractor.feed(chunk):
+            break
+    assert extractor.finish() == "38,900"
+    assert consumed < html.index("<body>")
+
+
+def test_json_ld_waits_for_head_close():
+    # meta 可能排在 JSON-LD 之後：讀過 </head> 之前不能先採用 JSON-LD 的價格
+    html = ('<html><head><script type="application/ld+json">{"offers": {"price": "100"}}</script>'
+            '<meta property="product:price:amount" content="90"></head><body></body></html>')
+    extractor = MomoPriceExtractor()
+    assert extractor.feed(html[:html.index("<meta")]) is False
+    assert extractor.feed(html[html.index("<meta"):]) is True
+    assert extractor.finish() == "90"
+
+
+def test_json_ld_graph_and_invalid_json():
+    extractor = MomoPriceExtractor()
+    extractor.feed('<script type="application/ld+json">{not json}</script>'
+                   '<script type="application/ld+json">{"@graph": [{"@type": "WebPage"},'
+                   ' {"@type": "Product", "offers": [{"price": 1234}]}]}</script>')
+    assert extractor.finish() == 1234
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import price_cache
+import price_writer
+from price_cache import LastPriceCache
+from price_writer import PriceBatchWriter
+
+NOW = datetime(2026, 10, 17, 12, 0)
+
+
+@pytest.fixture
+def cache(fake_redis, monkeypatch):
+    monkeypatch.setattr(price_cache, "_local_cache", {})
+    return LastPriceCache(client=fake_redis)
+
+
+@pytest.fixture
+def writer(cache, monkeypatch):
+    monkeypatch.setattr(price_writer, "HISTORY_HEARTBEAT_HOURS", 24)
+    return PriceBatchWriter(change_only=True, price_cache=cache, validators=object())
+
+
+def row(product_id, price, recorded_at=NOW):
+    return {"product_id": product_id, "platform_id": 1, "price": price, "recorded_at": recorded_at,
+            "model_id": 1, "validator": None}
+
+
+def test_cache_miss_is_written(writer):
+    rows = [row(1, 100), row(2, "200.004")]
+    selected, updates = writer._select_history_rows(rows)
+    assert selected == rows
+    assert updates == {1: (100.0, NOW.timestamp()), 2: (200.0, NOW.timestamp())}
+
+
+def test_unchanged_price_is_skipped_until_heartbeat(writer, cache):
+    cache.set_many({1: (100.0, NOW.timestamp())})
+
+    selected, updates = writer._select_history_rows([row(1, "100.00", NOW + timedelta(hours=23))])
+    assert selected == [] and updates == {}
+
+    beat = row(1, 100, NOW + timedelta(hours=24))
+    selected, updates = writer._select_history_rows([beat])
+    assert selected == [beat]
+    assert updates == {1: (100.0, beat["recorded_at"].timestamp())}
+
+
+def test_changed_price_is_written(writer, cache):
+    cache.set_many({1: (100.0, NOW.timestamp())})
+    changed = row(1, 99, NOW + timedelta(minutes=5))
+    assert writer._select_history_rows([changed])[0] == [changed]
+
+
+def test_duplicates_within_batch_compare_against_previous_row(writer):
+    first, same, changed = row(1, 100), row(1, 100, NOW + timedelta(minutes=1)), row(1, 90, NOW + timedelta(minutes=2))
+    selected, updates = writer._select_history_rows([first, same, changed])
+    assert selected == [first, changed]
+    assert updates == {1: (90.0, changed["recorded_at"].timestamp())}
+
+
+def test_change_only_disabled_writes_everything(cache):
+    writer = PriceBatchWriter(change_only=False, price_cache=cache, validators=object())
+    cache.set_many({1: (100.0, NOW.timestamp())})
+    rows = [row(1, 100), row(1, 100)]
+    assert writer._select_history_rows(rows) == (rows, {})
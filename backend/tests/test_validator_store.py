@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+import validator_store
+from validator_store import ValidatorStore
+
+HEADERS = {"ETag": '"abc"', "Last-Modified": "Fri, 16 Oct 2026 08:00:00 GMT"}
+
+
+@pytest.fixture(autouse=True)
+def enabled(monkeypatch):
+    monkeypatch.setattr(validator_store, "HTTP_VALIDATORS_ENABLED", True)
+    monkeypatch.setattr(validator_store, "_local_validators", {})
+
+
+@pytest.fixture
+def store(fake_redis):
+    return ValidatorStore(client=fake_redis, max_age_hours=24)
+
+
+def test_new_content_stays_pending_until_saved(store, fake_redis):
+    assert store.record("momo:1", HEADERS, "h1") is True
+    assert store.get("momo:1") is None
+    assert fake_redis.hget(ValidatorStore.KEY, "momo:1") is None
+
+    pending = store.take_pending("momo:1")
+    assert pending["momo:1"]["hash"] == "h1"
+    assert store.take_pending("momo:1") == {}
+
+    store.save(pending)
+    assert store.conditional_headers("momo:1") == {
+        "If-None-Match": '"abc"', "If-Modified-Since": "Fri, 16 Oct 2026 08:00:00 GMT",
+    }
+
+
+def test_unchanged_content_is_saved_immediately_keeping_ts(store, monkeypatch):
+    monkeypatch.setattr(validator_store.time, "time", lambda: 1000.0)
+    store.record("momo:1", HEADERS, "h1")
+    store.save(store.take_pending("momo:1"))
+
+    monkeypatch.setattr(validator_store.time, "time", lambda: 2000.0)
+    assert store.record("momo:1", {"ETag": '"def"'}, "h1") is False
+    assert store.pending == {}
+    entry = store.get("momo:1")
+    assert entry["etag"] == '"def"' and entry["ts"] == 1000.0
+
+
+def test_changed_hash_is_reported(store):
+    store.save({"momo:1": {"etag": None, "lm": None, "hash": "h1", "ts": validator_store.time.time()}})
+    assert store.record("momo:1", {}, "h2") is True
+    assert store.get("momo:1")["hash"] == "h1"
+
+
+def test_entries_expire_after_max_age(store, fake_redis, monkeypatch):
+    fake_redis.hset(ValidatorStore.KEY, mapping={
+        "momo:1": json.dumps({"etag": '"abc"', "lm": None, "hash": "h1", "ts": 0}),
+    })
+    monkeypatch.setattr(validator_store.time, "time", lambda: 24 * 3600 - 1)
+    assert store.conditional_headers("momo:1") == {"If-None-Match": '"abc"'}
+
+    monkeypatch.setattr(validator_store.time, "time", lambda: 24 * 3600)
+    assert store.conditional_headers("momo:1") == {}
+    assert store.record("momo:1", HEADERS, "h1") is True
+
+
+def test_disabled_store_always_reports_changes(store, monkeypatch):
+    monkeypatch.setattr(validator_store, "HTTP_VALIDATORS_ENABLED", False)
+    assert store.record("momo:1", HEADERS, "h1") is True
+    assert store.pending == {}
+    assert store.conditional_headers("momo:1") == {}
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+import redis
+
+from redis_client import get_redis
+
+logger = logging.getLogger("PriceScraper")
+
+HTTP_VALIDATORS_ENABLED = os.getenv("HTTP_VALIDATORS_ENABLED", "true").lower() in ("1", "true", "yes")
+# 💡 內容連續未變多久後強制重新抓取並寫入一次 (預設與 price_history 心跳間隔相同)
+HTTP_VALIDATOR_MAX_AGE_HOURS = float(
+    os.getenv("HTTP_VALIDATOR_MAX_AGE_HOURS", os.getenv("HISTORY_HEARTBEAT_HOURS", "24"))
+)
+
+# 💡 抓取結果哨兵值：伺服器回 304 或內容雜湊未變，呼叫端應略過解析與資料庫寫入
+class _NotModified:
+    def __repr__(self):
+        return "NOT_MODIFIED"
+
+
+NOT_MODIFIED = _NotModified()
+
+# Redis 不可用時的行程內備援
+_local_validators = {}
+
+
+class ValidatorStore:
+    """
+    各 URL 的 HTTP 驗證資訊 (ETag / Last-Modified / 內容雜湊)，用於條件式請求。
+
+    Redis 結構：HASH http:validators  field=抓取鍵 (例如 momo:12345)
+                value={"etag", "lm", "hash", "ts"} 的 JSON，ts = 內容最後一次變動的 epoch 秒
+    """
+    KEY = "http:validators"
+
+    def __init__(self, client=None, max_age_hours: float = None):
+        self.client = client
+        self.max_age = (HTTP_VALIDATOR_MAX_AGE_HOURS if max_age_hours is None else max_age_hours) * 3600
+        # 💡 內容有變動的紀錄先暫存於此，等新價格 Commit 後才正式寫入 (見 record / take_pending)
+        self.pending = {}
+
+    def _redis(self):
+        return self.client or get_redis()
+
+    @staticmethod
+    def digest(text):
+        return hashlib.sha1(str(text).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        if not HTTP_VALIDATORS_ENABLED:
+            return None
+        try:
+            raw = self._redis().hget(self.KEY, key)
+            entry = json.loads(raw) if raw else None
+        except redis.RedisError as e:
+            logger.warning(f"⚠️ 讀取 HTTP 驗證快取失敗，改用本地快取: {e}")
+            entry = _local_validators.get(key)
+        # 💡 過期的紀錄視為不存在：下一次抓取會完整下載並寫入 (兼作心跳)
+        if entry and time.time() - entry.get("ts", 0) >= self.max_age:
+            return None
+        return entry
+
+    def conditional_headers(self, key):
+        """回傳要附加在請求上的 If-None-Match / If-Modified-Since"""
+        entry = self.get(key) or {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("lm"):
+            headers["If-Modified-Since"] = entry["lm"]
+        return headers
+
+    def record(self, key, response_headers, content_hash):
+        """
+        記錄一次 200 回應的驗證資訊，回傳內容是否有變動。
+        - 內容未變：立即寫入 (保留原本的 ts，讓 max_age 到期後仍會強制寫入一次)
+        - 內容有變：只放進 pending，由呼叫端以 take_pending 交給 PriceBatchWriter，
+          Commit 成功後才 save；寫入失敗或沒取得有效價格時，下次抓取不會被誤判為未變動
+        """
+        if not HTTP_VALIDATORS_ENABLED:
+            return True
+        previous = self.get(key)
+        changed = previous is None or previous.get("hash") != content_hash
+        entry = {
+            "etag": response_headers.get("ETag"),
+            "lm": response_headers.get("Last-Modified"),
+            "hash": content_hash,
+            "ts": time.time() if changed else previous["ts"],
+        }
+        if changed:
+            self.pending[key] = entry
+        else:
+            self.save({key: entry})
+        return changed
+
+    def take_pending(self, key):
+        """取出 key 尚未寫入的紀錄，回傳 {key: entry} (沒有時為空 dict)"""
+        entry = self.pending.pop(key, None)
+        return {key: entry} if entry else {}
+
+    def save(self, entries):
+        """一次寫入多筆紀錄 (PriceBatchWriter 於 Commit 後呼叫)"""
+        if not HTTP_VALIDATORS_ENABLED or not entries:
+            return
+        _local_validators.update(entries)
+        try:
+            self._redis().hset(self.KEY, mapping={k: json.dumps(v) for k, v in entries.items()})
+        except redis.RedisError as e:
+            logger.warning(f"⚠️ 更新 HTTP 驗證快取失敗 (僅保留本地快取): {e}")
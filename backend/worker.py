@@ -1,9 +1,16 @@
 import os
 import logging
-from celery import Celery
+from celery import Celery, chord, group
 from celery.schedules import crontab  # 💡 必須引入以支持 Cron 定時格式
+from kombu import Queue
+from sqlalchemy import text
 # 💡 確保引入 scraper 中的類別與日誌配置
 from scraper import PriceScraper, setup_logging 
+from database import SessionLocal
+from discovery import run_discovery
+from partitions import run_maintenance
+from scheduler import claim_due_products, recompute_schedule
+from task_progress import FAILED, finish_run, start_run
 
 # 1. 確保初始化日誌配置，這樣 Celery 執行時的日誌才會同步寫入檔案與控制台
 logger = setup_logging()
@@ -11,6 +18,49 @@ logger = setup_logging()
 # --- 1. Celery 基礎配置 ---
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 
+# 💡 每個分片任務處理的商品數；分片越小越能平均分散到多個 Worker
+SCRAPE_SHARD_SIZE = int(os.getenv("SCRAPE_SHARD_SIZE", "200"))
+SCRAPE_PLATFORMS = ["Momo", "PChome"]
+
+# 💡 排程模式：adaptive (預設，依波動/關注度只派發到期商品) / fixed (每 2 小時全量爬取)
+SCRAPE_SCHEDULER = os.getenv("SCRAPE_SCHEDULER", "adaptive").lower()
+SCHEDULER_TICK_SECONDS = float(os.getenv("SCHEDULER_TICK_SECONDS", "300"))
+
+if SCRAPE_SCHEDULER == "fixed":
+    BEAT_SCHEDULE = {
+        # 名稱：全平台價格定時更新
+        'auto-scrape-every-6-hours': {
+            'task': 'worker.scrape_all_platforms',  # 💡 指向下方定義的 Task Name
+            'schedule': crontab(minute=0, hour='*/2'), # 每 2 小時執行一次 (0, 2, 4, 6, 8, 10, 12, 14, 16, 18, 20, 22 點)
+            # 測試用 (每 5 分鐘跑一次)：'schedule': 300.0, 
+        },
+    }
+else:
+    BEAT_SCHEDULE = {
+        # 每個 Tick 只派發 next_due_at 已到期的商品
+        'adaptive-scrape-tick': {
+            'task': 'worker.dispatch_due_products',
+            'schedule': SCHEDULER_TICK_SECONDS,
+        },
+        # 每小時依最新的價格波動 / 收藏 / 提醒重算各商品的爬取間隔
+        'recompute-scrape-schedule': {
+            'task': 'worker.recompute_schedule_task',
+            'schedule': crontab(minute=30),
+        },
+    }
+
+# 💡 兩種排程模式共用：每日預建 price_history 未來分區並封存超過保留期限的分區
+BEAT_SCHEDULE['maintain-price-history-partitions'] = {
+    'task': 'worker.maintain_partitions_task',
+    'schedule': crontab(minute=15, hour=3),
+}
+
+# 💡 定期搜尋各平台，補入新上架或改名的商品 (取代只在啟動時執行一次的 seed 搜尋)
+BEAT_SCHEDULE['discover-products'] = {
+    'task': 'worker.discover_products_task',
+    'schedule': crontab(minute=45, hour='*/6'),
+}
+
 celery_app = Celery(
     "tasks",
     broker=REDIS_URL,
@@ -27,17 +77,31 @@ celery_app.conf.update(
     # 💡 爬蟲關鍵：Prefetch 設為 1，避免單個 Worker 領取過多任務導致其他 Worker 閒置
     worker_prefetch_multiplier=1,
     task_track_started=True,
-    
-    # --- 🕒 自動化排程核心配置 (Beat Schedule) ---
-    beat_schedule={
-        # 名稱：全平台價格定時更新
-        'auto-scrape-every-6-hours': {
-            'task': 'worker.scrape_all_platforms',  # 💡 指向下方定義的 Task Name
-            'schedule': crontab(minute=0, hour='*/2'), # 每 2 小時執行一次 (0, 2, 4, 6, 8, 10, 12, 14, 16, 18, 20, 22 點)
-            # 測試用 (每 5 分鐘跑一次)：'schedule': 300.0, 
-        },
+
+    # --- 🚦 任務佇列分流 ---
+    # interactive：使用者觸發的即時更新，由專屬 Worker 消費，永遠不會排在批次爬取後面
+    # bulk：排程 / 全量爬取的分片任務 (長時間執行)
+    # maintenance：協調者、彙總與排程重算等輕量任務，避免被 bulk 分片卡住
+    # 各佇列的併發數由 docker-compose 中對應 Worker 的 --concurrency 決定
+    task_queues=(Queue("interactive"), Queue("bulk"), Queue("maintenance")),
+    task_default_queue="bulk",
+    task_routes={
+        'worker.scrape_single_product_task': {'queue': 'interactive'},
+        'worker.refresh_product_task': {'queue': 'interactive'},
+        'worker.scrape_shard_task': {'queue': 'bulk'},
+        'worker.scrape_products_task': {'queue': 'bulk'},
+        'worker.scrape_all_platforms': {'queue': 'maintenance'},
+        'worker.dispatch_due_products': {'queue': 'maintenance'},
+        'worker.summarize_scrape_run': {'queue': 'maintenance'},
+        'worker.fail_scrape_run': {'queue': 'maintenance'},
+        'worker.recompute_schedule_task': {'queue': 'maintenance'},
+        'worker.maintain_partitions_task': {'queue': 'maintenance'},
+        'worker.discover_products_task': {'queue': 'bulk'},
     },
     
+    # --- 🕒 自動化排程核心配置 (Beat Schedule，依 SCRAPE_SCHEDULER 決定) ---
+    beat_schedule=BEAT_SCHEDULE,
+    
     # 限制頻率，保護 IP 不被電商封鎖
     task_annotations={
         'worker.scrape_all_platforms': {'rate_limit': '1/m'} 
@@ -46,6 +110,39 @@ celery_app.conf.update(
 
 # --- 2. 定義 Celery Tasks ---
 
+def resolve_platforms(target="All"):
+    """target = All 或單一平台名稱 (不分大小寫)；無法辨識時回傳空列表"""
+    if not target or target.lower() == "all":
+        return list(SCRAPE_PLATFORMS)
+    return [p for p in SCRAPE_PLATFORMS if p.lower() == target.lower()]
+
+def plan_shards(shard_size=SCRAPE_SHARD_SIZE, platforms=SCRAPE_PLATFORMS):
+    """
+    依平台與 products.id 區間切分工作量。
+    使用 ROW_NUMBER 依序編號後整除 shard_size，確保每個分片商品數相近 (不受 ID 空洞影響)。
+    """
+    db = SessionLocal()
+    try:
+        rows = db.execute(text("""
+            SELECT pl.name AS platform, MIN(s.id) AS min_id, MAX(s.id) AS max_id, COUNT(*) AS size
+            FROM (
+                SELECT p.id, p.platform_id,
+                       (ROW_NUMBER() OVER (PARTITION BY p.platform_id ORDER BY p.id) - 1) / :size AS shard
+                FROM products p
+            ) s
+            JOIN platforms pl ON s.platform_id = pl.id
+            GROUP BY pl.name, s.shard
+            ORDER BY pl.name, min_id
+        """), {"size": max(shard_size, 1)}).fetchall()
+    finally:
+        db.close()
+
+    wanted = [p.lower() for p in platforms]
+    return [
+        {"platform": r.platform, "min_id": r.min_id, "max_id": r.max_id, "size": r.size}
+        for r in rows if r.platform.lower() in wanted
+    ]
+
 # 💡 顯式指定 name="worker.scrape_all_platforms" 以確保 Scheduler 派發與 Worker 接收一致
 @celery_app.task(
     bind=True, 
@@ -53,24 +150,154 @@ celery_app.conf.update(
     max_retries=3, 
     default_retry_delay=300
 )
-def scrape_all_platforms(self):
+def scrape_all_platforms(self, target="All"):
     """
-    排程任務：執行全平台價格更新
+    排程任務 (協調者)：將目標平台 (target = All / Momo / PChome) 的商品切成多個分片，
+    以 Celery chord 分派給所有 Worker 併行處理，全部完成後由 summarize_scrape_run 彙總結果。
+    各分片的進度以本任務 ID 彙整，可由 GET /tasks/{task_id} 查詢。
     """
-    logger.info("📅 [Celery] 接收到排程任務：開始全平台爬取")
+    logger.info(f"📅 [Celery] 接收到排程任務：開始規劃 {target} 分片爬取")
     
     try:
-        # 在任務內部實例化，確保資料庫連線獨立
-        scraper = PriceScraper()
-        for platform in ["Momo", "PChome"]:
-            logger.info(f"正在處理平台: {platform}")
-            scraper.automated_run(platform)
-            
-        return {"status": "success", "msg": "All platforms updated"}
+        shards = plan_shards(platforms=resolve_platforms(target))
+        if not shards:
+            logger.warning("🔎 沒有可爬取的商品，略過本次排程")
+            return {"status": "success", "msg": "No products to scrape", "shards": 0}
+
+        run_id = self.request.id
+        start_run(run_id, target, sum(s["size"] for s in shards), len(shards))
+        header = group(
+            scrape_shard_task.s(s["platform"], s["min_id"], s["max_id"], run_id=run_id) for s in shards
+        )
+        result = chord(header)(run_summary(run_id))
+        logger.info(f"🧩 已派發 {len(shards)} 個分片任務 (chord={result.id})")
+        return {"status": "dispatched", "shards": len(shards), "summary_task_id": result.id}
+    except Exception as exc:
+        logger.error(f"❌ 全平台任務派發失敗: {exc}")
+        raise self.retry(exc=exc)
+
+@celery_app.task(
+    bind=True, 
+    name="worker.scrape_shard_task", 
+    max_retries=2, 
+    default_retry_delay=120
+)
+def scrape_shard_task(self, platform, min_id, max_id, run_id=None):
+    """
+    分片任務：只處理單一平台、products.id 介於 [min_id, max_id] 的商品。
+    每個分片各自建立爬蟲實例，因此擁有獨立的平台速率預算 (見 async_engine.PLATFORM_LIMITS)。
+    """
+    logger.info(f"🧩 [Celery] 分片任務：{platform} (ID {min_id}~{max_id})")
+    try:
+        return PriceScraper().automated_run(platform, min_id=min_id, max_id=max_id, run_id=run_id)
     except Exception as exc:
-        logger.error(f"❌ 全平台任務執行失敗: {exc}")
+        logger.error(f"❌ 分片任務失敗 ({platform} {min_id}~{max_id}): {exc}")
         raise self.retry(exc=exc)
 
+def run_summary(run_id):
+    """chord 回呼：成功時彙總；任一分片重試耗盡時回呼不會執行，改由 link_error 將進度標記為失敗"""
+    return summarize_scrape_run.s(run_id=run_id).on_error(fail_scrape_run.s(run_id=run_id))
+
+@celery_app.task(name="worker.fail_scrape_run")
+def fail_scrape_run(request, exc, traceback, run_id=None):
+    """chord 的 errback：結束任務進度 (status=failed)，讓 /tasks/{id}/stream 送出最終事件"""
+    logger.error(f"❌ [Celery] 爬取任務 {run_id} 失敗：{exc}")
+    if run_id:
+        finish_run(run_id, FAILED, error=exc)
+
+@celery_app.task(name="worker.summarize_scrape_run")
+def summarize_scrape_run(results, run_id=None):
+    """chord 回呼：彙總所有分片結果，依平台統計成功/失敗數，並將任務進度標記為結束"""
+    per_platform = {}
+    for r in results or []:
+        if not isinstance(r, dict):
+            continue
+        stat = per_platform.setdefault(
+            r.get("platform", "Unknown"), {"total": 0, "succeeded": 0, "failed": 0, "unchanged": 0}
+        )
+        for key in ("total", "succeeded", "failed", "unchanged"):
+            stat[key] += r.get(key, 0)
+
+    total = sum(s["total"] for s in per_platform.values())
+    succeeded = sum(s["succeeded"] for s in per_platform.values())
+    if run_id:
+        finish_run(run_id)
+    logger.info(f"🏁 [Celery] 全平台爬取完成: {succeeded}/{total} 成功，分片數 {len(results or [])}")
+    return {
+        "status": "success",
+        "shards": len(results or []),
+        "total": total,
+        "succeeded": succeeded,
+        "platforms": per_platform,
+    }
+
+@celery_app.task(
+    bind=True,
+    name="worker.dispatch_due_products",
+    max_retries=1,
+    default_retry_delay=60
+)
+def dispatch_due_products(self):
+    """
+    自適應排程 Tick：領取已到期的商品 (每次最多 SCHEDULER_MAX_DUE_PER_TICK 個)，
+    依平台與 SCRAPE_SHARD_SIZE 切成多個任務，以 chord 派發並彙總。
+    """
+    try:
+        due = claim_due_products()
+        if not due:
+            logger.info("💤 [Celery] 本次 Tick 沒有到期商品")
+            return {"status": "success", "msg": "Nothing due", "shards": 0}
+
+        size = max(SCRAPE_SHARD_SIZE, 1)
+        wanted = [p.lower() for p in SCRAPE_PLATFORMS]
+        run_id = self.request.id
+        jobs = [
+            scrape_products_task.s(platform, ids[start:start + size], run_id=run_id)
+            for platform, ids in due.items() if platform.lower() in wanted
+            for start in range(0, len(ids), size)
+        ]
+        if not jobs:
+            return {"status": "success", "msg": "Nothing due", "shards": 0}
+        total = sum(len(ids) for platform, ids in due.items() if platform.lower() in wanted)
+        start_run(run_id, "due", total, len(jobs))
+        result = chord(group(jobs))(run_summary(run_id))
+        logger.info(f"⏰ [Celery] 派發 {total} 個到期商品，共 {len(jobs)} 個任務 (chord={result.id})")
+        return {"status": "dispatched", "due": total, "shards": len(jobs), "summary_task_id": result.id}
+    except Exception as exc:
+        logger.error(f"❌ 到期商品派發失敗: {exc}")
+        raise self.retry(exc=exc)
+
+@celery_app.task(
+    bind=True,
+    name="worker.scrape_products_task",
+    max_retries=2,
+    default_retry_delay=120
+)
+def scrape_products_task(self, platform, product_ids, run_id=None):
+    """自適應排程的工作任務：只爬取指定的 products.id"""
+    try:
+        return PriceScraper().automated_run(platform, product_ids=product_ids, run_id=run_id)
+    except Exception as exc:
+        logger.error(f"❌ 到期商品爬取失敗 ({platform}, {len(product_ids)} 筆): {exc}")
+        raise self.retry(exc=exc)
+
+@celery_app.task(name="worker.recompute_schedule_task")
+def recompute_schedule_task():
+    """重算所有商品的爬取間隔 (每小時)"""
+    return {"status": "success", "products": recompute_schedule()}
+
+@celery_app.task(name="worker.maintain_partitions_task")
+def maintain_partitions_task():
+    """price_history 分區維護 (每日)：預建未來分區、封存並刪除過期分區"""
+    result = run_maintenance(archive=True)
+    logger.info(f"🗂️ [Celery] 分區維護完成：新建 {result['created']} 個，封存 {len(result['archived'])} 個")
+    return {"status": "success", **result}
+
+@celery_app.task(name="worker.discover_products_task")
+def discover_products_task():
+    """搜尋各平台並批次寫入新商品 / 改名商品 (每 6 小時；首次啟動時由 seed.py 派發)"""
+    return {"status": "success", **run_discovery()}
+
 @celery_app.task(
     bind=True, 
     name="worker.scrape_single_product_task", 
@@ -78,22 +305,43 @@ def scrape_all_platforms(self):
 )
 def scrape_single_product_task(self, platform_name, product_id_on_platform):
     """
-    單一商品即時爬取任務 (通常由 API 手動觸發)
+    單一商品即時爬取任務 (以平台名稱 + 平台商品 ID 指定)。
+    💡 與 refresh_product_task 共用 PriceScraper.refresh_product：抓到的價格一定寫入資料庫，
+       HTTP 驗證紀錄也在寫入成功後才更新，下一輪排程不會因 NOT_MODIFIED 而漏寫
     """
     logger.info(f"⚡ [Celery] 即時更新指令：{platform_name} (ID: {product_id_on_platform})")
+    db = SessionLocal()
+    try:
+        product_id = db.execute(text("""
+            SELECT p.id FROM products p
+            JOIN platforms pl ON pl.id = p.platform_id
+            WHERE lower(pl.name) = lower(:platform) AND p.product_id_on_platform = :pid
+        """), {"platform": platform_name, "pid": str(product_id_on_platform)}).scalar()
+    finally:
+        db.close()
+    if product_id is None:
+        logger.warning(f"⚠️ 找不到商品 {platform_name} (ID: {product_id_on_platform})")
+        return {"status": "not_found", "platform": platform_name, "product_id_on_platform": product_id_on_platform}
+
     try:
-        scraper = PriceScraper()
-        if platform_name.lower() == "momo":
-            price = scraper.scrape_momo(product_id_on_platform)
-        else:
-            price = scraper.scrape_pchome(product_id_on_platform)
-            
-        if price and price > 0:
-            logger.info(f"✅ 即時抓取成功：價格 ${price}")
-            return {"status": "success", "price": price}
-        else:
-            logger.warning(f"⚠️ 抓取結束，但未獲得有效價格 (ID: {product_id_on_platform})")
-            return {"status": "failed", "reason": "Price not found"}
+        return PriceScraper().refresh_product(product_id)
     except Exception as exc:
         logger.error(f"❌ 即時任務異常: {exc}")
-        raise self.retry(exc=exc)
\ No newline at end of file
+        raise self.retry(exc=exc)
+
+@celery_app.task(
+    bind=True,
+    name="worker.refresh_product_task",
+    max_retries=1,
+    default_retry_delay=5
+)
+def refresh_product_task(self, product_id):
+    """
+    API 觸發的單一商品即時更新 (interactive 佇列)：抓取後立即寫入資料庫並回傳最新價格
+    """
+    logger.info(f"⚡ [Celery] 即時更新商品 #{product_id}")
+    try:
+        return PriceScraper().refresh_product(product_id)
+    except Exception as exc:
+        logger.error(f"❌ 即時更新異常 (#{product_id}): {exc}")
+        raise self.retry(exc=exc)
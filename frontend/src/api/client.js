@@ -54,10 +54,22 @@ api.interceptors.response.use(
 );
 
 // --- 🏷️ API 業務邏輯 ---
-export const getProducts = () => api.get('/products');
+// 💡 params: { cursor, limit, category, platform, include_price, fields }，回傳 { items, next_cursor }
+export const getProducts = (params = {}) => api.get('/products', { params });
 export const triggerScrape = (target = 'All') => api.post(`/tasks/scrape?target=${target}`);
 export const getMe = () => api.get('/v1/users/me');
 export const getFavorites = () => api.get('/v1/favorites');
 export const addFavorite = (productId) => api.post('/v1/favorites', { product_id: productId });
 
+/**
+ * 📡 即時價格推播 (SSE)：只接收指定型號的價格變動，瀏覽器斷線後會自動重連。
+ * 回傳 EventSource，元件卸載時記得呼叫 close()。
+ */
+export const subscribePrices = (modelIds, onUpdate) => {
+  const query = modelIds?.length ? `?models=${modelIds.join(',')}` : '';
+  const source = new EventSource(`/api/stream/prices${query}`);
+  source.addEventListener('price', (event) => onUpdate(JSON.parse(event.data)));
+  return source;
+};
+
 export default api;
\ No newline at end of file